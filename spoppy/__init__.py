@@ -17,13 +17,32 @@ if click:
     @click.command()
     @click.argument('username', required=False)
     @click.argument('password', required=False)
-    def main(username, password):
+    @click.option(
+        '--startup-profile', is_flag=True,
+        help='Show how long each step of starting spoppy took when it exits'
+    )
+    def main(username, password, startup_profile):
         from . import logging_utils
         logging_utils.configure_logging()
-        from .navigation import Leifur
         from .config import get_config, set_config, get_config_from_user
         from .connectivity import check_internet_connection
-        from .update_checker import check_for_updates
+        from .startup import StartupPipeline
+        from .update_checker import check_for_updates, get_latest_version
+
+        def get_credentials(username, password):
+            if username and password:
+                set_config(username, password)
+            else:
+                username, password = get_config()
+            if not (username and password):
+                username, password = get_config_from_user()
+            return username, password
+
+        def get_navigator_class():
+            # Importing the navigation pulls in pyspotify, spotipy and all
+            # the menus, which the lock and the prompts don't need
+            from .navigation import Leifur
+            return Leifur
 
         lock = LockFile('/tmp/spoppy')
 
@@ -52,24 +71,42 @@ if click:
         except TypeError:
             pass
         else:
-            check_internet_connection()
-            # Check for updates
-            check_for_updates(click, get_version(), lock)
+            startup = StartupPipeline()
+            # These don't need anything from the user, so they run while
+            # we get the username and password
+            startup.start(
+                'internet connection', check_internet_connection, quiet=True
+            )
+            startup.start(
+                'update check', get_latest_version,
+                after=('internet connection', )
+            )
+            startup.start('imports', get_navigator_class)
 
-            if username and password:
-                set_config(username, password)
+            username, password = startup.run(
+                'credentials', get_credentials, username, password
+            )
+
+            try:
+                pypi_version = startup.wait('update check')
+            except Exception:
+                logger.warning('Could not check for updates', exc_info=True)
             else:
-                username, password = get_config()
-            if not (username and password):
-                username, password = get_config_from_user()
+                check_for_updates(click, get_version(), lock, pypi_version)
 
             navigator = None
             try:
-                navigator = Leifur(username, password)
+                navigator_class = startup.wait('imports')
+                navigator = startup.run(
+                    'navigator', navigator_class, username, password,
+                    startup=startup
+                )
                 navigator.start()
             finally:
                 if navigator:
                     navigator.shutdown()
+                if startup_profile:
+                    click.echo(startup.format_profile())
                 logger.debug('Finally, bye!')
         finally:
             if lock.i_am_locking():
@@ -0,0 +1,190 @@
+import logging
+import threading
+
+from .executor import (BACKGROUND_WORKERS, CancelledError, executor,
+                       get_current_future)
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of ids the web API accepts per lookup request
+BATCH_SIZES = {
+    'tracks': 50,
+    'albums': 20,
+    'artists': 50,
+}
+
+# Maximum number of tracks that can be added to a playlist per request
+PLAYLIST_BATCH_SIZE = 100
+
+
+def get_batches(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def run_in_parallel(func, items, max_workers=BACKGROUND_WORKERS):
+    '''
+    Calls `func` with each of `items`, at most `max_workers` at a time. When
+    called from work that gets cancelled, the rest of the items are skipped.
+    :raises: The first exception `func` raised, once all calls are done, or
+             CancelledError if the items were skipped
+    '''
+    items = list(items)
+    errors = []
+    # The helpers belong to whoever started the work, so they are cancelled
+    # with it
+    parent = get_current_future()
+    owner = parent.owner if parent else None
+
+    def is_cancelled():
+        return bool(parent and parent.cancel_requested)
+
+    def work():
+        while not is_cancelled():
+            try:
+                item = items.pop()
+            except IndexError:
+                return
+            try:
+                func(item)
+            except Exception as e:
+                errors.append(e)
+                return
+
+    # We work through the items ourselves as well, so we never wait for
+    # helpers that are stuck in the executor's queue
+    helpers = [
+        executor.submit(work, owner=owner)
+        for _ in range(min(max_workers, len(items)) - 1)
+    ]
+    work()
+    for helper in helpers:
+        # Helpers that have not started have nothing left to do
+        if not helper.cancel():
+            helper.wait()
+    if errors:
+        raise errors[0]
+    if items and is_cancelled():
+        raise CancelledError()
+
+
+class BatchLookup(object):
+    '''
+    Looks up tracks, albums or artists by id (or uri) in as few requests as
+    possible. The ids are split into batches of the largest size the
+    endpoint accepts, the batches are fetched concurrently and the results
+    are put back in the order they were asked for.
+    '''
+    MAX_WORKERS = BACKGROUND_WORKERS
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.requests = 0
+        self.ids = 0
+
+    def lookup(self, spotipy_client, lookup_type, ids):
+        '''
+        Looks up `ids`
+        :param spotipy_client: The client used for the lookups
+        :param lookup_type: One of tracks, albums or artists
+        :param ids: Ids or uris to look up, duplicates are only looked up once
+        :returns: A list of results in the same order as `ids`, with None
+                  for ids spotify didn't find
+        '''
+        try:
+            batch_size = BATCH_SIZES[lookup_type]
+        except KeyError:
+            raise ValueError('Unknown lookup type %s' % lookup_type)
+        unique_ids = []
+        seen = set()
+        for id_ in ids:
+            if id_ not in seen:
+                seen.add(id_)
+                unique_ids.append(id_)
+        batches = get_batches(unique_ids, batch_size)
+        with self._lock:
+            self.lookups += 1
+            self.requests += len(batches)
+            self.ids += len(unique_ids)
+        found = {}
+        lookup_func = getattr(spotipy_client, lookup_type)
+
+        def fetch_batch(batch):
+            response = lookup_func(batch)
+            items = (response or {}).get(lookup_type) or []
+            for id_, item in zip(batch, items):
+                found[id_] = item
+
+        if len(batches) > 1:
+            logger.debug(
+                'Looking up %d %s in %d requests',
+                len(unique_ids), lookup_type, len(batches)
+            )
+        run_in_parallel(fetch_batch, batches, max_workers=self.MAX_WORKERS)
+        return [found.get(id_) for id_ in ids]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'lookups': self.lookups,
+                'requests': self.requests,
+                'ids': self.ids,
+            }
+
+
+batch_lookup = BatchLookup()
+
+
+def fetch_remaining_pages(first_page, get_page,
+                          max_workers=BACKGROUND_WORKERS):
+    '''
+    Fetches the pages after `first_page` of a paged web API response. Once
+    the first page tells us the total, the rest are fetched in parallel.
+    :param first_page: The first page of the response
+    :param get_page: A function taking limit and offset, returning a page
+    :param max_workers: Maximum number of pages fetched at the same time
+    :returns: The items of all the pages, in order
+    '''
+    limit = first_page.get('limit') or len(first_page['items'])
+    offsets = []
+    if limit:
+        offsets = list(range(limit, first_page.get('total', 0), limit))
+    pages = {0: first_page['items']}
+
+    def fetch_page(offset):
+        page = get_page(limit, offset)
+        pages[offset] = page['items'] if page else []
+
+    if offsets:
+        logger.debug('Fetching %d more pages', len(offsets))
+        run_in_parallel(fetch_page, offsets, max_workers=max_workers)
+    items = []
+    for offset in sorted(pages):
+        items.extend(pages[offset])
+    return items
+
+
+def add_tracks_to_playlist(spotipy_client, user, playlist_id, tracks):
+    '''
+    Adds `tracks` to a playlist, in batches of `PLAYLIST_BATCH_SIZE`. The
+    batches are sent one after another so the tracks keep their order.
+    '''
+    for batch in get_batches(list(tracks), PLAYLIST_BATCH_SIZE):
+        spotipy_client.user_playlist_add_tracks(
+            user=user, playlist_id=playlist_id, tracks=batch
+        )
+
+
+def replace_playlist_tracks(spotipy_client, user, playlist_id, tracks):
+    '''
+    Replaces the tracks of a playlist with `tracks`. Spotify only accepts
+    `PLAYLIST_BATCH_SIZE` tracks when replacing, the rest are added after.
+    '''
+    tracks = list(tracks)
+    spotipy_client.user_playlist_replace_tracks(
+        user=user, playlist_id=playlist_id,
+        tracks=tracks[:PLAYLIST_BATCH_SIZE]
+    )
+    add_tracks_to_playlist(
+        spotipy_client, user, playlist_id, tracks[PLAYLIST_BATCH_SIZE:]
+    )
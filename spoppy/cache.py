@@ -0,0 +1,113 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache(object):
+    '''
+    A thread safe least-recently-used cache.
+
+    Entries expire `ttl` seconds after they were set. The least recently used
+    entries are evicted when the cache holds more than `max_entries` entries,
+    or when the total size of all entries (as measured by `sizeof`) exceeds
+    `max_size`.
+    '''
+
+    def __init__(self, max_entries=100, max_size=None, ttl=None, sizeof=None):
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.ttl = ttl
+        self.sizeof = sizeof or (lambda value: 1)
+        self._lock = threading.RLock()
+        # key -> (value, size, expires_at)
+        self._entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return self.peek(key) is not None
+
+    def _is_expired(self, expires_at):
+        return expires_at is not None and expires_at <= time.time()
+
+    def _remove(self, key):
+        value, size, expires_at = self._entries.pop(key)
+        self.size -= size
+        return value
+
+    def peek(self, key, default=None):
+        '''
+        Gets a value without marking it as recently used or touching the
+        hit/miss statistics
+        '''
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or self._is_expired(entry[2]):
+                return default
+            return entry[0]
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._is_expired(entry[2]):
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            # Re-insert to mark as most recently used
+            del self._entries[key]
+            self._entries[key] = entry
+            return entry[0]
+
+    def set(self, key, value):
+        size = self.sizeof(value)
+        expires_at = self.ttl and time.time() + self.ttl
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, expires_at)
+            self.size += size
+            self._evict()
+
+    def pop(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                return default
+            return self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _evict(self):
+        while self._entries and (
+            len(self._entries) > self.max_entries or
+            (self.max_size is not None and self.size > self.max_size)
+        ):
+            key = next(iter(self._entries))
+            self._remove(key)
+            self.evictions += 1
+            logger.debug('Evicted %s from cache', key)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'size': self.size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': float(self.hits) / lookups if lookups else 0.0,
+            }
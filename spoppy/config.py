@@ -1,7 +1,7 @@
 import getpass
 import os
 
-from appdirs import user_cache_dir
+from .util import get_cache_path
 
 try:
     # python2.7
@@ -9,14 +9,15 @@ try:
 except NameError:
     pass
 
-CONFIG_FILE_NAME = os.path.join(
-    user_cache_dir(appname='spoppy'), '.creds'
-)
+
+def get_config_file_name():
+    return get_cache_path('.creds')
 
 
 def get_config():
-    if os.path.exists(CONFIG_FILE_NAME):
-        with open(CONFIG_FILE_NAME, 'r') as f:
+    config_file_name = get_config_file_name()
+    if os.path.exists(config_file_name):
+        with open(config_file_name, 'r') as f:
             return [
                 line.strip() for line in f.readlines()
             ][:2]
@@ -24,7 +25,7 @@ def get_config():
 
 
 def set_config(username, password):
-    with open(CONFIG_FILE_NAME, 'w') as f:
+    with open(get_config_file_name(), 'w') as f:
         f.write(username)
         f.write('\n')
         f.write(password)
@@ -40,4 +41,4 @@ def get_config_from_user():
 
 
 def clear_config():
-    os.remove(CONFIG_FILE_NAME)
+    os.remove(get_config_file_name())
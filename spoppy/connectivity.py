@@ -3,8 +3,9 @@ import time
 
 REMOTE_SERVER = 'www.google.com'
 
-def check_internet_connection():
-    print ("Checking for internet connection.")
+def check_internet_connection(quiet=False):
+    if not quiet:
+        print ("Checking for internet connection.")
     connected = False
     while not connected:
         try:
@@ -14,7 +15,8 @@ def check_internet_connection():
             print ("Not connected to the internet - waiting for 10 seconds.")
             time.sleep(10)
             connected = False
-    print("Connected to the internet - continuing normal program flow. ")
+    if not quiet:
+        print("Connected to the internet - continuing normal program flow. ")
 
 
 if __name__ == '__main__':
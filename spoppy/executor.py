@@ -0,0 +1,295 @@
+import contextlib
+import itertools
+import logging
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+logger = logging.getLogger(__name__)
+
+# Number of threads doing work (mostly web API requests) in the background
+BACKGROUND_WORKERS = 4
+
+# Lower values run first
+FOREGROUND = 0
+PREFETCH = 10
+
+_current = threading.local()
+
+
+class CancelledError(Exception):
+    '''
+    Raised by work that stopped early because it was cancelled
+    '''
+
+
+def get_current_priority():
+    '''
+    Gets the priority of the work running in the current thread, work done
+    outside of the executor (i.e. in the main thread) is in the foreground
+    '''
+    return getattr(_current, 'priority', FOREGROUND)
+
+
+def get_current_future():
+    '''
+    :returns: The future of the work running in the current thread, or None
+              outside of the executor
+    '''
+    return getattr(_current, 'future', None)
+
+
+@contextlib.contextmanager
+def running_at(priority):
+    '''
+    Work submitted in the current thread without a priority gets `priority`
+    while in this context
+    '''
+    previous = getattr(_current, 'priority', None)
+    _current.priority = priority
+    try:
+        yield
+    finally:
+        if previous is None:
+            del _current.priority
+        else:
+            _current.priority = previous
+
+
+class Future(object):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FINISHED = 'finished'
+    CANCELLED = 'cancelled'
+
+    def __init__(self, func, priority, owner):
+        self.func = func
+        self.priority = priority
+        self.owner = owner
+        self.state = self.PENDING
+        # Set when cancel() is called on a running future, long running
+        # work can check this and stop early
+        self.cancel_requested = False
+        self.submitted_at = time.time()
+        self._result = None
+        self._exception = None
+        self._done_event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        '''
+        Cancels the future if it has not started running
+        :returns: True if the future will never run
+        '''
+        with self._lock:
+            if self.state == self.FINISHED:
+                return False
+            self.cancel_requested = True
+            if self.state == self.RUNNING:
+                return False
+            if self.state == self.PENDING:
+                self.state = self.CANCELLED
+        self._finish()
+        return self.state == self.CANCELLED
+
+    def cancelled(self):
+        return self.state == self.CANCELLED
+
+    def done(self):
+        return self._done_event.is_set()
+
+    def wait(self, timeout=None):
+        return self._done_event.wait(timeout)
+
+    def result(self, timeout=None):
+        self.wait(timeout)
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def exception(self):
+        return self._exception
+
+    def add_done_callback(self, callback):
+        with self._lock:
+            if not self.done():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def set_running(self):
+        with self._lock:
+            if self.state != self.PENDING:
+                return False
+            self.state = self.RUNNING
+            return True
+
+    def run(self):
+        try:
+            self._result = self.func()
+        except Exception as e:
+            logger.exception('Background task %s failed', self.func)
+            self._exception = e
+        with self._lock:
+            self.state = self.FINISHED
+        self._finish()
+
+    def _finish(self):
+        with self._lock:
+            if self._done_event.is_set():
+                return
+            self._done_event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception:
+                logger.exception('Callback for %s failed', self.func)
+
+
+class Executor(object):
+    '''
+    A bounded pool of worker threads with a priority queue. Work is tagged
+    with an owner (usually the menu that started it) so that everything a
+    menu started can be cancelled when the user leaves it.
+    '''
+
+    def __init__(self, workers=BACKGROUND_WORKERS):
+        self.max_workers = workers
+        self._queue = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._workers = []
+        self._pending = set()
+        self._running = 0
+        self._lock = threading.Lock()
+        self._shutdown = False
+        self.submitted = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.max_queue_depth = 0
+        self.total_wait_time = 0.0
+        self.total_run_time = 0.0
+
+    def submit(self, func, priority=None, owner=None):
+        if priority is None:
+            # Work started by other work runs at the same priority
+            priority = get_current_priority()
+        future = Future(func, priority, owner)
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError('Executor has been shut down')
+            self._pending.add(future)
+            self.submitted += 1
+            self.max_queue_depth = max(
+                self.max_queue_depth, len(self._pending) - self._running
+            )
+            if len(self._workers) < self.max_workers:
+                worker = threading.Thread(
+                    target=self._work,
+                    name='spoppy-worker-%d' % len(self._workers)
+                )
+                worker.daemon = True
+                self._workers.append(worker)
+                worker.start()
+        future.add_done_callback(self._forget)
+        self._queue.put((priority, next(self._sequence), future))
+        return future
+
+    def _forget(self, future):
+        with self._lock:
+            self._pending.discard(future)
+            if future.cancelled():
+                self.cancelled += 1
+
+    def _work(self):
+        while True:
+            _, _, future = self._queue.get()
+            if future is None:
+                return
+            if not future.set_running():
+                # Cancelled while queued, or promoted and already run
+                continue
+            started_at = time.time()
+            with self._lock:
+                self._running += 1
+            _current.priority = future.priority
+            _current.future = future
+            try:
+                future.run()
+            finally:
+                del _current.priority
+                del _current.future
+            with self._lock:
+                self._running -= 1
+                self.completed += 1
+                self.total_wait_time += started_at - future.submitted_at
+                self.total_run_time += time.time() - started_at
+
+    def promote(self, future, priority=FOREGROUND):
+        '''
+        Runs `future` at `priority` if it is still waiting to run at a lower
+        one, i.e. when the user is now waiting for what was prefetched
+        '''
+        if future.state != Future.PENDING or future.priority <= priority:
+            return
+        future.priority = priority
+        # Whichever entry comes first runs the future, the other is skipped
+        self._queue.put((priority, next(self._sequence), future))
+
+    def cancel_owner(self, owner):
+        '''
+        Cancels all queued work started by `owner` and asks running work to
+        stop
+        :returns: Number of futures that were cancelled before they ran
+        '''
+        with self._lock:
+            futures = [
+                future for future in self._pending if future.owner is owner
+            ]
+        cancelled = len([future for future in futures if future.cancel()])
+        if futures:
+            logger.debug(
+                'Cancelled %d of %d tasks for %s', cancelled, len(futures),
+                owner
+            )
+        return cancelled
+
+    def shutdown(self):
+        with self._lock:
+            self._shutdown = True
+            futures = list(self._pending)
+            workers = list(self._workers)
+        for future in futures:
+            future.cancel()
+        for _ in workers:
+            # Sorts after everything else
+            self._queue.put((float('inf'), next(self._sequence), None))
+        logger.debug('Executor stats on shutdown: %s', self.stats())
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': len(self._workers),
+                'queue_depth': max(len(self._pending) - self._running, 0),
+                'running': self._running,
+                'max_queue_depth': self.max_queue_depth,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'cancelled': self.cancelled,
+                'avg_wait_time': (
+                    self.total_wait_time / self.completed
+                    if self.completed else 0.0
+                ),
+                'avg_run_time': (
+                    self.total_run_time / self.completed
+                    if self.completed else 0.0
+                ),
+            }
+
+
+executor = Executor()
@@ -0,0 +1,269 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from .rate_limit import ScheduledSession, count_received
+
+try:
+    from urllib.parse import urlencode
+except ImportError:
+    from urllib import urlencode
+
+logger = logging.getLogger(__name__)
+
+
+def parse_cache_control(header):
+    directives = {}
+    for part in (header or '').split(','):
+        name, _, value = part.strip().partition('=')
+        if name:
+            directives[name.lower()] = value.strip('"') or None
+    return directives
+
+
+def get_max_age(headers):
+    directives = parse_cache_control(headers.get('Cache-Control'))
+    if 'no-cache' in directives:
+        return 0
+    try:
+        return max(int(directives.get('max-age') or 0), 0)
+    except ValueError:
+        return 0
+
+
+def is_cacheable(response):
+    directives = parse_cache_control(response.headers.get('Cache-Control'))
+    if 'no-store' in directives:
+        return False
+    return bool(response.headers.get('ETag') or get_max_age(response.headers))
+
+
+class ResponseCache(object):
+    '''
+    Stores responses as json files in a directory. The total size of the
+    directory is capped at `max_size` bytes, evicting the least recently
+    used responses first.
+    '''
+
+    def __init__(self, directory, max_size=50 * 1024 * 1024):
+        self.directory = directory
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        # file name -> size, least recently used first. Listing the
+        # directory is deferred until we need the cache.
+        self._index = None
+        self.size = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._get_index())
+
+    def _get_index(self):
+        # Called with the lock held
+        if self._index is None:
+            self._index = OrderedDict()
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            self._load_index()
+        return self._index
+
+    def _load_index(self):
+        files = []
+        for file_name in os.listdir(self.directory):
+            if not file_name.endswith('.json'):
+                continue
+            stat = os.stat(os.path.join(self.directory, file_name))
+            files.append((stat.st_mtime, file_name, stat.st_size))
+        for _, file_name, size in sorted(files):
+            self._index[file_name] = size
+            self.size += size
+        logger.debug(
+            'Loaded %d cached responses (%d bytes)', len(self._index),
+            self.size
+        )
+
+    def get_file_name(self, key):
+        return '%s.json' % hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def get_path(self, file_name):
+        return os.path.join(self.directory, file_name)
+
+    def get(self, key):
+        file_name = self.get_file_name(key)
+        with self._lock:
+            if file_name not in self._get_index():
+                return None
+            try:
+                with open(self.get_path(file_name), 'r') as f:
+                    entry = json.load(f)
+                # Mark as recently used, the mtime survives restarts
+                os.utime(self.get_path(file_name), None)
+            except (IOError, OSError, ValueError):
+                logger.warning('Could not read cached response %s', key)
+                self._remove(file_name)
+                return None
+            self._index[file_name] = self._index.pop(file_name)
+        if entry.get('key') != key:
+            return None
+        return entry
+
+    def set(self, key, entry):
+        entry = dict(entry, key=key)
+        file_name = self.get_file_name(key)
+        data = json.dumps(entry)
+        with self._lock:
+            index = self._get_index()
+            path = self.get_path(file_name)
+            tmp_path = '%s.%s.tmp' % (path, threading.current_thread().ident)
+            try:
+                with open(tmp_path, 'w') as f:
+                    f.write(data)
+                os.rename(tmp_path, path)
+            except (IOError, OSError):
+                logger.warning('Could not cache response %s', key)
+                return
+            self.size -= index.pop(file_name, 0)
+            index[file_name] = len(data)
+            self.size += len(data)
+            while self.size > self.max_size and len(index) > 1:
+                self._remove(next(iter(index)))
+
+    def _remove(self, file_name):
+        self.size -= self._index.pop(file_name, 0)
+        try:
+            os.remove(self.get_path(file_name))
+        except OSError:
+            pass
+
+    def clear(self):
+        with self._lock:
+            for file_name in list(self._get_index()):
+                self._remove(file_name)
+
+
+class NoConnection(object):
+    # Responses served from the cache never touched a connection, but
+    # spotipy closes `response.connection` after every call
+    def close(self):
+        pass
+
+
+class CachedSession(ScheduledSession):
+    '''
+    A requests session that caches GET responses in a `ResponseCache`,
+    honouring Cache-Control and revalidating stale responses with
+    If-None-Match. Responses served from the cache skip rate limiting.
+    '''
+
+    def __init__(self, cache, limiter=None):
+        super(CachedSession, self).__init__(limiter)
+        self.cache = cache
+        self.invalidated_at = 0
+        self.stats_lock = threading.Lock()
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+    def get_cache_key(self, url, params):
+        if params:
+            params = sorted(
+                (key, value) for key, value in params.items()
+                if value is not None
+            )
+            if params:
+                url = '%s%s%s' % (
+                    url, '&' if '?' in url else '?', urlencode(params)
+                )
+        return url
+
+    def is_fresh(self, entry):
+        return (
+            entry['stored_at'] > self.invalidated_at and
+            entry['expires_at'] > time.time()
+        )
+
+    def record(self, counter, saved=0):
+        with self.stats_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+            self.bytes_saved += saved
+
+    def request(self, method, url, params=None, headers=None, **kwargs):
+        if method.upper() != 'GET':
+            response = super(CachedSession, self).request(
+                method, url, params=params, headers=headers, **kwargs
+            )
+            if response.ok:
+                # Something was modified, revalidate everything we have
+                self.invalidated_at = time.time()
+            return response
+
+        key = self.get_cache_key(url, params)
+        entry = self.cache.get(key)
+        if entry and self.is_fresh(entry):
+            logger.debug('Serving %s from cache', key)
+            self.record('hits', len(entry['body']))
+            return self.build_response(entry, NoConnection())
+
+        headers = dict(headers or {})
+        if entry and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        response = super(CachedSession, self).request(
+            method, url, params=params, headers=headers, **kwargs
+        )
+        if response.status_code == 304 and entry:
+            logger.debug('%s not modified', key)
+            self.record('revalidated', len(entry['body']))
+            entry = self.store(key, entry['body'], entry['headers'], response)
+            return self.build_response(entry, response.connection)
+        self.record('misses')
+        if response.status_code == 200 and is_cacheable(response):
+            self.store(key, response.text, dict(response.headers), response)
+        return response
+
+    def store(self, key, body, headers, response):
+        headers = dict(headers)
+        # A 304 may carry updated caching headers
+        for header in ('Cache-Control', 'ETag', 'Expires'):
+            if header in response.headers:
+                headers[header] = response.headers[header]
+        now = time.time()
+        entry = {
+            'url': key,
+            'body': body,
+            'headers': headers,
+            'etag': headers.get('ETag'),
+            'stored_at': now,
+            'expires_at': now + get_max_age(CaseInsensitiveDict(headers)),
+        }
+        self.cache.set(key, entry)
+        return entry
+
+    def build_response(self, entry, connection):
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = 'OK'
+        response.url = entry['url']
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response.encoding = 'utf-8'
+        response._content = entry['body'].encode('utf-8')
+        response.connection = connection
+        return count_received(response)
+
+    def stats(self):
+        with self.stats_lock:
+            return {
+                'hits': self.hits,
+                'revalidated': self.revalidated,
+                'misses': self.misses,
+                'bytes_saved': self.bytes_saved,
+                'cached_responses': len(self.cache),
+                'cache_size': self.cache.size,
+            }
@@ -0,0 +1,55 @@
+import logging
+
+from requests.adapters import HTTPAdapter
+
+from .executor import BACKGROUND_WORKERS
+
+logger = logging.getLogger(__name__)
+
+
+class PooledAdapter(HTTPAdapter):
+    '''
+    An adapter that keeps its connection pool open for the lifetime of the
+    session. spotipy calls `response.connection.close()` (that is, this
+    adapter's close) after every call, which would otherwise drop every
+    pooled connection and make the next request do a new TLS handshake.
+    '''
+
+    def close(self):
+        pass
+
+    def shutdown(self):
+        super(PooledAdapter, self).close()
+
+    def stats(self):
+        connections = 0
+        requests_made = 0
+        pools = self.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                connections += pool.num_connections
+                requests_made += pool.num_requests
+        return {
+            'pool_size': self._pool_maxsize,
+            'connections': connections,
+            'requests': requests_made,
+            'reused': max(requests_made - connections, 0),
+        }
+
+
+def mount_pooled_adapter(session, pool_size=None):
+    '''
+    Mounts a `PooledAdapter` on `session` for all http(s) traffic
+    :param session: A requests session
+    :param pool_size: Connections kept per host, defaults to one per
+                      background worker and one for the main thread
+    :returns: The mounted adapter
+    '''
+    if pool_size is None:
+        pool_size = BACKGROUND_WORKERS + 1
+    adapter = PooledAdapter(pool_connections=4, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    logger.debug('Mounted connection pool of size %d', pool_size)
+    return adapter
@@ -0,0 +1,515 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from .batching import fetch_remaining_pages
+from .executor import PREFETCH, executor
+from .loaders.playlists import playlist_cache
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+-- The user's playlists, as returned by the web API
+CREATE TABLE IF NOT EXISTS playlists (
+    id TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    snapshot_id TEXT,
+    data TEXT NOT NULL
+);
+-- The version of each playlist we have the tracks of
+CREATE TABLE IF NOT EXISTS playlist_snapshots (
+    playlist_id TEXT PRIMARY KEY,
+    snapshot_id TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tracks (
+    uri TEXT PRIMARY KEY,
+    name TEXT,
+    artists TEXT,
+    album TEXT,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS playlist_tracks (
+    playlist_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    track_uri TEXT NOT NULL,
+    PRIMARY KEY (playlist_id, position)
+);
+CREATE INDEX IF NOT EXISTS playlist_tracks_track_uri
+    ON playlist_tracks (track_uri);
+-- When we last got the tracks of each playlist from here or the web API
+CREATE TABLE IF NOT EXISTS playlist_views (
+    playlist_id TEXT PRIMARY KEY,
+    viewed_at REAL NOT NULL
+);
+'''
+
+# Full-text index of track, artist and album names. The rowid is the rowid
+# of the track in the tracks table.
+FTS_SCHEMA = '''
+CREATE VIRTUAL TABLE IF NOT EXISTS tracks_fts USING %s(name, artists, album)
+'''
+# Newest first, we use what this sqlite has
+FTS_MODULES = ('fts5', 'fts4')
+
+# Tracks of playlists we have stored but the user doesn't have any more
+# (i.e. ones they have only viewed) are not part of the library
+IN_LIBRARY = (
+    'EXISTS (SELECT 1 FROM playlist_tracks '
+    'JOIN playlists ON playlists.id = playlist_tracks.playlist_id '
+    'WHERE playlist_tracks.track_uri = tracks.uri)'
+)
+
+# The tracks of playlists the user doesn't have are kept for this many of
+# the ones they viewed last
+MAX_VIEWED_PLAYLISTS = 50
+
+# Playlist tracks are fetched this many at a time
+PLAYLIST_TRACKS_PAGE_SIZE = 100
+
+
+def strip_markets(item):
+    # The list of markets is most of the size of a track, and we don't use it
+    item = dict(item)
+    item.pop('available_markets', None)
+    if isinstance(item.get('album'), dict):
+        item['album'] = strip_markets(item['album'])
+    return item
+
+
+class LibraryStore(object):
+    '''
+    A local copy of the user's playlists and their tracks, kept in an SQLite
+    database. The tracks of a playlist are stored along with the playlist's
+    snapshot_id, so we know when they need to be fetched again.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = None
+        self.fts_module = None
+
+    def get_connection(self):
+        # Connecting is deferred until we need the database
+        if self._connection is None:
+            self._connection = sqlite3.connect(
+                self.path, check_same_thread=False
+            )
+            self._connection.executescript(SCHEMA)
+            self.create_fts_index(self._connection)
+        return self._connection
+
+    def create_fts_index(self, connection):
+        for fts_module in FTS_MODULES:
+            try:
+                connection.execute(FTS_SCHEMA % fts_module)
+            except sqlite3.OperationalError:
+                logger.debug('sqlite does not support %s', fts_module)
+                continue
+            self.fts_module = fts_module
+            break
+        else:
+            logger.warning(
+                'sqlite has no full-text search, library search will be slow'
+            )
+            return
+        with connection:
+            is_empty = not connection.execute(
+                'SELECT 1 FROM tracks_fts LIMIT 1'
+            ).fetchone()
+            if is_empty:
+                # Tracks stored before we had the index
+                connection.execute(
+                    'INSERT INTO tracks_fts (rowid, name, artists, album) '
+                    'SELECT rowid, name, artists, album FROM tracks'
+                )
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def get_playlists(self):
+        '''
+        :returns: The user's playlists, or None if they have never been synced
+        '''
+        with self._lock:
+            connection = self.get_connection()
+            synced = connection.execute(
+                'SELECT value FROM meta WHERE key = ?', ('playlists_synced',)
+            ).fetchone()
+            if not synced:
+                return None
+            return [
+                json.loads(data) for (data, ) in connection.execute(
+                    'SELECT data FROM playlists ORDER BY position'
+                )
+            ]
+
+    def get_playlists_synced_at(self):
+        with self._lock:
+            synced = self.get_connection().execute(
+                'SELECT value FROM meta WHERE key = ?', ('playlists_synced',)
+            ).fetchone()
+        return float(synced[0]) if synced else None
+
+    def set_playlists(self, playlists):
+        playlist_ids = set(playlist['id'] for playlist in playlists)
+        with self._lock:
+            connection = self.get_connection()
+            with connection:
+                self.forget_playlists(connection, [
+                    playlist_id for (playlist_id, ) in
+                    connection.execute('SELECT id FROM playlists')
+                    if playlist_id not in playlist_ids
+                ])
+                connection.execute('DELETE FROM playlists')
+                connection.executemany(
+                    'INSERT OR REPLACE INTO playlists '
+                    '(id, position, snapshot_id, data) VALUES (?, ?, ?, ?)',
+                    [
+                        (
+                            playlist['id'], position,
+                            playlist.get('snapshot_id'), json.dumps(playlist)
+                        )
+                        for position, playlist in enumerate(playlists)
+                    ]
+                )
+                connection.execute(
+                    'INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                    ('playlists_synced', repr(time.time()))
+                )
+
+    def get_response(self, key):
+        '''
+        Gets a web API response stored with `set_response`
+        :returns: A tuple of (response, time it was stored), or None
+        '''
+        with self._lock:
+            stored = self.get_connection().execute(
+                'SELECT value FROM meta WHERE key = ?', ('response:' + key, )
+            ).fetchone()
+        if not stored:
+            return None
+        stored = json.loads(stored[0])
+        return stored['response'], stored['stored_at']
+
+    def set_response(self, key, response):
+        with self._lock:
+            connection = self.get_connection()
+            with connection:
+                connection.execute(
+                    'INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                    ('response:' + key, json.dumps({
+                        'response': response,
+                        'stored_at': time.time(),
+                    }))
+                )
+
+    def get_outdated_playlists(self):
+        '''
+        :returns: The user's playlists that have changed since we got their
+                  tracks
+        '''
+        with self._lock:
+            return [
+                json.loads(data) for (data, ) in
+                self.get_connection().execute(
+                    'SELECT data FROM playlists '
+                    'LEFT JOIN playlist_snapshots '
+                    'ON playlist_snapshots.playlist_id = playlists.id '
+                    'WHERE playlist_snapshots.snapshot_id IS NULL '
+                    'OR playlist_snapshots.snapshot_id != '
+                    'playlists.snapshot_id '
+                    'ORDER BY position'
+                )
+            ]
+
+    def get_playlist_tracks(self, playlist_id, snapshot_id):
+        '''
+        :returns: The tracks of the playlist, or None if we don't have the
+                  tracks of this snapshot
+        '''
+        with self._lock:
+            connection = self.get_connection()
+            stored = connection.execute(
+                'SELECT snapshot_id FROM playlist_snapshots '
+                'WHERE playlist_id = ?', (playlist_id, )
+            ).fetchone()
+            if not stored or stored[0] != snapshot_id:
+                return None
+            with connection:
+                self.set_viewed(connection, playlist_id)
+            return [
+                json.loads(data) for (data, ) in connection.execute(
+                    'SELECT tracks.data FROM playlist_tracks '
+                    'JOIN tracks ON tracks.uri = playlist_tracks.track_uri '
+                    'WHERE playlist_tracks.playlist_id = ? '
+                    'ORDER BY playlist_tracks.position', (playlist_id, )
+                )
+            ]
+
+    def set_playlist_tracks(self, playlist_id, snapshot_id, tracks):
+        tracks = [strip_markets(track) for track in tracks if track]
+        with self._lock:
+            connection = self.get_connection()
+            with connection:
+                for track in tracks:
+                    self.store_track(connection, track)
+                previous_uris = self.get_track_uris(connection, playlist_id)
+                connection.execute(
+                    'DELETE FROM playlist_tracks WHERE playlist_id = ?',
+                    (playlist_id, )
+                )
+                connection.executemany(
+                    'INSERT INTO playlist_tracks '
+                    '(playlist_id, position, track_uri) VALUES (?, ?, ?)',
+                    [
+                        (playlist_id, position, track['uri'])
+                        for position, track in enumerate(tracks)
+                    ]
+                )
+                connection.execute(
+                    'INSERT OR REPLACE INTO playlist_snapshots '
+                    '(playlist_id, snapshot_id) VALUES (?, ?)',
+                    (playlist_id, snapshot_id)
+                )
+                self.prune_tracks(connection, previous_uris)
+                self.set_viewed(connection, playlist_id)
+                self.forget_viewed_playlists(connection)
+
+    def set_viewed(self, connection, playlist_id):
+        connection.execute(
+            'INSERT OR REPLACE INTO playlist_views (playlist_id, viewed_at) '
+            'VALUES (?, ?)', (playlist_id, time.time())
+        )
+
+    def forget_viewed_playlists(self, connection):
+        '''
+        Deletes the tracks of playlists the user doesn't have, but for the
+        `MAX_VIEWED_PLAYLISTS` they viewed last
+        '''
+        self.forget_playlists(connection, [
+            playlist_id for (playlist_id, ) in connection.execute(
+                'SELECT playlist_snapshots.playlist_id '
+                'FROM playlist_snapshots '
+                'LEFT JOIN playlist_views ON playlist_views.playlist_id = '
+                'playlist_snapshots.playlist_id '
+                'WHERE playlist_snapshots.playlist_id NOT IN '
+                '(SELECT id FROM playlists) '
+                'ORDER BY COALESCE(playlist_views.viewed_at, 0) DESC '
+                'LIMIT -1 OFFSET ?', (MAX_VIEWED_PLAYLISTS, )
+            )
+        ])
+
+    def forget_playlists(self, connection, playlist_ids):
+        '''
+        Deletes the tracks we have of `playlist_ids`
+        '''
+        if not playlist_ids:
+            return
+        logger.debug('Forgetting tracks of %d playlists', len(playlist_ids))
+        uris = [
+            uri for playlist_id in playlist_ids
+            for uri in self.get_track_uris(connection, playlist_id)
+        ]
+        params = [(playlist_id, ) for playlist_id in playlist_ids]
+        for table in (
+            'playlist_tracks', 'playlist_snapshots', 'playlist_views'
+        ):
+            connection.executemany(
+                'DELETE FROM %s WHERE playlist_id = ?' % table, params
+            )
+        self.prune_tracks(connection, uris)
+
+    def get_track_uris(self, connection, playlist_id):
+        return [
+            uri for (uri, ) in connection.execute(
+                'SELECT track_uri FROM playlist_tracks WHERE playlist_id = ?',
+                (playlist_id, )
+            )
+        ]
+
+    def prune_tracks(self, connection, uris):
+        '''
+        Deletes the tracks of `uris` that are not in any playlist any more
+        '''
+        for uri in set(uris):
+            orphan = connection.execute(
+                'SELECT rowid FROM tracks WHERE uri = ? AND NOT EXISTS ('
+                'SELECT 1 FROM playlist_tracks '
+                'WHERE playlist_tracks.track_uri = tracks.uri)', (uri, )
+            ).fetchone()
+            if not orphan:
+                continue
+            if self.fts_module:
+                connection.execute(
+                    'DELETE FROM tracks_fts WHERE rowid = ?', orphan
+                )
+            connection.execute('DELETE FROM tracks WHERE rowid = ?', orphan)
+
+    def store_track(self, connection, track):
+        name = track.get('name')
+        artists = ' '.join(
+            artist.get('name') or ''
+            for artist in track.get('artists') or []
+        )
+        album = (track.get('album') or {}).get('name')
+        stored = connection.execute(
+            'SELECT rowid FROM tracks WHERE uri = ?', (track['uri'], )
+        ).fetchone()
+        if stored:
+            rowid = stored[0]
+            connection.execute(
+                'UPDATE tracks SET name = ?, artists = ?, album = ?, '
+                'data = ? WHERE rowid = ?',
+                (name, artists, album, json.dumps(track), rowid)
+            )
+            if self.fts_module:
+                connection.execute(
+                    'DELETE FROM tracks_fts WHERE rowid = ?', (rowid, )
+                )
+        else:
+            rowid = connection.execute(
+                'INSERT INTO tracks (uri, name, artists, album, data) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (track['uri'], name, artists, album, json.dumps(track))
+            ).lastrowid
+        if self.fts_module:
+            connection.execute(
+                'INSERT INTO tracks_fts (rowid, name, artists, album) '
+                'VALUES (?, ?, ?, ?)', (rowid, name, artists, album)
+            )
+
+    def search_tracks(self, query, limit=20):
+        '''
+        Searches the names, artists and albums of the tracks in the library
+        :returns: List of tracks in the user's playlists where every word in
+                  `query` starts a word in the track's name, artists or album
+        '''
+        words = query.replace('"', ' ').split()
+        if not words:
+            return []
+        with self._lock:
+            connection = self.get_connection()
+            if self.fts_module:
+                order_by = 'rank' if self.fts_module == 'fts5' else 'rowid'
+                rows = connection.execute(
+                    'SELECT tracks.data FROM tracks_fts '
+                    'JOIN tracks ON tracks.rowid = tracks_fts.rowid '
+                    'WHERE tracks_fts MATCH ? AND %s '
+                    'ORDER BY %s LIMIT ?' % (IN_LIBRARY, order_by),
+                    (get_fts_query(words, self.fts_module), limit)
+                )
+            else:
+                rows = connection.execute(
+                    'SELECT data FROM tracks WHERE ' + ' AND '.join(
+                        ["(COALESCE(name, '') || ' ' || "
+                         "COALESCE(artists, '') || ' ' || "
+                         "COALESCE(album, '')) LIKE ?"
+                         for _ in words] + [IN_LIBRARY]
+                    ) + ' LIMIT ?',
+                    ['%%%s%%' % word for word in words] + [limit]
+                )
+            return [json.loads(data) for (data, ) in rows]
+
+
+def get_fts_query(words, fts_module):
+    '''
+    Makes a full-text query matching names with words starting with each of
+    `words`
+    '''
+    if fts_module == 'fts5':
+        template = '"%s"*'
+    else:
+        template = '"%s*"'
+    return ' '.join(template % word for word in words)
+
+
+def fetch_playlist_tracks(spotipy_client, playlist):
+    '''
+    Fetches all tracks of `playlist`, a playlist item from the web API
+    :returns: List of tracks, or None if spotify returned nothing
+    '''
+    href = playlist['tracks']['href']
+    first_page = spotipy_client._get(
+        href, limit=PLAYLIST_TRACKS_PAGE_SIZE, offset=0
+    )
+    if not first_page:
+        return None
+    items = fetch_remaining_pages(
+        first_page,
+        lambda limit, offset: spotipy_client._get(
+            href, limit=limit, offset=offset
+        ),
+    )
+    return [item.get('track') for item in items if item]
+
+
+def get_playlist_tracks(library, spotipy_client, playlist):
+    '''
+    Gets the tracks of `playlist` from the library, or from the web API if
+    the library doesn't have its current snapshot
+    '''
+    snapshot_id = playlist.get('snapshot_id')
+    if snapshot_id:
+        tracks = library.get_playlist_tracks(playlist['id'], snapshot_id)
+        if tracks is not None:
+            logger.debug('Got tracks for %s from library', playlist['id'])
+            return tracks
+    tracks = fetch_playlist_tracks(spotipy_client, playlist)
+    if tracks is not None and snapshot_id:
+        library.set_playlist_tracks(playlist['id'], snapshot_id, tracks)
+    return tracks
+
+
+class LibrarySync(object):
+    '''
+    Syncs the user's playlists to a `LibraryStore` in the background. Only
+    playlists whose snapshot_id changed have their tracks fetched.
+    '''
+
+    def __init__(self, library):
+        self.library = library
+        self.future = None
+        self.synced_playlists = 0
+        self._lock = threading.Lock()
+
+    def start(self, spotipy_client):
+        with self._lock:
+            if self.future and not self.future.done():
+                return self.future
+            self.future = executor.submit(
+                lambda: self.sync(spotipy_client), priority=PREFETCH
+            )
+            return self.future
+
+    def is_syncing(self):
+        return bool(self.future and not self.future.done())
+
+    def sync(self, spotipy_client):
+        started_at = time.time()
+        playlists = playlist_cache.get(spotipy_client, refresh=True)
+        if playlists is None:
+            logger.warning('Got no playlists, not syncing library')
+            return
+        self.library.set_playlists(playlists)
+        outdated = self.library.get_outdated_playlists()
+        for playlist in outdated:
+            tracks = fetch_playlist_tracks(spotipy_client, playlist)
+            if tracks is not None:
+                self.library.set_playlist_tracks(
+                    playlist['id'], playlist['snapshot_id'], tracks
+                )
+                self.synced_playlists += 1
+        logger.debug(
+            'Synced %d of %d playlists in %.2fs', len(outdated),
+            len(playlists), time.time() - started_at
+        )
@@ -4,12 +4,16 @@ import os
 import threading
 
 import spotify
-from appdirs import user_cache_dir
 from spotipy import Spotify, oauth2
 
-from .dbus_listener import DBusListener
+from .http_cache import CachedSession, ResponseCache
+from .http_session import mount_pooled_adapter
+from .library import LibraryStore, LibrarySync
 from .terminal import ResizeChecker
 from .sink import get_wrapped_alsa_sink
+from .spotipy_wrapper import call_stats
+from .token_manager import TokenManager
+from .util import get_cache_path, get_user_cache_path
 
 logger = logging.getLogger(__name__)
 
@@ -34,26 +38,50 @@ class AudioError(Exception):
     pass
 
 
-class LifeCycle(object):
+class SpotifyClient(Spotify):
+    def _get(self, url, args=None, payload=None, **kwargs):
+        # spotipy retries 429s and 5xx itself, printing to the terminal and
+        # silently returning None when it gives up. Our session already
+        # retries those (see ScheduledSession), so just make the call.
+        if args:
+            kwargs.update(args)
+        return self._internal_call('GET', url, payload, kwargs)
+
 
-    user_cache_dir = user_cache_dir(appname='spoppy')
+class LifeCycle(object):
 
     def __init__(self, username, password, player):
+        self.user_cache_dir = get_cache_path()
         if not os.path.isdir(self.user_cache_dir):
             os.makedirs(self.user_cache_dir)
+        # Web API responses and the library are kept per account
+        self.user_data_dir = get_user_cache_path(username)
+        if not os.path.isdir(self.user_data_dir):
+            os.makedirs(self.user_data_dir)
         self.player = player
         self.username = username
         self.password = password
-        self._spotipy_token = None
+        self._token_manager = None
         self._pyspotify_session = None
         self._pyspotify_session_loop = None
         self.service_stop_event = threading.Event()
+        # The DBus listener is added when services are started, so dbus and
+        # gi are only imported once we are logged in
         self.services = [
-            DBusListener(self, self.service_stop_event),
             ResizeChecker(self, self.service_stop_event)
         ]
 
-        self._spotipy_client = Spotify()
+        self.http_session = CachedSession(
+            ResponseCache(os.path.join(self.user_data_dir, 'http_cache'))
+        )
+        self.http_adapter = mount_pooled_adapter(self.http_session)
+        self.library = LibraryStore(
+            os.path.join(self.user_data_dir, 'library.db')
+        )
+        self.library_sync = LibrarySync(self.library)
+        self._spotipy_client = SpotifyClient(
+            requests_session=self.http_session
+        )
         # self._spotipy_client.trace = True
         # self._spotipy_client.trace_out = True
 
@@ -70,6 +98,10 @@ class LifeCycle(object):
                 )
 
     def start_lifecycle_services(self):
+        from .dbus_listener import DBusListener
+        self.services.insert(
+            0, DBusListener(self, self.service_stop_event)
+        )
         for service in self.services:
             if service.should_run:
                 service.start()
@@ -94,6 +126,12 @@ class LifeCycle(object):
         if self._pyspotify_session_loop:
             self._pyspotify_session_loop.stop()
         logger.debug('Pyspotify session loop stopped')
+        if self._token_manager:
+            self._token_manager.stop()
+        self.library.close()
+        logger.debug('HTTP connection stats: %s', self.http_adapter.stats())
+        logger.debug('Web API stats: %s', call_stats.get_slowest())
+        self.http_adapter.shutdown()
 
     def get_pyspotify_client(self):
         return self._pyspotify_session
@@ -219,18 +257,33 @@ class LifeCycle(object):
             cache_path=cache_location
         )
 
-    def check_spotipy_logged_in(self):
-        sp_oauth = self.get_spotipy_oauth()
-        token_info = sp_oauth.get_cached_token()
+    def get_token_manager(self):
+        if self._token_manager is None:
+            self._token_manager = TokenManager(
+                self.get_spotipy_oauth(), self._spotipy_client
+            )
+        return self._token_manager
 
-        if token_info:
-            self.set_spotipy_token(token_info)
+    def check_spotipy_logged_in(self):
+        token_manager = self.get_token_manager()
+        # The token is kept fresh in the background, so the cache file only
+        # needs to be read if we don't have one yet
+        if not token_manager.get_access_token():
+            token_manager.load()
+
+    def refresh_spotipy_token(self, expired_token=None):
+        '''
+        Refreshes the access token after the web API rejected it
+        :param expired_token: The access token that was rejected
+        :returns: True if we have a token that should work
+        '''
+        token_manager = self.get_token_manager()
+        if not token_manager.get_access_token():
+            return token_manager.load()
+        return token_manager.refresh(expired_token)
 
     def refresh_and_get_spotipy_client(self):
-        if self._spotipy_token:
-            # Loads of access to "private" stuff...
-            self._spotipy_client._auth = self._spotipy_token
         return self._spotipy_client
 
     def set_spotipy_token(self, token):
-        self._spotipy_token = token['access_token']
+        self.get_token_manager().set_token_info(token)
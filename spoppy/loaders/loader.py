@@ -1,7 +1,8 @@
 import logging
 import threading
 
-from appdirs import user_cache_dir
+from ..executor import CancelledError
+from ..util import get_cache_path
 from .search import Search
 
 logger = logging.getLogger(__name__)
@@ -24,63 +25,74 @@ class Results(object):
         return self.results[key]
 
 
-AUTH_ERROR_MESSAGE = (
-    'While accessing spotify, we encountered a 401 access denied error, '
-    'probably due to your access token being expired. I\'ve attempted to '
-    'automatically refresh you access, so you can retry this operation. '
-    'If that didn\'t work, try restarting spoppy, and if that doesn\'t work '
-    'try removing the file %s/spotipy_token.cache, restart '
-    'spoppy and log in to spotify web API again. For more information on this '
-    'issue, see https://github.com/sindrig/spoppy/issues/127'
-) % (user_cache_dir(appname='spoppy'), )
+def get_auth_error_message():
+    return (
+        'While accessing spotify, we encountered a 401 access denied error, '
+        'probably due to your access token being expired. I\'ve attempted '
+        'to automatically refresh you access, so you can retry this '
+        'operation. If that didn\'t work, try restarting spoppy, and if that '
+        'doesn\'t work try removing the file %s, restart spoppy and log in '
+        'to spotify web API again. For more information on this issue, see '
+        'https://github.com/sindrig/spoppy/issues/127'
+    ) % (get_cache_path('spotipy_token.cache'), )
 
-RECEIVED_NONE_MESSAGE = (
-    'While fetching data from spotify, we got no results, which is kind of '
-    'very strange. Please create an issue on https://github.com/sindrig/spoppy'
-    ' and include the log file "%s/spoppy.log".' % (
-        user_cache_dir(appname='spoppy')
-    )
-)
+
+def get_received_none_message():
+    return (
+        'While fetching data from spotify, we got no results, which is kind '
+        'of very strange. Please create an issue on '
+        'https://github.com/sindrig/spoppy and include the log file "%s".'
+    ) % (get_cache_path('spoppy.log'), )
 
 
 class Loader(Search):
 
-    def __init__(self, navigator):
+    def __init__(self, navigator, owner=None, priority=None,
+                 response_data=None):
         self.navigator = navigator
         self.session = navigator.session
+        self.owner = owner
+        # None loads at the priority of whatever creates the loader
+        self.priority = priority
+        # Data we already have (i.e. from the last time), instead of
+        # getting it again
+        self.response_data = response_data
 
         self.loaded_event = threading.Event()
 
-        super(Search, self).__init__()
-
         self.start()
 
     def run(self):
         logger.debug('Getting playlists for %s' % self.navigator.username)
         try:
-            response_data = self.get_data()
+            response_data = self.response_data
+            if response_data is None:
+                response_data = self.response_data = self.get_data()
+            if response_data:
+                logger.debug('Got these keys: %s', response_data.keys())
+
+                # Loading the items can time out as well
+                self.handle_results(response_data['items'])
+            else:
+                self.results = self.get_empty_results(
+                    message=get_received_none_message()
+                )
+        except CancelledError:
+            logger.debug('Loading cancelled')
+            self.results = self.get_empty_results()
         except Exception as e:
             if getattr(e, 'http_status', None) == 401:
                 logger.debug(
                     'Access token for spotipy expired, or unknown auth error'
                 )
                 self.results = self.get_empty_results(
-                    message=AUTH_ERROR_MESSAGE
+                    message=get_auth_error_message()
                 )
             else:
                 logger.exception(
                     'Something weird happened when getting recommendations'
                 )
                 self.results = self.get_empty_results()
-        else:
-            if response_data:
-                logger.debug('Got these keys: %s', response_data.keys())
-
-                self.handle_results(response_data['items'])
-            else:
-                self.results = self.get_empty_results(
-                    message=RECEIVED_NONE_MESSAGE
-                )
         finally:
             self.loaded_event.set()
 
@@ -1,5 +1,10 @@
 import logging
+import sqlite3
+import threading
+import time
 
+from ..batching import fetch_remaining_pages
+from ..executor import BACKGROUND_WORKERS
 from .loader import Loader
 
 logger = logging.getLogger(__name__)
@@ -16,18 +21,147 @@ class Playlist(object):
         self.is_loaded = True
 
 
+class PlaylistCache(object):
+    '''
+    Holds all of the current user's playlists. The web API returns at most
+    50 playlists per request, so once the first page tells us the total we
+    fetch the remaining pages in parallel.
+    '''
+    PAGE_SIZE = 50
+    MAX_WORKERS = BACKGROUND_WORKERS
+    CACHE_TIMEOUT = 5 * 60
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self._items = None
+        self._fetched_at = 0
+        # Playlists fetched before this may have changed
+        self.cleared_at = time.time()
+
+    def peek(self):
+        '''
+        :returns: A tuple of (playlists, time they were fetched), even if
+                  they are not fresh, or None if we have none
+        '''
+        items = self._items
+        if items is None:
+            return None
+        return list(items), self._fetched_at
+
+    def is_fresh(self):
+        return self._items is not None and (
+            time.time() - self._fetched_at < self.CACHE_TIMEOUT
+        )
+
+    def get(self, spotipy_client, refresh=False):
+        '''
+        Gets all playlists for the current user, from cache if possible
+        :param spotipy_client: The client used to fetch the playlists
+        :param refresh: Ignore the cache and fetch everything again
+        :returns: List of playlist items, or None if spotify returned nothing
+        '''
+        with self._lock:
+            if refresh or not self.is_fresh():
+                items = self.fetch_all(spotipy_client)
+                if items is None:
+                    return None
+                self._items = items
+                self._fetched_at = time.time()
+            return list(self._items)
+
+    def fetch_all(self, spotipy_client):
+        first_page = spotipy_client.current_user_playlists(
+            limit=self.PAGE_SIZE
+        )
+        if not first_page:
+            return None
+        items = fetch_remaining_pages(
+            first_page,
+            lambda limit, offset: spotipy_client.current_user_playlists(
+                limit=limit, offset=offset
+            ),
+            max_workers=self.MAX_WORKERS,
+        )
+        logger.debug('Got %d playlists in total', len(items))
+        return items
+
+
+playlist_cache = PlaylistCache()
+
+
+# playlist type -> (response data, time it was fetched)
+last_known_playlists = {}
+
+
+def get_last_known_playlists(navigator, playlist_type):
+    '''
+    Gets the playlists we got the last time, from memory or the library
+    :returns: A tuple of (response data, time it was fetched), or None
+    '''
+    library = navigator.lifecycle.library
+    try:
+        if playlist_type == 'mine':
+            cached = playlist_cache.peek()
+            if cached:
+                items, fetched_at = cached
+            else:
+                items = library.get_playlists()
+                if items is None:
+                    return None
+                fetched_at = library.get_playlists_synced_at()
+            return {'items': items, 'total': len(items)}, fetched_at
+        if playlist_type not in last_known_playlists:
+            cached = library.get_response(playlist_type)
+            if cached is None:
+                return None
+            last_known_playlists[playlist_type] = cached
+        return last_known_playlists[playlist_type]
+    except sqlite3.Error:
+        # We just get them from the web API instead
+        logger.exception(
+            'Could not read %s playlists from library', playlist_type
+        )
+        return None
+
+
 class PlaylistLoader(Loader):
     search_type = 'playlists'
-    playlist_type = 'mine'
+
+    def __init__(self, navigator, owner=None, playlist_type='mine',
+                 refresh=False, **kwargs):
+        self.playlist_type = playlist_type
+        # Get the user's playlists again, even if we got them recently
+        self.refresh = refresh
+        super(PlaylistLoader, self).__init__(navigator, owner=owner, **kwargs)
 
     def get_data(self):
         logger.info('Playlist type: %s' % self.playlist_type)
         if self.playlist_type == 'mine':
-            return self.navigator.spotipy_client.current_user_playlists()
+            items = playlist_cache.get(
+                self.navigator.spotipy_client, refresh=self.refresh
+            )
+            if items is None:
+                return None
+            self.navigator.lifecycle.library.set_playlists(items)
+            return {
+                'items': items,
+                'total': len(items),
+            }
         elif self.playlist_type == 'featured':
-            return (
+            response_data = (
                 self.navigator.spotipy_client.featured_playlists()['playlists']
             )
+            if response_data:
+                last_known_playlists[self.playlist_type] = (
+                    response_data, time.time()
+                )
+                self.navigator.lifecycle.library.set_response(
+                    self.playlist_type, response_data
+                )
+            return response_data
         else:
             raise ValueError('Unknown playlist type %s' % self.playlist_type)
 
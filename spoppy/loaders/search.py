@@ -3,6 +3,7 @@
 # this will have to wrap it up. The goal is to mimick pyspotify's
 # search class as best as I can.
 
+import json
 import logging
 import threading
 
@@ -12,26 +13,47 @@ from spotify.album import Album
 from spotify.artist import Artist
 from spotify.playlist import Playlist
 
+from ..cache import LRUCache
+from ..executor import FOREGROUND, executor
+
 logger = logging.getLogger(__name__)
 
 
 def search(*args, **kwargs):
+    if kwargs.get('search_type') == MultiSearch.SEARCH_TYPE:
+        return MultiSearch(*args, **kwargs)
     return Search(*args, **kwargs)
 
 
+def get_search_size(search):
+    # Approximation of the memory used by a page of search results
+    response = search.results.response
+    return len(json.dumps(response)) if response else 0
+
+
+# Loaded search pages, keyed by (search_type, query, offset)
+search_cache = LRUCache(
+    max_entries=200,
+    max_size=8 * 1024 * 1024,
+    ttl=10 * 60,
+    sizeof=get_search_size,
+)
+
+
 class SearchResults(object):
     def __init__(self, response, term, results, offset, total,
-                 previous_page=None, next_page=None):
+                 previous_page=None, next_page=None, limit=None):
         self.response = response
         self.term = term
         self.results = results
         self.total = total
         self.offset = offset
+        self.limit = limit or Search.PAGE_SIZE
         self.previous_page = previous_page
         self.next_page = next_page
 
 
-class Search(threading.Thread):
+class Search(object):
     ENDPOINTS = {
         # Each entry is a tuple, (HTTP_ENDPOINT, CLS)
         'tracks': (
@@ -52,6 +74,10 @@ class Search(threading.Thread):
         ),
     }
     BASE_URL = 'https://api.spotify.com'
+    PAGE_SIZE = 20
+    priority = FOREGROUND
+    owner = None
+    future = None
 
     def __init__(self, navigator, query='', callback=None,
                  track_offset=0, track_count=20,
@@ -59,10 +85,16 @@ class Search(threading.Thread):
                  artist_offset=0, artist_count=20,
                  playlist_offset=0, playlist_count=20,
                  search_type=None,
-                 sp_search=None, add_ref=True, next_from=None, prev_from=None):
+                 sp_search=None, add_ref=True, next_from=None, prev_from=None,
+                 owner=None, priority=FOREGROUND, response_data=None):
         self.navigator = navigator
+        self.owner = owner
+        self.priority = priority
         self.query = query
         self.search_type = search_type
+        self.callback = callback
+        # A page we already have, from a search of multiple types
+        self.response_data = response_data
 
         # next from and prev from are SearchResult items
         self.next_from = next_from and next_from.response
@@ -74,14 +106,37 @@ class Search(threading.Thread):
 
         self.results = self.get_empty_results()
 
-        super(Search, self).__init__()
-
         self.start()
 
+    def start(self):
+        self.future = executor.submit(
+            self.run, priority=self.priority, owner=self.owner
+        )
+        # Nobody should wait forever for a search that was cancelled before
+        # it got to run
+        self.future.add_done_callback(lambda future: self.loaded_event.set())
+
+    def cancel(self):
+        if self.future:
+            self.future.cancel()
+
+    def promote(self):
+        '''
+        Called when the user is waiting for what we started loading before
+        they asked for it
+        '''
+        if self.future:
+            executor.promote(self.future, FOREGROUND)
+
+    def is_cancelled(self):
+        return bool(self.future and self.future.cancel_requested)
+
     def run(self):
         try:
             logger.debug('Getting %s: %s', self.type, self.query)
-            if self.next_from:
+            if self.response_data is not None:
+                results = {self.search_type: self.response_data}
+            elif self.next_from:
                 results = self.navigator.spotipy_client.next(
                     self.next_from
                 )
@@ -91,20 +146,27 @@ class Search(threading.Thread):
                 )
             else:
                 results = self.navigator.spotipy_client.search(
-                    self.query, limit=20, type=self.type
+                    self.query, limit=self.PAGE_SIZE, type=self.type
                 )
-            response_data = results[self.search_type]
-            self.results = self.handle_results(response_data)
+            if self.is_cancelled():
+                logger.debug('Search for %s cancelled', self.query)
+                return
+            self.results = self.handle_response(results)
         except requests.exceptions.RequestException:
             logger.exception('RequestException')
         except Exception:
             logger.exception('Something went wrong while handling results')
         finally:
+            if self.callback and not self.is_cancelled():
+                self.callback(self)
             self.loaded_event.set()
 
     def get_empty_results(self):
         return SearchResults(None, self.query, [], 0, 0)
 
+    def handle_response(self, results):
+        return self.handle_results(results[self.search_type])
+
     def handle_results(self, response_data):
         item_results = self.manipulate_items([
             (self.item_cls(self.navigator.session, item['uri']), item)
@@ -118,9 +180,15 @@ class Search(threading.Thread):
             response_data['offset'],
             response_data['total'],
             response_data['previous'],
-            response_data['next']
+            response_data['next'],
+            response_data.get('limit'),
         )
 
+    def get_cache_key(self, offset=None):
+        if offset is None:
+            offset = self.results.offset
+        return (self.search_type, self.query, offset)
+
     def manipulate_items(self, items):
         items = [
             item if isinstance(item, tuple) else (item, {})
@@ -145,3 +213,53 @@ class Search(threading.Thread):
         elif self.search_type == 'playlists':
             return items
         raise TypeError('Unknown search type %s' % self.search_type)
+
+
+class MultiSearch(Search):
+    '''
+    Searches for tracks, albums, artists and playlists in a single request.
+    The results are the raw pages for each type, the items of a type are
+    only loaded (see `get_group_search`) when the user wants to see them.
+    '''
+    SEARCH_TYPE = 'all'
+    SEARCH_TYPES = ('tracks', 'albums', 'artists', 'playlists')
+    ENDPOINTS = dict(
+        Search.ENDPOINTS,
+        all=('track,album,artist,playlist', None),
+    )
+
+    def __init__(self, *args, **kwargs):
+        kwargs['search_type'] = self.SEARCH_TYPE
+        self.group_searches = {}
+        self._group_lock = threading.Lock()
+        super(MultiSearch, self).__init__(*args, **kwargs)
+
+    def handle_response(self, results):
+        pages = [
+            (search_type, results[search_type])
+            for search_type in self.SEARCH_TYPES
+            if results.get(search_type)
+        ]
+        return SearchResults(
+            results,
+            self.query,
+            pages,
+            0,
+            sum(page['total'] for _, page in pages),
+            limit=self.PAGE_SIZE,
+        )
+
+    def get_group_search(self, search_type):
+        '''
+        Gets a search of `search_type` that loads the items of the page we
+        already got for that type, without requesting it again
+        '''
+        with self._group_lock:
+            group_search = self.group_searches.get(search_type)
+            if group_search is None or group_search.is_cancelled():
+                group_search = self.group_searches[search_type] = search(
+                    self.navigator, self.query,
+                    search_type=search_type,
+                    response_data=dict(self.results.results)[search_type],
+                )
+            return group_search
@@ -2,6 +2,8 @@ import logging
 
 from spotify.track import Track
 
+from ..batching import batch_lookup
+from ..library import get_playlist_tracks
 from .loader import Loader
 
 logger = logging.getLogger(__name__)
@@ -10,18 +12,79 @@ logger = logging.getLogger(__name__)
 class TrackLoader(Loader):
     search_type = 'tracks'
 
-    def __init__(self, navigator, tracks=[], url=''):
+    def __init__(self, navigator, tracks=[], url='', owner=None):
         self.tracks = tracks
         self.url = url
-        super(TrackLoader, self).__init__(navigator)
+        super(TrackLoader, self).__init__(navigator, owner=owner)
 
     def get_data(self):
         if self.tracks:
-            return self.navigator.spotipy_client.tracks(
-                self.tracks
+            tracks = batch_lookup.lookup(
+                self.navigator.spotipy_client, 'tracks', self.tracks
             )
+            # Same shape as playlist tracks
+            return {
+                'items': [{'track': track} for track in tracks if track],
+            }
         else:
             return self.navigator.spotipy_client._get(self.url)
 
     def get_item(self, session, item):
         return Track(session, item['track']['uri'])
+
+
+class PlaylistTrackLoader(TrackLoader):
+    '''
+    Loads all tracks of a playlist, from the local library when it has the
+    playlist's current snapshot
+    '''
+
+    def __init__(self, navigator, playlist, owner=None):
+        self.playlist = playlist
+        super(PlaylistTrackLoader, self).__init__(navigator, owner=owner)
+
+    def get_data(self):
+        tracks = get_playlist_tracks(
+            self.navigator.lifecycle.library,
+            self.navigator.spotipy_client,
+            self.playlist
+        )
+        if tracks is None:
+            return None
+        return {
+            'items': [{'track': track} for track in tracks if track],
+        }
+
+
+class LoadedTrackLoader(TrackLoader):
+    '''
+    Gets the available tracks of a playlist we already have the tracks of,
+    checking them all in the background instead of one by one in the UI
+    '''
+
+    def __init__(self, navigator, playlist, owner=None):
+        self.playlist = playlist
+        super(LoadedTrackLoader, self).__init__(navigator, owner=owner)
+
+    def get_data(self):
+        return {
+            'items': list(self.playlist.tracks),
+        }
+
+    def get_item(self, session, item):
+        return item
+
+
+class LibraryTrackLoader(TrackLoader):
+    '''
+    Loads a track we found in the local library, without the web API
+    '''
+
+    def __init__(self, navigator, track_item, owner=None):
+        self.track_item = track_item
+        super(LibraryTrackLoader, self).__init__(navigator, owner=owner)
+
+    def get_data(self):
+        return {
+            'items': [{'track': self.track_item}],
+        }
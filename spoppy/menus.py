@@ -1,31 +1,69 @@
+import bisect
 import logging
+import os
 import threading
-import webbrowser
+import time
 from collections import namedtuple
-from itertools import chain
+from itertools import chain, count
 
 from spotify import TrackAvailability
 from spotify.playlist import Playlist
 
 from . import responses
-from .http_server import oAuthServerThread
-from .radio import Recommendations
-from .loaders.playlists import PlaylistLoader
-from .loaders.tracks import TrackLoader
-from .loaders.search import search
-from .util import (format_album, format_track, get_duration_from_s,
+from .batching import add_tracks_to_playlist, replace_playlist_tracks
+from .cache import LRUCache
+from .executor import PREFETCH, executor, running_at
+from .spotipy_wrapper import call_stats
+from .loaders.playlists import (PlaylistLoader, get_last_known_playlists,
+                                playlist_cache)
+from .loaders.tracks import (LibraryTrackLoader, LoadedTrackLoader,
+                             PlaylistTrackLoader, TrackLoader)
+from .loaders.search import search, search_cache
+from .util import (format_age, format_album, format_track,
+                   format_track_item, get_duration_from_s, get_match_score,
+                   get_sort_key_for_menu_item, readchar,
                    single_char_with_timeout, sorted_menu_items)
 
 logger = logging.getLogger(__name__)
 
 MenuValue = namedtuple('MenuValue', ('name', 'destination'))
 MockPlaylist = namedtuple('Playlist', ('name', 'tracks'))
+# Options whose keys start with what the user typed come before all names
+KEY_MATCH_SCORE = 1 << 20
+
+# The options matching patterns the user typed, shared by all options. The
+# size is the total number of matches.
+match_cache = LRUCache(max_entries=256, max_size=10 ** 6, sizeof=len)
+options_ids = count()
+
+
+def get_library_tracks(navigator, query, limit):
+    '''
+    Searches the local library, which works while we are disconnected
+    '''
+    try:
+        return navigator.lifecycle.library.search_tracks(query, limit=limit)
+    except Exception:
+        logger.exception('Could not search library for %s', query)
+        return []
 
 
 class Options(dict):
     def __init__(self, *args, **kwargs):
         super(Options, self).__init__(*args, **kwargs)
-        self._cached_matches = {}
+        # Identifies what these options contain in `match_cache`, changes
+        # when the options change
+        self._cache_id = next(options_ids)
+        # Options created by filter get their matches from the options they
+        # were filtered from, while those haven't changed
+        self._parent = None
+        self._parent_cache_id = None
+        # The items in the order they are shown and what they are sorted
+        # by, and the best matches for the last pattern, see
+        # get_sorted_items
+        self._sorted_items = None
+        self._sort_keys = None
+        self._ranked_matches = (None, None)
         self._stripped_keys_mapper = {
             key.replace(' ', ''): key
             for key in self
@@ -33,71 +71,204 @@ class Options(dict):
         self.check_unique_keys()
 
     def __setitem__(self, key, value):
+        if key in self:
+            if self[key] == value:
+                # Nothing changes, so everything we have cached still holds
+                return
+            self.remove_sorted_item(key)
         super(Options, self).__setitem__(key, value)
         self._stripped_keys_mapper[key.replace(' ', '')] = key
+        self.clear_cache()
+        self.insert_sorted_item(key, value)
         self.check_unique_keys()
 
+    def __delitem__(self, key):
+        self.remove_sorted_item(key)
+        super(Options, self).__delitem__(key)
+        del self._stripped_keys_mapper[key.replace(' ', '')]
+        self.clear_cache()
+
+    def clear_cache(self):
+        '''
+        Forgets the matches of these options, the sorted items are kept up to
+        date by insert_sorted_item and remove_sorted_item
+        '''
+        self._cache_id = next(options_ids)
+        self._ranked_matches = (None, None)
+
+    def insert_sorted_item(self, key, value):
+        if self._sorted_items is None:
+            return
+        sort_key = get_sort_key_for_menu_item((key, value))
+        i = bisect.bisect_right(self._sort_keys, sort_key)
+        self._sort_keys.insert(i, sort_key)
+        self._sorted_items.insert(i, (key, value))
+
+    def remove_sorted_item(self, key):
+        if self._sorted_items is None or key not in self:
+            return
+        sort_key = get_sort_key_for_menu_item((key, self[key]))
+        i = bisect.bisect_left(self._sort_keys, sort_key)
+        # Keys like 1 and 01 are sorted the same
+        while self._sorted_items[i][0] != key:
+            i += 1
+        del self._sort_keys[i]
+        del self._sorted_items[i]
+
+    def get_sorted_items(self, pattern='', limit=None):
+        '''
+        Gets the items in the order they are shown. Without a pattern they
+        are sorted by key, with a pattern the best matches come first. Either
+        way they are only sorted once, so getting another page is cheap.
+        :param pattern: Only get items matching this pattern
+        :param limit: The maximum number of items to get
+        :returns: A list of (key, value) tuples
+        '''
+        if self._sorted_items is None:
+            self._sorted_items = sorted_menu_items(self.items())
+            self._sort_keys = [
+                get_sort_key_for_menu_item(item) for item in self._sorted_items
+            ]
+        if not pattern:
+            return self._sorted_items[:limit]
+        last_pattern, ranked = self._ranked_matches
+        if pattern != last_pattern:
+            scores = self.get_scores(pattern)
+            # Equal scores keep the order of the keys
+            ranked = sorted(
+                ((key, self[key]) for key in scores),
+                key=lambda item: (
+                    -scores[item[0]], get_sort_key_for_menu_item(item)
+                )
+            )
+            self._ranked_matches = (pattern, ranked)
+        return ranked[:limit]
+
+    def count_items(self, pattern=''):
+        if not pattern:
+            return len(self)
+        return len(self.get_scores(pattern))
+
     def check_unique_keys(self):
         if not len(self) == len(self._stripped_keys_mapper):
             raise TypeError('Two keys cannot be the same')
 
     def get_possibilities_from_cache(self, pattern):
-        return self._cached_matches.get(pattern)
-
-    def get_possibilities(self, pattern):
-        cached_match = self.get_possibilities_from_cache(pattern)
-        if cached_match:
-            logger.debug('Pattern %s found in cache' % pattern)
+        return match_cache.get((self._cache_id, pattern))
+
+    def get_scores(self, pattern):
+        '''
+        Scores the options matching `pattern`, options whose keys start with
+        the pattern score higher than any name
+        :returns: A dict of matching keys and their scores
+        '''
+        pattern = pattern.lower()
+        parent = self._parent
+        if parent is not None and parent._cache_id == self._parent_cache_id:
+            # We only have some of our parent's options, and they match the
+            # same as they do there
+            return {
+                key: score
+                for key, score in parent.get_scores(pattern).items()
+                if key in self
+            }
+        scores = self.get_possibilities_from_cache(pattern)
+        if scores is not None:
+            logger.debug('Pattern %s found in cache', pattern)
+            return scores
+        # Whatever matches a pattern also matches the pattern without its
+        # last character, so we only need to look at what matched that
+        seed = None
+        if len(pattern) > 1:
+            seed = match_cache.peek((self._cache_id, pattern[:-1]))
+        if seed is None:
+            candidates = self.items()
         else:
-            logger.debug('Trying to match %s' % pattern)
-            possibilities_key = []
-            possibilities_name = []
-            pattern = pattern.lower()
-            for key, (name, destination) in self.items():
-                if key.lstrip(' ').startswith(pattern):
-                    possibilities_key.append(key)
-                elif self.fuzzy_match(pattern, name.lower()):
-                    possibilities_name.append(key)
-
-            logger.debug('possibilities_key: %s' % possibilities_key)
-            logger.debug('possibilities_name: %s' % possibilities_name)
-            cached_match = self._cached_matches[pattern] = (
-                list(set(possibilities_key + possibilities_name))
+            candidates = [(key, self[key]) for key in seed]
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                'Trying to match %s against %d options, match cache hit '
+                'rate %.2f', pattern, len(candidates),
+                match_cache.stats()['hit_rate']
             )
-        return cached_match
+        scores = {}
+        for key, (name, destination) in candidates:
+            if key.lstrip(' ').startswith(pattern):
+                scores[key] = KEY_MATCH_SCORE
+            else:
+                score = get_match_score(pattern, name.lower())
+                if score is not None:
+                    scores[key] = score
+        logger.debug('Found %d possibilities', len(scores))
+        match_cache.set((self._cache_id, pattern), scores)
+        return scores
 
-    def fuzzy_match(self, pattern, name):
-        try:
-            for key in pattern:
-                name = name[name.index(key) + 1:]
-            return True
-        except ValueError:
-            return False
+    def get_possibilities(self, pattern):
+        return list(self.get_scores(pattern))
 
     def filter(self, pattern):
         possibilities = self.get_possibilities(pattern)
 
-        return Options({
+        options = Options({
             key: value
             for key, value in
             self.items()
             if key in possibilities
         })
+        options._parent = self
+        options._parent_cache_id = self._cache_id
+        return options
 
     def match_best_or_none(self, pattern):
-        logger.debug('Trying to match (%s)' % pattern)
+        logger.debug('Trying to match (%s)', pattern)
         possibilities = self.get_possibilities(pattern)
-        logger.debug('Available possibilities: %s' % possibilities)
+        # The matches of a short pattern can be most of the options
+        logger.debug('%d possibilities', len(possibilities))
         if len(possibilities) == 1:
             logger.debug('Exactly one possibility, returning that!')
             return self[possibilities[0]]
         if pattern in self._stripped_keys_mapper:
-            logger.debug('Pattern matches stripped key, returning key %s' % (
+            logger.debug(
+                'Pattern matches stripped key, returning key %s',
                 self._stripped_keys_mapper[pattern]
-            ))
+            )
             return self[self._stripped_keys_mapper[pattern]]
 
 
+class LazyMenu(object):
+    '''
+    A menu destination that creates its menu when it is selected. The menu
+    can be prepared before that, so it starts loading while the user is
+    still deciding.
+    '''
+
+    def __init__(self, create_menu):
+        self.create_menu = create_menu
+        self.prepared = None
+
+    def __call__(self):
+        menu, self.prepared = self.prepared, None
+        if menu is None:
+            menu = self.create_menu()
+        else:
+            menu.promote_loading()
+        return menu
+
+    def prepare(self):
+        if self.prepared is None:
+            self.prepared = self.create_menu()
+            # The user may never go there, so whatever they are waiting for
+            # is loaded first
+            with running_at(PREFETCH):
+                self.prepared.start_loading()
+
+    def cancel(self):
+        menu, self.prepared = self.prepared, None
+        if menu is not None:
+            logger.debug('Cancelling prepared menu %s', menu)
+            menu.cleanup()
+
+
 class Menu(object):
     INCLUDE_UP_ITEM = True
 
@@ -111,6 +282,16 @@ class Menu(object):
     num_iterations = 0
     loaded = False
     loader_enabled = True
+    # Menus that keep their options when the user comes back to them set
+    # this, see resume
+    INCREMENTAL_OPTIONS = False
+    # Keys of options that may change while the user is in another menu
+    VOLATILE_OPTIONS = ()
+    _options_dirty = True
+    # The destination we are preparing, see speculate
+    _speculation = None
+    # How often we check for updates while waiting for input, see poll_input
+    POLL_INTERVAL = 0.1
 
     def __init__(self, navigator):
         self.navigator = navigator
@@ -123,13 +304,101 @@ class Menu(object):
 
     def initialize(self):
         self._options = Options(self.get_options())
+        # Options built before we have loaded anything must be built again
+        self._options_dirty = not self.loader_done()
+        self.add_navigation_options()
+        self.filter = ''
+
+    def add_navigation_options(self):
         self._options['q'] = MenuValue('quit', responses.QUIT)
         if self.INCLUDE_UP_ITEM:
             self._options['u'] = MenuValue('..', responses.UP)
         if self.navigator.player.has_been_loaded():
             self._options['p'] = MenuValue('player', responses.PLAYER)
+        else:
+            player = self._options.get('p')
+            if player and player.destination == responses.PLAYER:
+                # Nothing has been loaded since we added it
+                del self._options['p']
+
+    def resume(self):
+        '''
+        Called when the user comes back to this menu from another one. Menus
+        with `INCREMENTAL_OPTIONS` only build their `VOLATILE_OPTIONS` again,
+        unless their options were built before they loaded, others are
+        initialized again.
+        '''
+        if not self.INCREMENTAL_OPTIONS or self._options_dirty:
+            self.initialize()
+            return
+        # Options that are the same as before are left alone, so the
+        # options keep their matches and the order they are shown in
+        volatile_options = self.get_volatile_options()
+        for key in self.VOLATILE_OPTIONS:
+            if key in self._options and key not in volatile_options:
+                del self._options[key]
+        for key, value in volatile_options.items():
+            self._options[key] = value
+        self.add_navigation_options()
         self.filter = ''
 
+    def get_volatile_options(self):
+        '''
+        :returns: The options whose keys are in `VOLATILE_OPTIONS`
+        '''
+        return {}
+
+    def lazy(self, menu_cls, **attributes):
+        '''
+        Menus are only created when they are selected, so building the
+        options doesn't pay for menus the user never visits
+        :param menu_cls: The menu to create
+        :param attributes: Attributes to set on the menu
+        :returns: A LazyMenu that creates the menu
+        '''
+        def create_menu():
+            menu = menu_cls(self.navigator)
+            for name, value in attributes.items():
+                setattr(menu, name, value)
+            return menu
+        return LazyMenu(create_menu)
+
+    def start_loading(self):
+        '''
+        Starts loading what this menu shows, i.e. before the user gets here
+        '''
+        if (
+            self.is_loader_enabled() and
+            not self.loader and
+            hasattr(self, 'get_loader')
+        ):
+            self.loader = self.get_loader()
+
+    def promote_loading(self):
+        '''
+        Called when the user goes to this menu after it started loading
+        '''
+        loader = getattr(self, 'loader', None)
+        if loader:
+            loader.promote()
+
+    def speculate(self, destination):
+        '''
+        Prepares the destination the user will most likely go to next, and
+        stops preparing the one we prepared before
+        :param destination: The destination, or None if there is no likely
+                            destination any more
+        '''
+        if destination is self._speculation:
+            return
+        if self._speculation is not None:
+            self._speculation.cancel()
+        self._speculation = None
+        if isinstance(destination, LazyMenu):
+            logger.debug('Preparing %s', destination)
+            destination.prepare()
+            self._speculation = destination
+
     def handle_results(self):
         pass
 
@@ -138,7 +407,7 @@ class Menu(object):
             if not self.loader:
                 if not hasattr(self, 'get_loader'):
                     raise TypeError('Missing get_loader')
-                self.loader = self.get_loader()
+                self.start_loading()
             if self.loader:
                 self.loader.loaded_event.wait(1)
                 if not self.loader.loaded_event.is_set():
@@ -159,6 +428,26 @@ class Menu(object):
         while response is None:
             response = single_char_with_timeout(60)
             self.navigator.player.check_end_of_track()
+        return self.handle_input(response)
+
+    def poll_input(self, is_pending):
+        '''
+        Waits for input while something is going on in the background
+        :param is_pending: Called between waits, returns False when there is
+                           something new to show
+        :returns: The input, or None if nothing is pending any more
+        '''
+        while is_pending():
+            # readchar times out by itself. single_char_with_timeout
+            # interrupts the main thread, which is fine once a minute but
+            # not ten times a second.
+            response = readchar(wait_for_char=self.POLL_INTERVAL)
+            self.navigator.player.check_end_of_track()
+            if response is not None:
+                return response
+        return None
+
+    def handle_input(self, response):
         if response == Menu.BACKSPACE:
             self.filter = self.filter[:-1]
             return responses.NOOP
@@ -196,41 +485,42 @@ class Menu(object):
         ):
             return 'Loading...' + '.' * self.num_iterations
 
-        if self.filter:
-            items = sorted_menu_items(
-                self._options.filter(self.filter).items()
-            )
-        else:
-            items = sorted_menu_items(
-                self._options.items()
-            )
-        if not items:
+        number_of_items = self._options.count_items(self.filter)
+        if not number_of_items:
+            self.PAGE = 0
             menu_items = ('No matches for "%s"' % self.filter, )
         else:
-            menu_items = tuple(
-                self.get_menu_item(key, value.name) for key, value in
-                items
-            )
-            if self.filter:
-                is_valid = self.is_valid_response()
-                if is_valid:
-                    menu_items += (
-                        '',
-                        'Press [return] to go to (%s)' % is_valid.name
-                    )
-        if menu_items:
-            number_of_menu_items = self.navigator.get_ui_height() - 4
-            if len(menu_items) >= number_of_menu_items:
-                paginated_menu_items = []
-                while not paginated_menu_items:
-                    start_idx = self.PAGE * number_of_menu_items
-                    end_idx = (self.PAGE + 1) * number_of_menu_items
-                    paginated_menu_items = menu_items[start_idx:end_idx]
-                    if not paginated_menu_items:
-                        self.PAGE -= 1
-                menu_items = paginated_menu_items
+            footer = ()
+            is_valid = self.filter and self.is_valid_response()
+            if is_valid:
+                footer = (
+                    '',
+                    'Press [return] to go to (%s)' % is_valid.name
+                )
+            # The user will probably press return next
+            self.speculate(is_valid.destination if is_valid else None)
+            # Only the rows of the current page are formatted
+            number_of_rows = number_of_items + len(footer)
+            rows_per_page = max(self.navigator.get_ui_height() - 4, 1)
+            if number_of_rows >= rows_per_page:
+                self.PAGE = min(
+                    self.PAGE, (number_of_rows - 1) // rows_per_page
+                )
+                start_idx = self.PAGE * rows_per_page
+                end_idx = start_idx + rows_per_page
             else:
                 self.PAGE = 0
+                start_idx, end_idx = 0, number_of_rows
+            items = self._options.get_sorted_items(
+                self.filter, limit=min(end_idx, number_of_items)
+            )
+            menu_items = tuple(
+                self.get_menu_item(key, value.name) for key, value in
+                items[start_idx:end_idx]
+            ) + footer[
+                max(start_idx - number_of_items, 0):
+                max(end_idx - number_of_items, 0)
+            ]
 
         above_menu_items = self._get_header()
         return (
@@ -265,53 +555,170 @@ class Menu(object):
     def disable_loader(self):
         self.loader_enabled = False
 
+    def cleanup(self):
+        # Called when the user leaves this menu, stop what it started
+        self.speculate(None)
+        executor.cancel_owner(self)
+        loader = getattr(self, 'loader', None)
+        if loader and loader.is_cancelled():
+            # Start over if the user comes back
+            self.loader = None
+
 
 class MainMenu(Menu):
     INCLUDE_UP_ITEM = False
 
     def get_options(self):
         if self.navigator.spotipy_client.is_authenticated():
-            return {
+            options = {
+                'se': MenuValue(
+                    'Search for everything',
+                    self.lazy(CombinedSearch)
+                ),
                 'st': MenuValue(
                     'Search for tracks',
-                    TrackSearch(self.navigator)
+                    self.lazy(TrackSearch)
                 ),
                 'sa': MenuValue(
                     'Search for albums',
-                    AlbumSearch(self.navigator)
+                    self.lazy(AlbumSearch)
                 ),
                 'sp': MenuValue(
                     'Search for playlists',
-                    PlaylistSearch(self.navigator)
+                    self.lazy(PlaylistSearch)
                 ),
                 'ss': MenuValue(
                     'Search for artists',
-                    ArtistSearch(self.navigator)
+                    self.lazy(ArtistSearch)
                 ),
                 'vp': MenuValue(
                     'View playlists',
-                    MyPlaylists(self.navigator)
+                    self.lazy(MyPlaylists)
                 ),
                 'fp': MenuValue(
                     'Featured playlists',
-                    FeaturedPlaylists(self.navigator)
+                    self.lazy(FeaturedPlaylists)
                 ),
             }
+            if logger.isEnabledFor(logging.DEBUG):
+                options['ds'] = MenuValue(
+                    'Debug: web API stats',
+                    self.lazy(WebApiStats)
+                )
+            return options
         else:
             return {
                 'li': MenuValue(
                     'Log in to spotify web api',
-                    LogIntoSpotipy(self.navigator)
+                    self.lazy(LogIntoSpotipy)
                 )
             }
 
 
 class PlayListOverview(Menu):
+    INCREMENTAL_OPTIONS = True
 
     loader = None
+    playlist_type = None
+    # The playlists we have are checked when we come back to this menu if
+    # they are older than this (in seconds)
+    REVALIDATE_AFTER = 60
+    # Loads the playlists in the background while we show what we had
+    revalidation = None
+    fetched_at = None
+
+    def get_loader(self, **kwargs):
+        return PlaylistLoader(
+            self.navigator, owner=self, playlist_type=self.playlist_type,
+            **kwargs
+        )
 
-    def get_loader(self):
-        raise NotImplementedError('Subclass must implement!')
+    def get_stale_loader(self):
+        '''
+        Gets a loader for the playlists we got last time, and starts getting
+        them again in the background
+        '''
+        last_known = get_last_known_playlists(
+            self.navigator, self.playlist_type
+        )
+        if not last_known:
+            return None
+        response_data, self.fetched_at = last_known
+        self.revalidate()
+        return self.get_loader(response_data=response_data)
+
+    def revalidate(self):
+        logger.debug('Revalidating %s playlists', self.playlist_type)
+        # The playlists we show came from the cache, so it can't be used
+        self.revalidation = self.get_loader(priority=PREFETCH, refresh=True)
+
+    def is_revalidating(self):
+        return bool(
+            self.revalidation and
+            not self.revalidation.loaded_event.is_set()
+        )
+
+    def use_revalidated(self):
+        revalidation, self.revalidation = self.revalidation, None
+        if revalidation.response_data is None:
+            logger.warning('Could not revalidate %s', self.playlist_type)
+            return
+        self.fetched_at = time.time()
+        if revalidation.response_data == self.loader.response_data:
+            logger.debug('Playlists have not changed')
+            return
+        logger.debug('Playlists have changed, showing new ones')
+        self.loader = revalidation
+        query = self.filter
+        self.initialize()
+        self.filter = query
+
+    def is_outdated(self):
+        if time.time() - self.fetched_at > self.REVALIDATE_AFTER:
+            return True
+        # The user saved or deleted a playlist since we got them
+        return (
+            self.playlist_type == 'mine' and
+            playlist_cache.cleared_at > self.fetched_at
+        )
+
+    def resume(self):
+        super(PlayListOverview, self).resume()
+        if self.fetched_at and not self.revalidation and self.is_outdated():
+            self.revalidate()
+
+    def handle_results(self):
+        if self.fetched_at is None:
+            self.fetched_at = time.time()
+
+    def start_loading(self):
+        if self.loader is None:
+            self.loader = self.get_stale_loader() or self.get_loader()
+
+    def get_response(self):
+        self.start_loading()
+        # Until the results of the loader are shown, Menu.get_response has
+        # to handle them, even if they were already there
+        if self.revalidation and self.loaded:
+            response = self.poll_input(self.is_revalidating)
+            if response is not None:
+                return self.handle_input(response)
+            self.use_revalidated()
+            return responses.NOOP
+        return super(PlayListOverview, self).get_response()
+
+    def cleanup(self):
+        super(PlayListOverview, self).cleanup()
+        if self.revalidation and self.revalidation.is_cancelled():
+            self.revalidation = None
+
+    def get_header(self):
+        if self.fetched_at is None:
+            return ''
+        header = 'Updated %s' % format_age(time.time() - self.fetched_at)
+        if self.is_revalidating():
+            header += ', checking for changes...'
+        return header
 
     def get_options(self):
         if not self.loader_done():
@@ -327,53 +734,128 @@ class PlayListOverview(Menu):
             key=get_name
         )
         for i, (playlist, response) in enumerate(playlists):
-            menu_item = PlayListSelected(self.navigator)
-            menu_item.playlist = playlist
-            # Hmm... This seems to break for some people. Just fetch from
-            # rest api forever and ever
-            # if playlist.is_loaded:
-            #     menu_item.disable_loader()
-            menu_item.response = response
+            # Hmm... Disabling the loader if the playlist is loaded seems to
+            # break for some people. Just fetch from rest api forever and
+            # ever
             results[str(i + 1).rjust(4)] = MenuValue(
-                get_name((playlist, response)), menu_item
+                get_name((playlist, response)),
+                self.lazy(
+                    PlayListSelected, playlist=playlist, response=response
+                )
             )
         return results
 
 
 class MyPlaylists(PlayListOverview):
-
-    def get_loader(self):
-        return PlaylistLoader(self.navigator)
+    playlist_type = 'mine'
 
 
 class FeaturedPlaylists(PlayListOverview):
-
-    def get_loader(self):
-        loader = PlaylistLoader(self.navigator)
-        loader.playlist_type = 'featured'
-        return loader
+    playlist_type = 'featured'
 
 
 class TrackSearchResults(Menu):
     search = None
     paginating = False
     support_shuffle_page = True
-    _cached_search_results = []
+    cache_search_results = True
+    # Pages to fetch in the background when a page is shown, relative to it
+    prefetch_pages = (1, -1)
+    # Matching tracks from the local library are shown above the results
+    include_library_results = True
+    LIBRARY_RESULTS_COUNT = 5
+    library_term = None
+    library_tracks = ()
+
+    def __init__(self, navigator):
+        super(TrackSearchResults, self).__init__(navigator)
+        self.prefetches = {}
+
+    def initialize(self):
+        super(TrackSearchResults, self).initialize()
+        if not self.paginating:
+            self.prefetch()
+
+    def cleanup(self):
+        for prefetch in list(self.prefetches.values()):
+            prefetch.cancel()
+        self.prefetches.clear()
+        super(TrackSearchResults, self).cleanup()
+
+    def get_page_cache_key(self, up_down):
+        results = self.search.results
+        return self.search.get_cache_key(
+            results.offset + up_down * results.limit
+        )
+
+    def get_page_search(self, up_down, **kwargs):
+        kwargs.update(
+            navigator=self.navigator,
+            query=self.search.query,
+            search_type=self.search.search_type,
+            owner=self,
+        )
+        if up_down > 0:
+            kwargs['next_from'] = self.search.results
+        else:
+            kwargs['prev_from'] = self.search.results
+        return search(**kwargs)
+
+    def prefetch(self):
+        if not (
+            self.cache_search_results and
+            self.search and
+            self.search.results.response is not None
+        ):
+            return
+        for up_down in self.prefetch_pages:
+            if up_down > 0:
+                has_page = self.search.results.next_page
+            else:
+                has_page = self.search.results.previous_page
+            if not has_page:
+                continue
+            key = self.get_page_cache_key(up_down)
+            if key in self.prefetches or key in self.get_cache():
+                continue
+            logger.debug('Prefetching %s', key)
+            self.prefetches[key] = self.get_page_search(
+                up_down,
+                priority=PREFETCH,
+                callback=lambda prefetched, key=key: self.prefetch_done(
+                    key, prefetched
+                )
+            )
+
+    def prefetch_done(self, key, prefetched):
+        # Called from the search thread
+        if prefetched.results.response is not None:
+            self.get_cache().set(key, prefetched)
+        if self.prefetches.get(key) is prefetched:
+            del self.prefetches[key]
 
     def set_initial_results(self, search):
         self.search = search
         self.update_cache()
 
     def update_cache(self):
-        self._cached_search_results.append(self.search)
+        if not self.cache_search_results:
+            return
+        if self.search.results.response is None:
+            # Don't cache failed searches, we want to retry those
+            return
+        key = self.search.get_cache_key()
+        if self.get_cache().peek(key) is not self.search:
+            self.get_cache().set(key, self.search)
 
     def get_cache(self):
-        return self._cached_search_results
+        return search_cache
 
     def get_response(self):
         if self.paginating:
             self.search.loaded_event.wait()
             self.paginating = False
+            self.update_cache()
             return self
         return super(TrackSearchResults, self).get_response()
 
@@ -381,24 +863,27 @@ class TrackSearchResults(Menu):
         def inner():
             self.paginating = True
 
-            new_cache_idx = self.get_cache().index(self.search) + up_down
+            key = self.get_page_cache_key(up_down)
+            prefetched = self.prefetches.pop(key, None)
+            cached_search = None
+            if self.cache_search_results:
+                cached_search = self.get_cache().get(key)
+                logger.debug(
+                    'Search cache stats: %s', self.get_cache().stats()
+                )
 
-            try:
-                self.search = self.get_cache()[new_cache_idx]
+            if cached_search:
                 logger.debug('Got search from cache, yahoo!')
-            except IndexError:
+                self.search = cached_search
+            elif prefetched and not (
+                prefetched.loaded_event.is_set() and
+                prefetched.results.response is None
+            ):
+                logger.debug('Using search that is being prefetched')
+                self.search = prefetched
+            else:
                 logger.debug('Initiating new search')
-                kwargs = dict(
-                    navigator=self.navigator,
-                    query=self.search.query,
-                    search_type=self.search.search_type,
-                )
-                if up_down > 0:
-                    kwargs['next_from'] = self.search.results
-                else:
-                    kwargs['prev_from'] = self.search.results
-                self.search = search(**kwargs)
-                self.update_cache()
+                self.search = self.get_page_search(up_down)
             return self
         return inner
 
@@ -440,10 +925,37 @@ class TrackSearchResults(Menu):
             return 'Loading...'
         return super(TrackSearchResults, self).get_ui()
 
+    def get_library_tracks(self):
+        if not (
+            self.include_library_results and
+            self.search.results.offset == 0
+        ):
+            return []
+        term = self.search.results.term
+        if term != self.library_term:
+            self.library_tracks = get_library_tracks(
+                self.navigator, term, self.LIBRARY_RESULTS_COUNT
+            )
+            self.library_term = term
+        return self.library_tracks
+
+    def select_library_track(self, track_item):
+        def library_track_selected():
+            menu = LibraryTrackSelected(self.navigator)
+            menu.track_item = track_item
+            menu.library_term = self.library_term
+            return menu
+        return library_track_selected
+
     def get_options(self):
         if self.paginating:
             return {}
         results = self.get_options_from_search()
+        for i, track_item in enumerate(self.get_library_tracks()):
+            results['l%d' % (i + 1)] = MenuValue(
+                'In your library: %s' % format_track_item(track_item),
+                self.select_library_track(track_item)
+            )
         if self.search.results.previous_page:
             results['p'] = MenuValue(
                 'Previous page', self.go_to(-1)
@@ -473,6 +985,7 @@ class TrackSearchResults(Menu):
 
 class AlbumSearchResults(TrackSearchResults):
     search = None
+    include_library_results = False
 
     def select_album(self, track_idx):
         def album_selected():
@@ -502,6 +1015,7 @@ class AlbumSearchResults(TrackSearchResults):
 
 class ArtistSearchResults(TrackSearchResults):
     search = None
+    include_library_results = False
 
     def select_artist(self, artist_idx):
         def artist_selected():
@@ -532,6 +1046,7 @@ class ArtistSearchResults(TrackSearchResults):
 
 class PlaylistSearchResults(TrackSearchResults):
     search = None
+    include_library_results = False
     support_shuffle_page = False
 
     def select_playlist(self, playlist_idx):
@@ -540,10 +1055,14 @@ class PlaylistSearchResults(TrackSearchResults):
             menu_item = PlayListSelected(self.navigator)
             menu_item.playlist = playlist
             if playlist.is_loaded:
-                menu_item.disable_loader()
+                # We have the tracks, but checking which ones are available
+                # should not block the UI
+                menu_item.loader = LoadedTrackLoader(
+                    self.navigator, playlist, owner=menu_item
+                )
             menu_item.response = response
             return menu_item
-        return artist_selected
+        return LazyMenu(artist_selected)
 
     def get_options_from_search(self):
         results = {}
@@ -560,6 +1079,47 @@ class PlaylistSearchResults(TrackSearchResults):
         return results
 
 
+class CombinedSearchResults(TrackSearchResults):
+    include_library_results = False
+    support_shuffle_page = False
+    prefetch_pages = ()
+    # (key, search type, name, results menu)
+    GROUPS = (
+        ('tr', 'tracks', 'Tracks', TrackSearchResults),
+        ('al', 'albums', 'Albums', AlbumSearchResults),
+        ('ar', 'artists', 'Artists', ArtistSearchResults),
+        ('pl', 'playlists', 'Playlists', PlaylistSearchResults),
+    )
+    NAMES_PER_GROUP = 3
+
+    def select_group(self, search_type, result_cls):
+        def group_selected():
+            menu = result_cls(self.navigator)
+            menu.search = self.search.get_group_search(search_type)
+            # Shows that we are loading until the group's items are loaded
+            menu.paginating = True
+            return menu
+        return LazyMenu(group_selected)
+
+    def get_options_from_search(self):
+        pages = dict(self.search.results.results)
+        results = {}
+        for key, search_type, name, result_cls in self.GROUPS:
+            page = pages.get(search_type)
+            if not page or not page['total']:
+                continue
+            top_names = ', '.join(
+                item['name'] for item in
+                page['items'][:self.NAMES_PER_GROUP]
+                if item
+            )
+            results[key] = MenuValue(
+                '%s (%d results): %s' % (name, page['total'], top_names),
+                self.select_group(search_type, result_cls)
+            )
+        return results
+
+
 class TrackSearch(Menu):
     is_searching = False
     search_pattern = ''
@@ -567,42 +1127,206 @@ class TrackSearch(Menu):
     search_type = 'tracks'
     result_cls = TrackSearchResults
     num_iterations = 0
+    filter = ''
+
+    # Results are shown while the query is typed. We wait until the user
+    # stops typing for this many seconds before searching.
+    LIVE_SEARCH_DELAY = 0.3
+    LIVE_SEARCH_MIN_LENGTH = 2
+    LIVE_RESULTS_COUNT = 10
+    live_search = None
+    filter_changed_at = 0
 
     def get_options(self):
         return {}
 
+    def initialize(self):
+        super(TrackSearch, self).initialize()
+        self.cancel_live_search()
+
     def get_search_results(self):
         self.search_pattern = self.filter
+        live_search = self.live_search
+        if (
+            live_search and
+            live_search.query == self.search_pattern.strip() and
+            not live_search.is_cancelled()
+        ):
+            if not live_search.loaded_event.is_set():
+                logger.debug('Waiting for live search %s', live_search.query)
+                self.search = live_search
+                self.is_searching = True
+                return self
+            if live_search.results.response is not None:
+                logger.debug('Using live search %s', live_search.query)
+                self.search = live_search
+                return self.get_search_results_menu()
         self.search = search(
             self.navigator, self.search_pattern,
-            search_type=self.search_type
+            search_type=self.search_type,
+            owner=self,
         )
         self.is_searching = True
         return self
 
+    def is_valid_response(self):
+        return super(TrackSearch, self).is_valid_response() or MenuValue(
+            None, self.get_search_results
+        )
+
+    def get_search_results_menu(self):
+        search_results = self.result_cls(self.navigator)
+        search_results.set_initial_results(self.search)
+
+        self.is_searching = False
+        self.search_pattern = ''
+        self.search = None
+        self.live_search = None
+
+        return search_results
+
     def get_response(self):
         if self.is_searching:
             self.search.loaded_event.wait(1)
             if not self.search.loaded_event.is_set():
                 self.num_iterations += 1
                 return responses.NOOP
-            self.is_searching = False
+            return self.get_search_results_menu()
+        if self.is_live_search_pending():
+            response = self.wait_for_input()
+            if response is None:
+                # Live results are in, redraw
+                return responses.NOOP
+            return self.handle_input(response)
+        return super(TrackSearch, self).get_response()
 
-            search_results = self.result_cls(self.navigator)
-            search_results.set_initial_results(self.search)
+    def handle_input(self, response):
+        previous_filter = self.filter
+        result = super(TrackSearch, self).handle_input(response)
+        if self.filter != previous_filter:
+            self.filter_changed_at = time.time()
+        return result
+
+    def wait_for_input(self):
+        '''
+        Waits for input while a live search is pending
+        :returns: The input, or None if the live search finished first
+        '''
+        def is_pending():
+            if not self.is_live_search_pending():
+                return False
+            self.maybe_start_live_search()
+            return True
+        return self.poll_input(is_pending)
 
-            self.is_searching = False
-            self.search_pattern = ''
-            self.search = None
+    def get_live_query(self):
+        query = self.filter.strip()
+        if len(query) < self.LIVE_SEARCH_MIN_LENGTH:
+            return ''
+        return query
 
-            return search_results
-        return super(TrackSearch, self).get_response()
+    def is_live_search_pending(self):
+        query = self.get_live_query()
+        if not query:
+            return False
+        if not self.live_search or self.live_search.query != query:
+            return True
+        return not self.live_search.loaded_event.is_set()
 
-    def is_valid_response(self):
-        return super(TrackSearch, self).is_valid_response() or MenuValue(
-            None, self.get_search_results
+    def maybe_start_live_search(self):
+        query = self.get_live_query()
+        if not query or (
+            self.live_search and self.live_search.query == query
+        ):
+            return
+        if time.time() - self.filter_changed_at < self.LIVE_SEARCH_DELAY:
+            # Still typing
+            return
+        self.cancel_live_search()
+        cached_search = search_cache.get((self.search_type, query, 0))
+        if cached_search:
+            logger.debug('Live search for %s found in cache', query)
+            self.live_search = cached_search
+            return
+        logger.debug('Starting live search for %s', query)
+        self.live_search = search(
+            self.navigator, query,
+            search_type=self.search_type,
+            owner=self,
+            callback=self.live_search_done,
         )
 
+    def live_search_done(self, live_search):
+        # Called from the search thread
+        if live_search.results.response is not None:
+            search_cache.set(live_search.get_cache_key(), live_search)
+
+    def cancel_live_search(self):
+        if self.live_search:
+            # Superseded, its results would be thrown away
+            self.live_search.cancel()
+            self.live_search = None
+
+    def get_prefix_search(self, query):
+        '''
+        Gets the cached search for the longest prefix of `query`, to show
+        something while we search for `query` itself
+        '''
+        for length in range(
+            len(query) - 1, self.LIVE_SEARCH_MIN_LENGTH - 1, -1
+        ):
+            cached_search = search_cache.peek(
+                (self.search_type, query[:length].strip(), 0)
+            )
+            if cached_search:
+                return cached_search
+
+    def get_live_results(self):
+        query = self.get_live_query()
+        if not query:
+            return []
+        live_search = self.live_search
+        is_exact = bool(
+            live_search and
+            live_search.query == query and
+            live_search.loaded_event.is_set() and
+            live_search.results.response is not None
+        )
+        if not is_exact:
+            live_search = self.get_prefix_search(query)
+            if not live_search:
+                return ['Searching...']
+        menu = self.result_cls(self.navigator)
+        menu.search = live_search
+        names = [
+            value.name for _, value in
+            sorted_menu_items(menu.get_options_from_search().items())
+        ]
+        if is_exact:
+            header = 'Top results (total %d results):' % (
+                live_search.results.total
+            )
+        else:
+            # Narrow down what we found for the prefix until we know more
+            names = [name for name in names if query.lower() in name.lower()]
+            header = 'Searching... results for [%s]:' % live_search.query
+        if not names:
+            return [header, 'No matches yet']
+        return [header] + names[:self.LIVE_RESULTS_COUNT]
+
+    def get_library_results(self):
+        query = self.get_live_query()
+        if not (query and self.result_cls.include_library_results):
+            return []
+        tracks = get_library_tracks(
+            self.navigator, query, self.result_cls.LIBRARY_RESULTS_COUNT
+        )
+        if not tracks:
+            return []
+        return ['In your library:'] + [
+            format_track_item(track) for track in tracks
+        ] + ['']
+
     def get_ui(self):
         if self.is_searching:
             return (
@@ -610,9 +1334,13 @@ class TrackSearch(Menu):
                 '.' * self.num_iterations
             )
         else:
+            live_results = self.get_library_results() + self.get_live_results()
+            if live_results:
+                live_results.append('')
             return [
                 'Search query: %s' % self.filter,
                 '',
+            ] + live_results + [
                 'Press [return] to search',
                 '(Pro tip: you can also input "u" to go up or "q" to quit)'
             ]
@@ -633,13 +1361,24 @@ class PlaylistSearch(TrackSearch):
     result_cls = PlaylistSearchResults
 
 
+class CombinedSearch(TrackSearch):
+    search_type = 'all'
+    result_cls = CombinedSearchResults
+
+
 class PlayListSelected(Menu):
+    INCREMENTAL_OPTIONS = True
+    VOLATILE_OPTIONS = ('aq', )
+
     playlist = None
     response = {
         'name': ''
     }
     deleting = False
     loader = None
+    # The tracks get_tracks returned, and what they were filtered from
+    _available_tracks = None
+    _available_tracks_source = None
 
     def handle_results(self):
         self.playlist = MockPlaylist(
@@ -650,9 +1389,14 @@ class PlayListSelected(Menu):
         if isinstance(self.playlist, MockPlaylist):
             self.disable_loader()
             return None
+        if 'snapshot_id' in self.response:
+            return PlaylistTrackLoader(
+                self.navigator, self.response, owner=self
+            )
         return TrackLoader(
             self.navigator,
-            url=self.response['tracks']['href']
+            url=self.response['tracks']['href'],
+            owner=self,
         )
 
     def shuffle_play(self):
@@ -684,6 +1428,10 @@ class PlayListSelected(Menu):
             self.playlist
         )
         self.navigator.session.playlist_container.remove_playlist(p_idx)
+        playlist_cache.clear()
+        self.navigator.lifecycle.library_sync.start(
+            self.navigator.spotipy_client
+        )
         return responses.UP
 
     def cancel_delete_playlist(self):
@@ -691,11 +1439,23 @@ class PlayListSelected(Menu):
         return self
 
     def get_tracks(self):
-        return [
-            track for track in
-            (self.loader.results if self.loader else self.playlist.tracks)
-            if track.availability != TrackAvailability.UNAVAILABLE
-        ]
+        '''
+        :returns: The tracks of the playlist that can be played. They are
+                  only filtered again when there is something new to filter.
+        '''
+        source = self.loader.results if self.loader else self.playlist
+        if source is not self._available_tracks_source:
+            if self.loader:
+                # The loader only keeps tracks that are available
+                tracks = list(source)
+            else:
+                tracks = [
+                    track for track in self.playlist.tracks
+                    if track.availability != TrackAvailability.UNAVAILABLE
+                ]
+            self._available_tracks = tracks
+            self._available_tracks_source = source
+        return self._available_tracks
 
     def get_name(self):
         return self.playlist.name or self.response['name']
@@ -714,11 +1474,6 @@ class PlayListSelected(Menu):
                 )
             if results:
                 results['sp'] = MenuValue('Shuffle play', self.shuffle_play)
-                if self.navigator.player.is_playing():
-                    results['aq'] = MenuValue(
-                        'Add [%s] to queue' % self.get_name(),
-                        self.add_to_queue
-                    )
             else:
                 logger.debug('There are no songs in this playlist!')
             if self.playlist in self.navigator.session.playlist_container:
@@ -728,17 +1483,36 @@ class PlayListSelected(Menu):
                 )
 
         if self.navigator.spotipy_client:
-            start_radio = StartRadio(self.navigator)
-            start_radio.seeds = self.get_tracks()
-            start_radio.seed_type = 'tracks'
-            start_radio.verbose_name = self.get_name()
             results['rt'] = MenuValue(
                 'Start radio based on [%s]' % self.get_name(),
-                start_radio
+                self.lazy(
+                    StartRadio,
+                    seeds=self.get_tracks(),
+                    seed_type='tracks',
+                    verbose_name=self.get_name(),
+                )
             )
 
+        results.update(self.get_volatile_options())
         return results
 
+    def get_volatile_options(self):
+        results = {}
+        if (
+            not self.deleting and
+            self.get_tracks() and
+            self.navigator.player.is_playing()
+        ):
+            results['aq'] = MenuValue(
+                'Add [%s] to queue' % self.get_name(),
+                self.add_to_queue
+            )
+        return results
+
+    def cleanup(self):
+        super(PlayListSelected, self).cleanup()
+        self.deleting = False
+
     def get_header(self):
         if self.deleting:
             return 'Are you sure you want to delete playlist [%s]' % (
@@ -805,6 +1579,8 @@ class BanArtistMixin(object):
 
 
 class ArtistSelected(BanArtistMixin, AlbumSelected):
+    VOLATILE_OPTIONS = ('aq', 'ub', 'ba')
+
     artist = None
     _tracks = None
 
@@ -823,9 +1599,10 @@ class ArtistSelected(BanArtistMixin, AlbumSelected):
     def get_artist(self):
         return self.artist
 
-    def get_options(self):
+    def get_volatile_options(self):
+        # The artist can be banned or unbanned from the song menus
         results = self.get_ban_options()
-        results.update(super(ArtistSelected, self).get_options())
+        results.update(super(ArtistSelected, self).get_volatile_options())
         return results
 
 
@@ -877,32 +1654,38 @@ class SongSelectedWhilePlaying(BanArtistMixin, Menu):
             self.add_to_temp_queue
         )
         if self.track.album:
-            res = AlbumSelected(self.navigator)
-            res.album = self.track.album.browse().load()
             results['ga'] = MenuValue(
                 'Go to track\'s album [%s]' % self.track.album.name,
-                res
+                self.go_to_album
             )
         if self.navigator.spotipy_client:
-            start_radio = StartRadio(self.navigator)
-            start_radio.seeds = self.track.artists
-            start_radio.seed_type = 'artists'
-            start_radio.verbose_name = self.get_artist_names()
             results['ra'] = MenuValue(
                 'Start radio based on [%s]' % self.get_artist_names(),
-                start_radio
-
+                self.lazy(
+                    StartRadio,
+                    seeds=self.track.artists,
+                    seed_type='artists',
+                    verbose_name=self.get_artist_names(),
+                )
             )
-            start_radio = StartRadio(self.navigator)
-            start_radio.seeds = [self.track]
-            start_radio.seed_type = 'tracks'
-            start_radio.verbose_name = format_track(self.track)
             results['rt'] = MenuValue(
-                'Start radio based on [%s]' % format_track(self.track),
-                start_radio
+                'Start radio based on [%s]' % formatted_track,
+                self.lazy(
+                    StartRadio,
+                    seeds=[self.track],
+                    seed_type='tracks',
+                    verbose_name=formatted_track,
+                )
             )
         return results
 
+    def go_to_album(self):
+        # Browsing the album waits for spotify, only do it if the user wants
+        # to see it
+        res = AlbumSelected(self.navigator)
+        res.album = self.track.album.browse().load()
+        return res
+
     def get_header(self):
         info = [
             'Song: %s' % format_track(self.track),
@@ -929,6 +1712,40 @@ class SongSelectedWhilePlaying(BanArtistMixin, Menu):
             return self.track.artists[0]
 
 
+class LibraryTrackSelected(SongSelectedWhilePlaying):
+    '''
+    A track found in the local library, loading it can take a while so it's
+    loaded in the background
+    '''
+    loader = None
+    track_item = None
+    library_term = ''
+
+    def get_loader(self):
+        return LibraryTrackLoader(self.navigator, self.track_item, owner=self)
+
+    def handle_results(self):
+        if self.loader.results.results:
+            self.track = self.loader.results[0]
+            self.playlist = MockPlaylist(
+                'In your library: %s' % self.library_term, [self.track]
+            )
+
+    def get_options(self):
+        if self.track is None:
+            return {}
+        return super(LibraryTrackSelected, self).get_options()
+
+    def get_header(self):
+        if self.track is None:
+            if self.loader_done():
+                return 'Could not load %s' % format_track_item(
+                    self.track_item
+                )
+            return 'Loading %s...' % format_track_item(self.track_item)
+        return super(LibraryTrackSelected, self).get_header()
+
+
 class SavePlaylist(Menu):
     song_list = []
     is_saving = False
@@ -953,7 +1770,7 @@ class SavePlaylist(Menu):
                 self.new_playlist_name or
                 self.original_playlist_name
             )
-            user_playlists = spotipy.current_user_playlists()['items']
+            user_playlists = playlist_cache.get(spotipy) or []
             try:
                 playlist = [
                     playlist for playlist in
@@ -969,20 +1786,24 @@ class SavePlaylist(Menu):
                 track_ids = [
                     track.link.uri for track in self.song_list
                 ]
-                spotipy.user_playlist_add_tracks(
+                add_tracks_to_playlist(
+                    spotipy,
                     user=user,
                     playlist_id=playlist['id'],
                     tracks=track_ids,
                 )
             else:
                 # Modifying a playlist
-                spotipy.user_playlist_replace_tracks(
+                replace_playlist_tracks(
+                    spotipy,
                     user=user,
                     playlist_id=playlist['id'],
                     tracks=[
                         song.link.uri for song in self.song_list
                     ],
                 )
+            playlist_cache.clear()
+            self.navigator.lifecycle.library_sync.start(spotipy)
             spotify_playlist = Playlist(
                 self.navigator.session,
                 playlist['uri']
@@ -1026,6 +1847,9 @@ class LogIntoSpotipy(Menu):
     message_from_spotipy = None
 
     def initialize(self):
+        # Only needed when logging in, which most starts don't do
+        import webbrowser
+        from .http_server import oAuthServerThread
         self.sp_oauth = self.navigator.lifecycle.get_spotipy_oauth()
         auth_url = self.sp_oauth.get_authorize_url()
 
@@ -1113,8 +1937,9 @@ class StartRadio(Menu):
             if self.recommendations.loaded_event.is_set():
                 return responses.UP
         else:
+            from .radio import Recommendations
             self.recommendations = Recommendations(
-                self.navigator, self.seeds, self.seed_type
+                self.navigator, self.seeds, self.seed_type, owner=self
             )
         self.recommendations.loaded_event.wait(1)
         if not self.recommendations.loaded_event.is_set():
@@ -1139,7 +1964,9 @@ class StartRadio(Menu):
 
 
 class RadioSelected(TrackSearchResults):
+    include_library_results = False
     radio_name = ''
+    cache_search_results = False
 
     def get_header(self):
         if getattr(self.search.results, 'message'):
@@ -1150,3 +1977,54 @@ class RadioSelected(TrackSearchResults):
 
     def get_mock_playlist_name(self):
         return self.radio_name or 'Spoppy Radio'
+
+
+class WebApiStats(Menu):
+    STATS_FILE_NAME = 'web_api_stats.json'
+    message = ''
+
+    def get_stats_path(self):
+        return os.path.join(
+            self.navigator.lifecycle.user_cache_dir, self.STATS_FILE_NAME
+        )
+
+    def get_options(self):
+        return {
+            'w': MenuValue(
+                'Write stats as json to %s' % self.get_stats_path(),
+                self.write_stats
+            ),
+            'c': MenuValue('Clear stats', self.clear_stats),
+        }
+
+    def write_stats(self):
+        path = self.get_stats_path()
+        call_stats.dump(path)
+        self.message = 'Stats written to %s' % path
+        return self
+
+    def clear_stats(self):
+        call_stats.clear()
+        self.message = 'Stats cleared'
+        return self
+
+    def get_header(self):
+        lines = ['%-24s %6s %6s %8s %8s %8s %8s' % (
+            'Endpoint', 'Calls', 'Err%', 'Avg ms', 'p95 ms', 'Total s', 'KB'
+        )]
+        for func_name, stats in call_stats.get_slowest():
+            p95 = stats['p95_ms']
+            lines.append('%-24s %6d %6.1f %8.0f %8s %8.2f %8.1f' % (
+                func_name[:24],
+                stats['calls'],
+                stats['error_rate'] * 100,
+                stats['avg_time'] * 1000,
+                '<%d' % p95 if p95 is not None else 'slow',
+                stats['total_time'],
+                stats['payload_bytes'] / 1024.0,
+            ))
+        if len(lines) == 1:
+            lines.append('No web API calls yet')
+        if self.message:
+            lines.extend(['', self.message])
+        return '\n'.join(lines)
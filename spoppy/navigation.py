@@ -7,10 +7,12 @@ from .lifecycle import LifeCycle
 from .players import Player
 from .terminal import get_terminal_size
 from .config import clear_config
+from .executor import executor
 from .util import (
     ban_artist, unban_artist, get_banned_artist_uris, get_artist_uri
 )
 from .spotipy_wrapper import SpotipyWrapper
+from .startup import StartupPipeline
 
 try:
     # py2.7+
@@ -23,15 +25,15 @@ logger = logging.getLogger(__name__)
 
 
 class Leifur(object):
-    def __init__(self, username, password):
+    def __init__(self, username, password, startup=None):
         self.username = username
         self.password = password
         self.spotipy_me = None
         self.player = Player(self)
         self.lifecycle = LifeCycle(username, password, self.player)
         self.session = None
+        self.startup = startup or StartupPipeline()
 
-        self.lifecycle.check_spotipy_logged_in()
         self.spotipy_client = SpotipyWrapper(
             self,
             self.lifecycle.refresh_and_get_spotipy_client()
@@ -46,12 +48,27 @@ class Leifur(object):
             self.lifecycle.refresh_and_get_spotipy_client()
         )
 
-    def refresh_spotipy_client_and_token(self):
-        self.lifecycle.check_spotipy_logged_in()
+    def refresh_spotipy_client_and_token(self, expired_token=None):
+        self.lifecycle.refresh_spotipy_token(expired_token)
         self.refresh_spotipy_client()
 
+    def check_spotipy_logged_in(self):
+        self.lifecycle.check_spotipy_logged_in()
+        try:
+            self.check_spotipy_me()
+        except Exception:
+            # We try again before showing each menu
+            logger.warning('Could not get the current user', exc_info=True)
+
     def start(self):
-        if self.lifecycle.check_pyspotify_logged_in():
+        # Logging in to libspotify and to the web API don't depend on each
+        # other, so they run at the same time
+        self.startup.start('web API login', self.check_spotipy_logged_in)
+        self.startup.start(
+            'spotify login', self.lifecycle.check_pyspotify_logged_in
+        )
+        self.startup.start('banned artists', get_banned_artist_uris)
+        if self.startup.wait('spotify login'):
             logger.debug('All tokens are a-OK')
             self.session = self.lifecycle.get_pyspotify_client()
             logger.debug('Starting LifeCycle services')
@@ -59,10 +76,15 @@ class Leifur(object):
             logger.debug('LifeCycle services started')
             self.player.initialize()
 
-            logger.debug('Getting banned artists')
-            self.banned_artists = get_banned_artist_uris()
+            self.startup.wait('web API login')
+            if self.spotipy_client.is_authenticated():
+                logger.debug('Syncing library in the background')
+                self.lifecycle.library_sync.start(self.spotipy_client)
+
+            self.banned_artists = self.startup.wait('banned artists')
             logger.info('Banned artists are %s' % (self.banned_artists, ))
 
+            self.startup.finish()
             main_menu = menus.MainMenu(self)
             self.navigate_to(main_menu)
         else:
@@ -74,6 +96,7 @@ class Leifur(object):
             logger.debug('Something went wrong, not logged in...')
 
     def shutdown(self):
+        executor.shutdown()
         self.lifecycle.shutdown()
         logger.debug('Navigation shutdown complete')
 
@@ -81,6 +104,12 @@ class Leifur(object):
         logger.debug('navigating to: %s' % going)
         self.session.process_events()
         going.initialize()
+        try:
+            self._navigate(going)
+        finally:
+            going.cleanup()
+
+    def _navigate(self, going):
         while self.navigating:
             self.check_spotipy_me()
             click.clear()
@@ -103,11 +132,14 @@ class Leifur(object):
                 self.navigate_to(self.player)
             elif response != going:
                 self.navigate_to(response)
-            # This happens when the `going` instance gets control again. We
-            # don't want to remember the query and we want to rebuild the
-            # menu's options
-            # (and possibly something else?)
-            going.initialize()
+            if response == going:
+                # The menu wants its options built again
+                going.initialize()
+            else:
+                # This happens when the `going` instance gets control again.
+                # We don't want to remember the query, and the menu rebuilds
+                # whatever may have changed in its options
+                going.resume()
 
     def print_header(self):
         click.echo('Spoppy v. %s' % get_version())
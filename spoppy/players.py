@@ -121,6 +121,23 @@ class Player(object):
             self.player = self.session.player
             self._initialized = True
 
+    def resume(self):
+        '''
+        Called by the navigator when the user comes back to the player from
+        another view. The player has no options to rebuild.
+        :returns: None
+        '''
+        self.initialize()
+
+    def cleanup(self):
+        '''
+        Called by the navigator when the user leaves the player. Nothing is
+        running in the background on behalf of the player view, so there is
+        nothing to clean up.
+        :returns: None
+        '''
+        pass
+
     def is_playing(self):
         '''
         Used to determine if the `PySpotify` player is is currently playing
@@ -2,9 +2,9 @@ import logging
 import random
 import threading
 
-from appdirs import user_cache_dir
 from spotify.track import Track
 
+from .loaders.loader import get_auth_error_message
 from .loaders.search import Search
 
 logger = logging.getLogger(__name__)
@@ -27,25 +27,15 @@ class RadioResults(object):
         return self.results[key]
 
 
-AUTH_ERROR_MESSAGE = (
-    'While accessing spotify, we encountered a 401 access denied error, '
-    'probably due to your access token being expired. I\'ve attempted to '
-    'automatically refresh you access, so you can retry this operation. '
-    'If that didn\'t work, try restarting spoppy, and if that doesn\'t work '
-    'try removing the file %s/spotipy_token.cache, restart '
-    'spoppy and log in to spotify web API again. For more information on this '
-    'issue, see https://github.com/sindrig/spoppy/issues/127'
-) % (user_cache_dir(appname='spoppy'), )
-
-
 class Recommendations(Search):
     item_cls = Track
     search_type = 'tracks'
 
-    def __init__(self, navigator, seeds, seed_type):
+    def __init__(self, navigator, seeds, seed_type, owner=None):
         self.navigator = navigator
         self.session = navigator.session
         self.seed_type = seed_type
+        self.owner = owner
 
         if len(seeds) > 5:
             seeds = random.sample(seeds, 5)
@@ -55,8 +45,6 @@ class Recommendations(Search):
         ]
         self.loaded_event = threading.Event()
 
-        super(Search, self).__init__()
-
         self.start()
 
     def run(self):
@@ -76,7 +64,7 @@ class Recommendations(Search):
                     'Access token for spotipy expired, or unknown auth error'
                 )
                 self.results = self.get_empty_results(
-                    message=AUTH_ERROR_MESSAGE
+                    message=get_auth_error_message()
                 )
             else:
                 logger.exception(
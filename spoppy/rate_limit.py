@@ -0,0 +1,197 @@
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+
+import requests
+
+from .executor import FOREGROUND, get_current_priority
+
+logger = logging.getLogger(__name__)
+
+_received = threading.local()
+
+
+def get_received_bytes():
+    '''
+    :returns: The size of the response bodies received in the current thread
+              so far, in bytes
+    '''
+    return getattr(_received, 'bytes', 0)
+
+
+def count_received(response):
+    # The body has been read already, unless the request was streamed
+    _received.bytes = get_received_bytes() + len(response.content or b'')
+    return response
+
+
+def get_retry_after(response):
+    try:
+        return max(float(response.headers.get('Retry-After')), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter(object):
+    '''
+    A token bucket allowing `rate` requests per second with bursts of up to
+    `burst` requests. When spotify tells us to back off the bucket is
+    paused. Waiting requests are served by priority, so prefetching never
+    delays requests the user is waiting for.
+    '''
+    # A Retry-After longer than this (in seconds) is most likely wrong, and
+    # would stop spoppy for as long
+    max_pause = 30
+
+    def __init__(self, rate=10.0, burst=10):
+        self.rate = float(rate)
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.time()
+        self.paused_until = 0
+        self._condition = threading.Condition()
+        # priority -> number of waiting requests
+        self._waiting = defaultdict(int)
+        self.throttled = 0
+        self.pauses = 0
+
+    def _refill(self, now):
+        self.tokens = min(
+            self.burst, self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+
+    def _has_waiters_before(self, priority):
+        return any(
+            count for waiting_priority, count in self._waiting.items()
+            if waiting_priority < priority
+        )
+
+    def acquire(self, priority=FOREGROUND):
+        '''
+        Blocks until a request with `priority` may be sent
+        :returns: True if the request had to wait
+        '''
+        with self._condition:
+            self._waiting[priority] += 1
+            waited = False
+            try:
+                while True:
+                    now = time.time()
+                    self._refill(now)
+                    if now < self.paused_until:
+                        timeout = self.paused_until - now
+                    elif self.tokens < 1:
+                        timeout = (1 - self.tokens) / self.rate
+                    elif self._has_waiters_before(priority):
+                        # Woken up when they are done
+                        timeout = None
+                    else:
+                        self.tokens -= 1
+                        return waited
+                    waited = True
+                    self._condition.wait(timeout)
+            finally:
+                self._waiting[priority] -= 1
+                if waited:
+                    self.throttled += 1
+                self._condition.notify_all()
+
+    def pause(self, seconds):
+        seconds = min(seconds, self.max_pause)
+        with self._condition:
+            self.paused_until = max(self.paused_until, time.time() + seconds)
+            self.pauses += 1
+            logger.warning('Rate limited, pausing requests for %ss', seconds)
+
+    def stats(self):
+        with self._condition:
+            return {
+                'tokens': self.tokens,
+                'throttled': self.throttled,
+                'pauses': self.pauses,
+                'waiting': sum(self._waiting.values()),
+            }
+
+
+class ScheduledSession(requests.Session):
+    '''
+    A requests session that sends every request through a `RateLimiter`,
+    respects Retry-After on 429 responses and retries transient errors with
+    jittered exponential backoff.
+    '''
+    max_retries = 3
+    backoff_base = 0.5
+    backoff_cap = 8
+    # Requests the user is waiting for give up instead of retrying after a
+    # Retry-After longer than this
+    max_foreground_wait = 5
+    # Retrying these is safe even if the first attempt reached spotify
+    IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+
+    def __init__(self, limiter=None):
+        super(ScheduledSession, self).__init__()
+        self.limiter = limiter or RateLimiter()
+        self.retries = 0
+
+    def send(self, request, **kwargs):
+        return count_received(
+            super(ScheduledSession, self).send(request, **kwargs)
+        )
+
+    def get_backoff(self, attempt):
+        return random.uniform(
+            0, min(self.backoff_cap, self.backoff_base * 2 ** attempt)
+        )
+
+    def request(self, method, url, *args, **kwargs):
+        is_idempotent = method.upper() in self.IDEMPOTENT_METHODS
+        attempt = 0
+        priority = get_current_priority()
+        while True:
+            self.limiter.acquire(priority)
+            try:
+                response = super(ScheduledSession, self).request(
+                    method, url, *args, **kwargs
+                )
+            except (
+                requests.exceptions.ConnectionError,
+                requests.exceptions.Timeout
+            ):
+                if attempt >= self.max_retries or not is_idempotent:
+                    raise
+                logger.warning(
+                    'Error requesting %s, retrying', url, exc_info=True
+                )
+                delay = self.get_backoff(attempt)
+            else:
+                if response.status_code == 429:
+                    retry_after = get_retry_after(response)
+                    if retry_after is None:
+                        retry_after = self.get_backoff(attempt)
+                    # Every request waits, not only this one
+                    self.limiter.pause(retry_after)
+                    if (
+                        priority == FOREGROUND and
+                        retry_after > self.max_foreground_wait
+                    ):
+                        logger.warning(
+                            'Not waiting %ss to retry %s', retry_after, url
+                        )
+                        return response
+                    delay = 0
+                elif 500 <= response.status_code < 600 and is_idempotent:
+                    delay = self.get_backoff(attempt)
+                else:
+                    return response
+                if attempt >= self.max_retries:
+                    return response
+                logger.debug(
+                    'Got %d from %s, retrying', response.status_code, url
+                )
+                response.close()
+            attempt += 1
+            self.retries += 1
+            time.sleep(delay)
@@ -1,7 +1,216 @@
+import json
 import logging
+import threading
+import time
+
+from .rate_limit import get_received_bytes
 
 logger = logging.getLogger(__name__)
 
+# Read-only calls, identical concurrent calls to these can share a request
+COALESCED_CALLS = frozenset([
+    '_get',
+    'album',
+    'albums',
+    'artist',
+    'artist_albums',
+    'artist_related_artists',
+    'artist_top_tracks',
+    'artists',
+    'current_user',
+    'current_user_playlists',
+    'featured_playlists',
+    'me',
+    'next',
+    'previous',
+    'recommendations',
+    'search',
+    'track',
+    'tracks',
+    'user',
+    'user_playlist',
+    'user_playlist_tracks',
+])
+
+
+class InFlightCall(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    '''
+    Makes concurrent calls with the same key share a single call. The first
+    caller does the work, the others wait for it and get the same result (or
+    exception).
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key, func, *args, **kwargs):
+        with self._lock:
+            call = self._in_flight.get(key)
+            if call is None:
+                call = self._in_flight[key] = InFlightCall()
+                self.calls += 1
+                is_leader = True
+            else:
+                self.coalesced += 1
+                is_leader = False
+        if not is_leader:
+            logger.debug('Waiting for in-flight call %s', key)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = func(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            call.done.set()
+        return call.result
+
+    def stats(self):
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'coalesced': self.coalesced,
+                'in_flight': len(self._in_flight),
+            }
+
+
+# Shared between wrappers, the navigator creates a new one on every refresh
+in_flight_calls = SingleFlight()
+
+
+def get_call_key(func_name, args, kwargs):
+    return repr((func_name, args, sorted(kwargs.items())))
+
+
+class EndpointStats(object):
+    # Upper bounds of the latency histogram buckets, in milliseconds
+    LATENCY_BUCKETS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.payload_bytes = 0
+        # One more bucket for everything slower than the last bound
+        self.histogram = [0] * (len(self.LATENCY_BUCKETS) + 1)
+
+    def record(self, elapsed, payload_size, failed):
+        self.calls += 1
+        if failed:
+            self.errors += 1
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+        self.payload_bytes += payload_size
+        elapsed_ms = elapsed * 1000
+        for idx, bound in enumerate(self.LATENCY_BUCKETS):
+            if elapsed_ms <= bound:
+                break
+        else:
+            idx = len(self.LATENCY_BUCKETS)
+        self.histogram[idx] += 1
+
+    def get_percentile(self, percentile):
+        '''
+        Estimates a latency percentile from the histogram
+        :returns: Upper bound of the bucket, in milliseconds, or None if it
+                  is in the last bucket
+        '''
+        target = self.calls * percentile / 100.0
+        seen = 0
+        for idx, count in enumerate(self.histogram):
+            seen += count
+            if count and seen >= target:
+                if idx < len(self.LATENCY_BUCKETS):
+                    return self.LATENCY_BUCKETS[idx]
+                return None
+        return 0
+
+    def as_dict(self):
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'error_rate': float(self.errors) / self.calls if self.calls else 0,
+            'total_time': self.total_time,
+            'avg_time': self.total_time / self.calls if self.calls else 0,
+            'max_time': self.max_time,
+            'p50_ms': self.get_percentile(50),
+            'p95_ms': self.get_percentile(95),
+            'payload_bytes': self.payload_bytes,
+            'histogram': dict(zip(
+                [str(bound) for bound in self.LATENCY_BUCKETS] + ['inf'],
+                self.histogram
+            )),
+        }
+
+
+class CallStats(object):
+    '''
+    Per endpoint (spotipy method) call counts, latency, payload sizes and
+    errors
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def record(self, func_name, elapsed, payload_size=0, failed=False):
+        with self._lock:
+            endpoint = self._endpoints.get(func_name)
+            if endpoint is None:
+                endpoint = self._endpoints[func_name] = EndpointStats()
+            endpoint.record(elapsed, payload_size, failed)
+
+    def clear(self):
+        with self._lock:
+            self._endpoints.clear()
+
+    def stats(self):
+        '''
+        :returns: A dict of endpoint name -> stats, json serializable
+        '''
+        with self._lock:
+            return {
+                func_name: endpoint.as_dict()
+                for func_name, endpoint in self._endpoints.items()
+            }
+
+    def get_slowest(self):
+        '''
+        :returns: (endpoint name, stats) tuples, the endpoints that took the
+                  most time in total first
+        '''
+        return sorted(
+            self.stats().items(),
+            key=lambda item: item[1]['total_time'],
+            reverse=True
+        )
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            json.dump({
+                'endpoints': self.stats(),
+                'in_flight_calls': in_flight_calls.stats(),
+            }, f, indent=2, sort_keys=True)
+
+
+call_stats = CallStats()
+
 
 class SpotipyWrapper(object):
     def __init__(self, navigator, client):
@@ -11,10 +220,42 @@ class SpotipyWrapper(object):
     def is_authenticated(self):
         return bool(self.client._auth)
 
+    def call(self, func_name, *args, **kwargs):
+        started_at = time.time()
+        # The size of what the session received for this call, calls that
+        # share a request with another one received nothing
+        received_before = get_received_bytes()
+        try:
+            if func_name in COALESCED_CALLS:
+                result = in_flight_calls.do(
+                    get_call_key(func_name, args, kwargs),
+                    getattr(self.client, func_name), *args, **kwargs
+                )
+            else:
+                result = getattr(self.client, func_name)(*args, **kwargs)
+        except Exception:
+            call_stats.record(
+                func_name, time.time() - started_at, failed=True
+            )
+            raise
+        call_stats.record(
+            func_name, time.time() - started_at,
+            get_received_bytes() - received_before
+        )
+        return result
+
     def __getattr__(self, func_name):
+        # Only called for attributes that aren't set, so the wrapper is
+        # cached on the instance below and built once per method
+        if func_name.startswith('__'):
+            raise AttributeError(func_name)
+
         def wrapped(*args, **kwargs):
+            # The token manager refreshes the token before it expires, this
+            # is only for tokens that are rejected anyway
+            access_token = self.client._auth
             try:
-                return getattr(self.client, func_name)(*args, **kwargs)
+                return self.call(func_name, *args, **kwargs)
             except Exception as e:
                 if getattr(e, 'http_status', None) == 401:
                     logger.debug(
@@ -22,7 +263,10 @@ class SpotipyWrapper(object):
                         'or unknown auth error'
                     )
                     # This will update the auth token in our current client
-                    self.navigator.refresh_spotipy_client_and_token()
-                    return getattr(self.client, func_name)(*args, **kwargs)
+                    self.navigator.refresh_spotipy_client_and_token(
+                        access_token
+                    )
+                    return self.call(func_name, *args, **kwargs)
                 raise e
+        setattr(self, func_name, wrapped)
         return wrapped
@@ -0,0 +1,168 @@
+import logging
+import sys
+import threading
+import time
+
+import click
+
+from .executor import FOREGROUND, executor
+
+logger = logging.getLogger(__name__)
+
+# How often the progress is redrawn while we wait for a step
+PROGRESS_INTERVAL = 0.1
+SPINNER = '|/-\\'
+
+
+class StartupStep(object):
+    def __init__(self, name, in_background):
+        self.name = name
+        self.in_background = in_background
+        self.future = None
+        self.started_at = None
+        self.finished_at = None
+
+    def is_running(self):
+        return self.started_at is not None and self.finished_at is None
+
+
+class StartupPipeline(object):
+    '''
+    Runs the steps spoppy takes before showing the main menu. Steps are
+    started in the background as soon as they can run, so steps that don't
+    depend on each other run at the same time, and the steps we are waiting
+    for are shown until they are done.
+    '''
+
+    def __init__(self, show_progress=None):
+        if show_progress is None:
+            show_progress = sys.stdout.isatty()
+        self.show_progress = show_progress
+        self.started_at = time.time()
+        self.finished_at = None
+        self.steps = []
+        self._steps = {}
+        self._lock = threading.Lock()
+        self._progress_width = 0
+
+    def _add(self, step):
+        with self._lock:
+            if step.name in self._steps:
+                raise ValueError('Step %s has already started' % step.name)
+            self.steps.append(step)
+            self._steps[step.name] = step
+
+    def start(self, name, func, *args, **kwargs):
+        '''
+        Starts `func` in the background
+        :param name: Shown while the step runs and in the profile
+        :param after: Names of steps that have to be done before this one
+                      starts, this one fails if they do
+        :returns: A future for what `func` returns
+        '''
+        after = [self._steps[dependency] for dependency in
+                 kwargs.pop('after', ())]
+        step = StartupStep(name, in_background=True)
+
+        def run():
+            for dependency in after:
+                dependency.future.result()
+            step.started_at = time.time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                step.finished_at = time.time()
+
+        self._add(step)
+        step.future = executor.submit(run, priority=FOREGROUND)
+        return step.future
+
+    def run(self, name, func, *args, **kwargs):
+        '''
+        Runs `func` in this thread, for steps that ask the user something
+        :returns: What `func` returns
+        '''
+        step = StartupStep(name, in_background=False)
+        self._add(step)
+        step.started_at = time.time()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            step.finished_at = time.time()
+
+    def wait(self, name):
+        '''
+        Shows the progress of the running steps until the step `name` is done
+        :returns: What the step returned
+        :raises: Whatever the step raised
+        '''
+        future = self._steps[name].future
+        spins = 0
+        while not future.wait(PROGRESS_INTERVAL):
+            self.show_running_steps(SPINNER[spins % len(SPINNER)])
+            spins += 1
+        self.clear_progress()
+        return future.result()
+
+    def finish(self):
+        '''
+        Called when spoppy is ready to show the main menu
+        '''
+        self.finished_at = time.time()
+        logger.debug('Startup profile:\n%s', self.format_profile())
+
+    def get_running_steps(self):
+        with self._lock:
+            return [step for step in self.steps if step.is_running()]
+
+    def show_running_steps(self, spinner):
+        if not self.show_progress:
+            return
+        running = self.get_running_steps()
+        line = '%s Starting spoppy: %s (%.1fs)' % (
+            spinner,
+            ', '.join(step.name for step in running) or 'waiting',
+            time.time() - self.started_at
+        )
+        # Pad with spaces so nothing of a longer line before is left
+        click.echo(
+            '\r%s' % line.ljust(self._progress_width), nl=False
+        )
+        self._progress_width = len(line)
+
+    def clear_progress(self):
+        if self._progress_width:
+            click.echo('\r%s\r' % (' ' * self._progress_width), nl=False)
+            self._progress_width = 0
+
+    def get_timings(self):
+        '''
+        :returns: A list of (name, started, took, in_background) for the
+                  steps that have finished, with times in seconds since
+                  startup began
+        '''
+        with self._lock:
+            steps = list(self.steps)
+        return [
+            (
+                step.name,
+                step.started_at - self.started_at,
+                step.finished_at - step.started_at,
+                step.in_background,
+            )
+            for step in steps if step.finished_at is not None
+        ]
+
+    def format_profile(self):
+        lines = []
+        if self.finished_at is not None:
+            lines.append('Main menu was ready after %.0fms' % (
+                (self.finished_at - self.started_at) * 1000
+            ))
+        lines.append('%-24s %10s %10s' % ('step', 'start ms', 'took ms'))
+        for name, started, took, in_background in self.get_timings():
+            lines.append('%-24s %10.0f %10.0f%s' % (
+                name, started * 1000, took * 1000,
+                '' if in_background else '  (blocking)'
+            ))
+        return '\n'.join(lines)
@@ -0,0 +1,105 @@
+'''
+Reports which modules make spoppy slow to start, using python's
+`-X importtime` (python 3.7+). Run it with `make importtime` or
+`python -m spoppy.startup_report [module]`.
+'''
+import subprocess
+import sys
+from collections import namedtuple
+
+# What spoppy imports before showing the first screen
+DEFAULT_MODULE = 'spoppy.navigation'
+
+ImportTime = namedtuple(
+    'ImportTime', ('module', 'self_us', 'cumulative_us', 'depth')
+)
+
+
+def parse_importtime(lines):
+    '''
+    :param lines: The lines `python -X importtime` writes to stderr
+    :returns: A list of ImportTime, in the order python reported them
+    '''
+    import_times = []
+    for line in lines:
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3:
+            continue
+        try:
+            self_us, cumulative_us = int(parts[0]), int(parts[1])
+        except ValueError:
+            # The header
+            continue
+        name = parts[2].rstrip()
+        module = name.lstrip()
+        depth = (len(name) - len(module) - 1) // 2
+        import_times.append(
+            ImportTime(module, self_us, cumulative_us, depth)
+        )
+    return import_times
+
+
+def get_import_times(module=DEFAULT_MODULE):
+    '''
+    Imports `module` in a new interpreter, so nothing is imported already
+    :returns: A list of ImportTime
+    '''
+    process = subprocess.Popen(
+        [sys.executable, '-X', 'importtime', '-c', 'import %s' % module],
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    _, stderr = process.communicate()
+    if process.returncode:
+        raise RuntimeError('Could not import %s:\n%s' % (module, stderr))
+    return parse_importtime(stderr.splitlines())
+
+
+def get_module_imports(import_times, module):
+    '''
+    Python reports the modules it imports when starting as well, and lists
+    the imports of a module before the module itself
+    :returns: The ImportTimes of `module` and the modules it imported
+    '''
+    start = 0
+    for i, import_time in enumerate(import_times):
+        if import_time.depth == 0:
+            if import_time.module == module:
+                return import_times[start:i + 1]
+            start = i + 1
+    return []
+
+
+def format_report(import_times, module=DEFAULT_MODULE, limit=20):
+    '''
+    :returns: The total time of importing `module` and the `limit` modules
+              that took the longest to import, without their own imports
+    '''
+    import_times = get_module_imports(import_times, module)
+    total_us = import_times[-1].cumulative_us if import_times else 0
+    lines = [
+        'Importing %s took %.1fms' % (module, total_us / 1000.0),
+        '',
+        '%10s %10s  %s' % ('self ms', 'total ms', 'module'),
+    ]
+    slowest = sorted(
+        import_times, key=lambda import_time: -import_time.self_us
+    )[:limit]
+    for import_time in slowest:
+        lines.append('%10.1f %10.1f  %s' % (
+            import_time.self_us / 1000.0,
+            import_time.cumulative_us / 1000.0,
+            import_time.module,
+        ))
+    return '\n'.join(lines)
+
+
+def main(args):
+    module = args[0] if args else DEFAULT_MODULE
+    print(format_report(get_import_times(module), module=module))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
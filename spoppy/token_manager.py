@@ -0,0 +1,101 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class TokenManager(object):
+    '''
+    Keeps the web API access token in memory and refreshes it in the
+    background shortly before it expires. The token cache file is read once
+    when loading, and only written by spotipy when a refresh gives us a new
+    token.
+    '''
+    # Refresh this many seconds before the token expires
+    REFRESH_MARGIN = 5 * 60
+    # Wait this long before trying again when a refresh fails
+    RETRY_INTERVAL = 30
+
+    def __init__(self, oauth, client):
+        self.oauth = oauth
+        self.client = client
+        self.token_info = None
+        self.refreshes = 0
+        self._lock = threading.Lock()
+        self._timer = None
+        self._stopped = False
+
+    def load(self):
+        '''
+        Loads the token from the token cache file, spotipy refreshes it if it
+        has expired
+        :returns: True if we have a token
+        '''
+        token_info = self.oauth.get_cached_token()
+        if token_info:
+            self.set_token_info(token_info)
+        return bool(token_info)
+
+    def get_access_token(self):
+        return self.token_info and self.token_info['access_token']
+
+    def set_token_info(self, token_info):
+        with self._lock:
+            self._set_token_info(token_info)
+
+    def _set_token_info(self, token_info):
+        self.token_info = token_info
+        self.client._auth = token_info['access_token']
+        expires_at = token_info.get('expires_at')
+        if expires_at:
+            self._schedule_refresh(expires_at - self.REFRESH_MARGIN)
+
+    def _schedule_refresh(self, refresh_at):
+        if self._timer:
+            self._timer.cancel()
+        if self._stopped:
+            return
+        delay = max(refresh_at - time.time(), 0)
+        logger.debug('Refreshing access token in %d seconds', delay)
+        self._timer = threading.Timer(delay, self.refresh)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def refresh(self, expired_token=None):
+        '''
+        Refreshes the access token. Only one refresh runs at a time.
+        :param expired_token: The token that was rejected. If another thread
+                              has replaced it in the meantime we don't
+                              refresh again.
+        :returns: True if we have a token that should work
+        '''
+        with self._lock:
+            if not self.token_info:
+                return False
+            if (
+                expired_token is not None and
+                expired_token != self.get_access_token()
+            ):
+                logger.debug('Access token was already refreshed')
+                return True
+            logger.debug('Refreshing access token')
+            try:
+                token_info = self.oauth.refresh_access_token(
+                    self.token_info['refresh_token']
+                )
+            except Exception:
+                logger.exception('Could not refresh access token')
+                token_info = None
+            if not token_info:
+                self._schedule_refresh(time.time() + self.RETRY_INTERVAL)
+                return False
+            self.refreshes += 1
+            self._set_token_info(token_info)
+            return True
+
+    def stop(self):
+        with self._lock:
+            self._stopped = True
+            if self._timer:
+                self._timer.cancel()
@@ -20,13 +20,16 @@ def parse_version(v):
         return [0, 0, 0]
 
 
-def check_for_updates(click, version, lock):
+def get_latest_version():
     info = requests.get(
         "https://pypi.python.org/pypi/spoppy/json").json()["info"]
 
-    pypi_version = info["version"]
+    return info["version"]
 
-    version = version
+
+def check_for_updates(click, version, lock, pypi_version=None):
+    if pypi_version is None:
+        pypi_version = get_latest_version()
 
     if parse_version(version) < parse_version(pypi_version):
         click.echo("\033[1m\033[94mA new version of spoppy is "
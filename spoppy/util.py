@@ -1,3 +1,4 @@
+import hashlib
 import logging
 import os
 import select
@@ -17,9 +18,32 @@ except ImportError:
 
 
 logger = logging.getLogger(__name__)
-artist_db_location = os.path.join(
-    user_cache_dir(appname='spoppy'), 'banned_spoppy_artists.txt'
-)
+
+
+def get_cache_path(*parts):
+    '''
+    Looking up the cache directory is left until it's needed, so importing
+    spoppy doesn't have to
+    :returns: The path of `parts` in spoppy's cache directory
+    '''
+    return os.path.join(user_cache_dir(appname='spoppy'), *parts)
+
+
+def get_user_cache_path(username, *parts):
+    '''
+    For data that belongs to one spotify account, so other accounts logging
+    in on the same computer don't see it
+    :returns: The path of `parts` in the cache directory of `username`
+    '''
+    if not isinstance(username, bytes):
+        username = username.encode('utf-8')
+    return get_cache_path(
+        'users', hashlib.sha1(username).hexdigest()[:16], *parts
+    )
+
+
+def get_artist_db_location():
+    return get_cache_path('banned_spoppy_artists.txt')
 
 
 # Initially taken from https://github.com/magmax/python-readchar
@@ -63,6 +87,20 @@ def format_track(track, extra_text=None):
     )
 
 
+def format_track_item(item, extra_text=None):
+    '''
+    Like format_track, for tracks as returned by the web API
+    '''
+    return '%s by %s %s' % (
+        item.get('name'),
+        ' & '.join(
+            artist['name'] for artist in item.get('artists') or []
+            if artist.get('name')
+        ),
+        extra_text or ''
+    )
+
+
 def artist_banned_text(navigator, track):
     for artist in track.artists:
         if navigator.is_artist_banned(artist):
@@ -79,21 +117,101 @@ def format_album(album_browser):
 
 
 def get_sort_key_for_menu(item):
-    if item[0].lstrip().isdigit():
-        # Force digits at the end of the list
-        return '~{}'.format(item[0])
-    return item[0]
+    key = item[0].strip()
+    if key.isdigit():
+        # Force digits at the end of the list, in numerical order
+        return (1, int(key), '')
+    return (0, 0, item[0])
+
+
+def get_sort_key_for_menu_item(item):
+    '''
+    :param item: A (key, value) tuple
+    :returns: What sorted_menu_items sorts `item` by
+    '''
+    return (item[1].destination in responses.ALL, get_sort_key_for_menu(item))
 
 
 def sorted_menu_items(items):
-    global_items = []
-    for key, value in sorted(items, key=get_sort_key_for_menu):
-        if value.destination in responses.ALL:
-            global_items.append((key, value))
+    '''
+    Sorts menu items, global items (i.e. quit) go last
+    :param items: (key, value) tuples
+    :returns: A list of the sorted (key, value) tuples
+    '''
+    return sorted(items, key=get_sort_key_for_menu_item)
+
+
+# Scores for get_match_score, like fzf's
+SCORE_MATCH = 16
+SCORE_GAP_START = -3
+SCORE_GAP_EXTENSION = -1
+BONUS_BOUNDARY = 8
+BONUS_CONSECUTIVE = -(SCORE_GAP_START + SCORE_GAP_EXTENSION)
+BONUS_FIRST_CHAR_MULTIPLIER = 2
+
+
+def get_match_score(pattern, name):
+    '''
+    Scores how well `pattern` matches `name` when the characters of the
+    pattern appear in the name in the same order. Characters that follow
+    each other or start words score higher, gaps between them lower. Like
+    fzf's v1 algorithm, we find where the first match ends and then the
+    shortest match ending there, instead of trying every possible match.
+    :param pattern: The lower case pattern
+    :param name: The lower case name
+    :returns: The score, or None if the pattern doesn't match
+    '''
+    idx = 0
+    for char in pattern:
+        idx = name.find(char, idx)
+        if idx == -1:
+            return None
+        idx += 1
+    positions = []
+    for char in reversed(pattern):
+        idx = name.rfind(char, 0, idx)
+        positions.append(idx)
+    positions.reverse()
+
+    score = 0
+    previous = None
+    # Characters following each other get the bonus of the first one
+    chunk_bonus = 0
+    for position in positions:
+        score += SCORE_MATCH
+        bonus = 0
+        if position == 0 or not name[position - 1].isalnum():
+            bonus = BONUS_BOUNDARY
+        if previous is not None and position == previous + 1:
+            bonus = max(bonus, chunk_bonus, BONUS_CONSECUTIVE)
         else:
-            yield key, value
-    for key, value in global_items:
-        yield key, value
+            chunk_bonus = bonus
+            if previous is None:
+                bonus *= BONUS_FIRST_CHAR_MULTIPLIER
+            else:
+                score += SCORE_GAP_START + SCORE_GAP_EXTENSION * (
+                    position - previous - 2
+                )
+        score += bonus
+        previous = position
+    return score
+
+
+def format_age(seconds):
+    '''
+    Formats how long ago something happened
+    :param seconds: Seconds since it happened
+    :returns: i.e. "5 minutes ago"
+    '''
+    for unit, unit_seconds in (
+        ('day', 24 * 60 * 60),
+        ('hour', 60 * 60),
+        ('minute', 60),
+    ):
+        count = int(seconds // unit_seconds)
+        if count:
+            return '%d %s%s ago' % (count, unit, 's' if count > 1 else '')
+    return 'just now'
 
 
 def get_duration_from_s(s, max_length=59 * 60 + 59):
@@ -130,7 +248,7 @@ def get_artist_uri(artist):
 
 def ban_artist(uri):
     logger.debug('Banning artist {}'.format(uri))
-    with open(artist_db_location, 'a') as f:
+    with open(get_artist_db_location(), 'a') as f:
         f.write('{}\n'.format(uri))
 
 
@@ -138,20 +256,20 @@ def unban_artist(uri):
     logger.debug('Unbanning artist {}'.format(uri))
     banned_artists = []
     try:
-        with open(artist_db_location, 'r') as f:
+        with open(get_artist_db_location(), 'r') as f:
             for line in f.readlines():
                 if line.strip() != uri:
                     banned_artists.append(line)
     except IOError:
         pass
-    with open(artist_db_location, 'w') as f:
+    with open(get_artist_db_location(), 'w') as f:
         for artist in banned_artists:
             f.write('{}\n'.format(artist))
 
 
 def get_banned_artist_uris():
     try:
-        with open(artist_db_location, 'r') as f:
+        with open(get_artist_db_location(), 'r') as f:
             return [line.strip() for line in f.readlines()]
     except IOError:
         return []
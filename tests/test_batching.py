@@ -0,0 +1,220 @@
+import json
+import logging
+import threading
+import time
+import unittest
+from mock import Mock, call
+
+import requests
+from spotipy import Spotify
+
+try:
+    from urllib.parse import parse_qs, urlparse
+except ImportError:
+    from urlparse import parse_qs, urlparse
+
+from spoppy import batching, executor
+from .test_http_cache import ThreadingHTTPServer
+
+try:
+    from http.server import BaseHTTPRequestHandler
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler
+
+logger = logging.getLogger(__name__)
+
+
+def get_tracks(ids, market=None):
+    return {
+        'tracks': [
+            None if id_ == 'unknown' else {'id': id_} for id_ in ids
+        ]
+    }
+
+
+class TestBatchLookup(unittest.TestCase):
+
+    def setUp(self):
+        self.batcher = batching.BatchLookup()
+        self.client = Mock()
+        self.client.tracks.side_effect = get_tracks
+
+    def test_uses_maximal_batches(self):
+        ids = ['%d' % i for i in range(120)]
+        results = self.batcher.lookup(self.client, 'tracks', ids)
+        self.assertEqual([result['id'] for result in results], ids)
+        self.assertEqual(
+            sorted(
+                len(args[0]) for args, _ in self.client.tracks.call_args_list
+            ),
+            [20, 50, 50]
+        )
+        self.assertEqual(self.batcher.stats()['requests'], 3)
+
+    def test_duplicates_are_looked_up_once(self):
+        results = self.batcher.lookup(self.client, 'tracks', ['a', 'b', 'a'])
+        self.assertEqual(
+            [result['id'] for result in results], ['a', 'b', 'a']
+        )
+        self.client.tracks.assert_called_once_with(['a', 'b'])
+
+    def test_unknown_ids(self):
+        results = self.batcher.lookup(
+            self.client, 'tracks', ['a', 'unknown']
+        )
+        self.assertEqual(results, [{'id': 'a'}, None])
+
+    def test_unknown_lookup_type(self):
+        with self.assertRaises(ValueError):
+            self.batcher.lookup(self.client, 'playlists', ['a'])
+
+    def test_artists_in_batches_of_50(self):
+        self.client.artists.side_effect = lambda ids: {
+            'artists': [{'id': id_} for id_ in ids]
+        }
+        ids = ['%d' % i for i in range(120)]
+        self.batcher.lookup(self.client, 'artists', ids)
+        self.assertEqual(
+            sorted(
+                len(args[0])
+                for args, _ in self.client.artists.call_args_list
+            ),
+            [20, 50, 50]
+        )
+
+    def test_raises_if_batch_fails(self):
+        self.client.artists.side_effect = ValueError('Oh noes')
+        with self.assertRaises(ValueError):
+            self.batcher.lookup(self.client, 'artists', ['a'])
+
+
+class TestRunInParallel(unittest.TestCase):
+
+    def test_calls_with_all_items(self):
+        done = []
+        batching.run_in_parallel(done.append, range(20), max_workers=3)
+        self.assertEqual(sorted(done), list(range(20)))
+
+    def test_stops_and_raises_on_error(self):
+        done = []
+
+        def func(item):
+            if item == 5:
+                raise ValueError('Oh noes')
+            done.append(item)
+
+        with self.assertRaises(ValueError):
+            batching.run_in_parallel(func, range(10), max_workers=1)
+        self.assertEqual(sorted(done), [6, 7, 8, 9])
+
+    def test_helpers_belong_to_the_same_owner(self):
+        owner = object()
+        owners = []
+
+        def func(item):
+            owners.append(executor.get_current_future().owner)
+
+        executor.executor.submit(
+            lambda: batching.run_in_parallel(func, range(10), max_workers=3),
+            owner=owner
+        ).result(5)
+        self.assertEqual(owners, [owner] * 10)
+
+    def test_stops_when_cancelled(self):
+        done = []
+
+        def func(item):
+            done.append(item)
+            # i.e. the user left the menu that started this
+            executor.get_current_future().cancel()
+
+        future = executor.executor.submit(
+            lambda: batching.run_in_parallel(func, range(10), max_workers=1)
+        )
+        future.wait(5)
+        self.assertIsInstance(future.exception(), executor.CancelledError)
+        self.assertEqual(len(done), 1)
+
+
+class TestPlaylistBatches(unittest.TestCase):
+
+    def test_adds_tracks_in_order(self):
+        client = Mock()
+        tracks = ['%d' % i for i in range(250)]
+        batching.add_tracks_to_playlist(client, 'user', 'playlist', tracks)
+        self.assertEqual(client.user_playlist_add_tracks.call_args_list, [
+            call(user='user', playlist_id='playlist', tracks=tracks[:100]),
+            call(user='user', playlist_id='playlist', tracks=tracks[100:200]),
+            call(user='user', playlist_id='playlist', tracks=tracks[200:]),
+        ])
+
+    def test_replaces_then_adds(self):
+        client = Mock()
+        tracks = ['%d' % i for i in range(150)]
+        batching.replace_playlist_tracks(client, 'user', 'playlist', tracks)
+        client.user_playlist_replace_tracks.assert_called_once_with(
+            user='user', playlist_id='playlist', tracks=tracks[:100]
+        )
+        client.user_playlist_add_tracks.assert_called_once_with(
+            user='user', playlist_id='playlist', tracks=tracks[100:]
+        )
+
+
+class TracksStub(object):
+    '''
+    Answers /tracks/?ids=... like the web API
+    '''
+
+    def __init__(self):
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                stub.requests += 1
+                query = parse_qs(urlparse(self.path).query)
+                ids = query['ids'][0].split(',')
+                body = json.dumps(get_tracks(ids)).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:%d/' % self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TestBatchLookupThroughput(unittest.TestCase):
+
+    def setUp(self):
+        self.stub = TracksStub()
+        self.client = Spotify(requests_session=requests.Session())
+        self.client.prefix = self.stub.url
+
+    def tearDown(self):
+        self.stub.stop()
+
+    def test_5000_tracks(self):
+        ids = ['%022d' % i for i in range(5000)]
+        started_at = time.time()
+        results = batching.BatchLookup().lookup(self.client, 'tracks', ids)
+        elapsed = time.time() - started_at
+        logger.info(
+            'Looked up %d tracks in %.2fs (%.0f/s)',
+            len(ids), elapsed, len(ids) / elapsed
+        )
+        self.assertEqual([result['id'] for result in results], ids)
+        self.assertEqual(self.stub.requests, 100)
@@ -0,0 +1,61 @@
+import unittest
+from mock import patch
+
+from spoppy.cache import LRUCache
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def test_get_set(self):
+        cache = LRUCache()
+        self.assertIsNone(cache.get('a'))
+        cache.set('a', 1)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIn('a', cache)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertIn('c', cache)
+        self.assertEqual(cache.evictions, 1)
+
+    def test_peek_does_not_touch(self):
+        cache = LRUCache(max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.peek('a'), 1)
+        cache.set('c', 3)
+        self.assertNotIn('a', cache)
+        self.assertEqual(cache.stats()['hits'], 0)
+
+    def test_evicts_by_size(self):
+        cache = LRUCache(max_size=10, sizeof=len)
+        cache.set('a', 'x' * 6)
+        cache.set('b', 'x' * 4)
+        self.assertEqual(cache.size, 10)
+        cache.set('c', 'x')
+        self.assertNotIn('a', cache)
+        self.assertEqual(cache.size, 5)
+        cache.set('b', 'x' * 2)
+        self.assertEqual(cache.size, 3)
+        cache.pop('b')
+        self.assertEqual(cache.size, 1)
+
+    @patch('spoppy.cache.time')
+    def test_expires(self, patched_time):
+        patched_time.time.return_value = 100
+        cache = LRUCache(ttl=10)
+        cache.set('a', 1)
+        patched_time.time.return_value = 109
+        self.assertEqual(cache.get('a'), 1)
+        patched_time.time.return_value = 110
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
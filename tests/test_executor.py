@@ -0,0 +1,129 @@
+import threading
+import unittest
+
+from spoppy import executor
+
+
+class TestExecutor(unittest.TestCase):
+
+    def setUp(self):
+        self.executor = executor.Executor(workers=1)
+        self.release = threading.Event()
+        self.started = threading.Event()
+
+    def tearDown(self):
+        self.release.set()
+        self.executor.shutdown()
+
+    def block(self):
+        self.started.set()
+        self.release.wait(5)
+
+    def test_runs_and_returns_result(self):
+        future = self.executor.submit(lambda: 'foo')
+        self.assertEqual(future.result(5), 'foo')
+        self.assertTrue(future.done())
+        self.assertEqual(self.executor.stats()['completed'], 1)
+
+    def test_captures_exceptions(self):
+        def fail():
+            raise ValueError('Oh noes')
+        future = self.executor.submit(fail)
+        future.wait(5)
+        self.assertIsInstance(future.exception(), ValueError)
+        with self.assertRaises(ValueError):
+            future.result()
+
+    def test_runs_foreground_before_prefetch(self):
+        order = []
+        self.executor.submit(self.block)
+        self.started.wait(5)
+        prefetch = self.executor.submit(
+            lambda: order.append('prefetch'), priority=executor.PREFETCH
+        )
+        foreground = self.executor.submit(
+            lambda: order.append('foreground'),
+            priority=executor.FOREGROUND
+        )
+        self.assertEqual(self.executor.stats()['queue_depth'], 2)
+        self.release.set()
+        prefetch.wait(5)
+        foreground.wait(5)
+        self.assertEqual(order, ['foreground', 'prefetch'])
+
+    def test_cancel_owner(self):
+        owner = object()
+        other_owner = object()
+        ran = []
+        self.executor.submit(self.block, owner=owner)
+        self.started.wait(5)
+        queued = self.executor.submit(lambda: ran.append(1), owner=owner)
+        other = self.executor.submit(lambda: ran.append(2), owner=other_owner)
+        callbacks = []
+        queued.add_done_callback(callbacks.append)
+
+        self.assertEqual(self.executor.cancel_owner(owner), 1)
+        self.assertTrue(queued.cancelled())
+        self.assertEqual(callbacks, [queued])
+
+        self.release.set()
+        other.wait(5)
+        self.assertEqual(ran, [2])
+        self.assertEqual(self.executor.stats()['cancelled'], 1)
+
+    def test_running_future_gets_cancel_request(self):
+        future = self.executor.submit(self.block)
+        self.started.wait(5)
+        self.assertFalse(future.cancel())
+        self.assertTrue(future.cancel_requested)
+        self.assertFalse(future.cancelled())
+
+    def test_bounded_workers(self):
+        executor_ = executor.Executor(workers=2)
+        try:
+            futures = [executor_.submit(lambda: 1) for _ in range(10)]
+            for future in futures:
+                future.wait(5)
+            self.assertEqual(executor_.stats()['workers'], 2)
+        finally:
+            executor_.shutdown()
+
+    def test_nested_work_inherits_priority(self):
+        priorities = []
+
+        def nested():
+            priorities.append(executor.get_current_priority())
+
+        def outer():
+            priorities.append(executor.get_current_priority())
+            return self.executor.submit(nested)
+        future = self.executor.submit(outer, priority=executor.PREFETCH)
+        nested_future = future.result(5)
+        nested_future.wait(5)
+        self.assertEqual(nested_future.priority, executor.PREFETCH)
+        self.assertEqual(priorities, [executor.PREFETCH] * 2)
+        self.assertEqual(executor.get_current_priority(), executor.FOREGROUND)
+
+    def test_promote(self):
+        order = []
+        self.executor.submit(self.block)
+        self.started.wait(5)
+        prefetch = self.executor.submit(
+            lambda: order.append('prefetch'), priority=executor.PREFETCH
+        )
+        foreground = self.executor.submit(
+            lambda: order.append('foreground'), priority=executor.PREFETCH
+        )
+        # The user is waiting for this now
+        self.executor.promote(foreground)
+        self.release.set()
+        prefetch.wait(5)
+        foreground.wait(5)
+        self.assertEqual(order, ['foreground', 'prefetch'])
+        self.assertEqual(self.executor.stats()['completed'], 3)
+
+    def test_running_at(self):
+        with executor.running_at(executor.PREFETCH):
+            future = self.executor.submit(executor.get_current_priority)
+        self.assertEqual(future.result(5), executor.PREFETCH)
+        self.assertEqual(executor.get_current_priority(), executor.FOREGROUND)
@@ -0,0 +1,195 @@
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+from mock import patch
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+from spoppy import http_cache, rate_limit
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class StubAPI(object):
+    '''
+    Stand-in for the web API, serves json with an ETag and answers
+    If-None-Match with 304. Responses in `errors`, (status, headers) tuples,
+    are sent before anything else.
+    '''
+
+    def __init__(self):
+        self.requests = []
+        self.client_ports = set()
+        self.body_bytes = 0
+        self.cache_control = 'private, max-age=0'
+        self.version = 1
+        self.errors = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                stub.requests.append(self.path)
+                stub.client_ports.add(self.client_address[1])
+                if stub.errors:
+                    status, headers = stub.errors.pop(0)
+                    self.send_response(status)
+                    for header, value in headers.items():
+                        self.send_header(header, value)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                etag = '"v%d"' % stub.version
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.send_header('Cache-Control', stub.cache_control)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                body = json.dumps({
+                    'path': self.path, 'version': stub.version
+                }).encode('utf-8')
+                stub.body_bytes += len(body)
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('ETag', etag)
+                self.send_header('Cache-Control', stub.cache_control)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                stub.requests.append(self.path)
+                stub.version += 1
+                self.send_response(201)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:%d' % self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def shutdown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TestCachedSession(unittest.TestCase):
+
+    def setUp(self):
+        self.stub = StubAPI()
+        self.directory = tempfile.mkdtemp()
+        self.session = self.get_session()
+
+    def tearDown(self):
+        self.stub.shutdown()
+        shutil.rmtree(self.directory)
+
+    def get_session(self, **kwargs):
+        return http_cache.CachedSession(
+            http_cache.ResponseCache(self.directory, **kwargs)
+        )
+
+    def get(self, path, session=None, **kwargs):
+        return (session or self.session).request(
+            'GET', self.stub.url + path, **kwargs
+        )
+
+    def test_revalidates_with_etag(self):
+        first = self.get('/v1/me', params={'limit': 50})
+        self.assertEqual(first.json()['path'], '/v1/me?limit=50')
+        body_bytes = self.stub.body_bytes
+
+        second = self.get('/v1/me', params={'limit': 50})
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json(), first.json())
+        # The server was asked, but sent no payload
+        self.assertEqual(len(self.stub.requests), 2)
+        self.assertEqual(self.stub.body_bytes, body_bytes)
+        self.assertEqual(self.session.stats()['revalidated'], 1)
+
+    def test_counts_received_bytes(self):
+        received_before = rate_limit.get_received_bytes()
+        first = self.get('/v1/me')
+        # The same body, from the cache
+        self.get('/v1/me')
+        self.assertEqual(
+            rate_limit.get_received_bytes() - received_before,
+            2 * len(first.content)
+        )
+
+    def test_params_are_part_of_key(self):
+        self.get('/v1/search', params={'q': 'a'})
+        self.get('/v1/search', params={'q': 'b'})
+        self.assertEqual(self.session.stats()['misses'], 2)
+        self.assertEqual(self.session.stats()['cached_responses'], 2)
+
+    def test_fresh_responses_not_requested(self):
+        self.stub.cache_control = 'max-age=60'
+        first = self.get('/v1/browse')
+        second = self.get('/v1/browse')
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(len(self.stub.requests), 1)
+        self.assertEqual(self.session.stats()['hits'], 1)
+        second.connection.close()
+
+    def test_no_store_not_cached(self):
+        self.stub.cache_control = 'no-store'
+        self.get('/v1/me')
+        self.get('/v1/me')
+        self.assertEqual(self.session.stats()['cached_responses'], 0)
+        self.assertEqual(self.session.stats()['misses'], 2)
+
+    def test_modification_forces_revalidation(self):
+        self.stub.cache_control = 'max-age=60'
+        self.get('/v1/playlist')
+        self.session.request('POST', self.stub.url + '/v1/playlist')
+        response = self.get('/v1/playlist')
+        self.assertEqual(response.json()['version'], 2)
+
+    def test_survives_restart(self):
+        self.get('/v1/me')
+        body_bytes = self.stub.body_bytes
+        session = self.get_session()
+        response = self.get('/v1/me', session=session)
+        self.assertEqual(response.json()['path'], '/v1/me')
+        self.assertEqual(self.stub.body_bytes, body_bytes)
+
+    def test_index_loaded_on_first_lookup(self):
+        self.get('/v1/me')
+        with patch('spoppy.http_cache.os.listdir') as patched_listdir:
+            patched_listdir.return_value = []
+            cache = http_cache.ResponseCache(self.directory)
+            patched_listdir.assert_not_called()
+            cache.get(self.stub.url + '/v1/me')
+            cache.get(self.stub.url + '/v1/me')
+            patched_listdir.assert_called_once_with(self.directory)
+
+    def test_evicts_least_recently_used(self):
+        session = self.get_session(max_size=1300)
+        for path in ('/a', '/b', '/c'):
+            self.get(path, session=session)
+        self.get('/a', session=session)
+        self.get('/d', session=session)
+        cache = session.cache
+        self.assertLessEqual(cache.size, 1300)
+        self.assertEqual(len(cache), 3)
+        self.assertIsNotNone(cache.get(self.stub.url + '/a'))
+        self.assertIsNone(cache.get(self.stub.url + '/b'))
+        self.assertIsNotNone(cache.get(self.stub.url + '/d'))
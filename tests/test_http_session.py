@@ -0,0 +1,64 @@
+import threading
+import unittest
+
+import requests
+
+from spoppy import http_session
+
+from .test_http_cache import StubAPI
+
+
+class TestPooledAdapter(unittest.TestCase):
+
+    def setUp(self):
+        self.stub = StubAPI()
+        self.session = requests.Session()
+        self.adapter = http_session.mount_pooled_adapter(
+            self.session, pool_size=3
+        )
+
+    def tearDown(self):
+        self.adapter.shutdown()
+        self.stub.shutdown()
+
+    def get(self):
+        response = self.session.get(self.stub.url + '/v1/me')
+        # Like spotipy does after every call
+        response.connection.close()
+        return response
+
+    def test_reuses_connections(self):
+        for _ in range(5):
+            self.assertEqual(self.get().status_code, 200)
+        stats = self.adapter.stats()
+        self.assertEqual(stats['pool_size'], 3)
+        self.assertEqual(stats['requests'], 5)
+        self.assertEqual(stats['connections'], 1)
+        self.assertEqual(stats['reused'], 4)
+        self.assertEqual(len(self.stub.client_ports), 1)
+
+    def test_concurrent_requests_share_pool(self):
+        def get_many():
+            for _ in range(5):
+                self.get()
+        threads = [threading.Thread(target=get_many) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = self.adapter.stats()
+        self.assertEqual(stats['requests'], 15)
+        self.assertLessEqual(stats['connections'], 3)
+        self.assertLessEqual(len(self.stub.client_ports), 3)
+
+    def test_plain_adapter_reconnects(self):
+        # What happens without the pooled adapter
+        session = requests.Session()
+        for _ in range(3):
+            session.get(self.stub.url + '/v1/me').connection.close()
+        self.assertEqual(len(self.stub.client_ports), 3)
+
+    def test_shutdown_closes_pool(self):
+        self.get()
+        self.adapter.shutdown()
+        self.assertEqual(self.adapter.stats()['connections'], 0)
@@ -0,0 +1,316 @@
+import logging
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from mock import Mock, patch
+
+from spoppy import library
+
+logger = logging.getLogger(__name__)
+
+
+def get_playlist(playlist_id, snapshot_id='1'):
+    return {
+        'id': playlist_id,
+        'name': 'Playlist %s' % playlist_id,
+        'snapshot_id': snapshot_id,
+        'tracks': {
+            'href': 'https://api.spotify.com/v1/playlists/%s/tracks' % (
+                playlist_id
+            ),
+            'total': 3,
+        },
+    }
+
+
+def get_track(i):
+    return {
+        'uri': 'spotify:track:%d' % i,
+        'name': 'Track %d' % i,
+        'artists': [{'name': 'Artist %d' % i}],
+        'album': {'name': 'Album %d' % i, 'available_markets': ['IS']},
+        'available_markets': ['IS', 'NO'],
+    }
+
+
+def get_tracks_page(limit, offset, total=3):
+    return {
+        'items': [
+            {'track': get_track(i)}
+            for i in range(offset, min(offset + limit, total))
+        ],
+        'limit': limit,
+        'offset': offset,
+        'total': total,
+    }
+
+
+class LibraryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.library = library.LibraryStore(
+            os.path.join(self.directory, 'library.db')
+        )
+        self.client = Mock()
+        self.client._get.side_effect = (
+            lambda href, limit=100, offset=0: get_tracks_page(limit, offset)
+        )
+
+    def tearDown(self):
+        self.library.close()
+        shutil.rmtree(self.directory)
+
+
+class TestLibraryStore(LibraryTestCase):
+
+    def test_playlists_before_sync(self):
+        self.assertIsNone(self.library.get_playlists())
+        self.assertIsNone(self.library.get_playlists_synced_at())
+
+    def test_playlists_keep_order(self):
+        playlists = [get_playlist('b'), get_playlist('a')]
+        self.library.set_playlists(playlists)
+        self.assertEqual(self.library.get_playlists(), playlists)
+        self.library.set_playlists(playlists[1:])
+        self.assertEqual(self.library.get_playlists(), playlists[1:])
+
+    def test_playlist_tracks_by_snapshot(self):
+        tracks = [get_track(i) for i in range(3)]
+        self.library.set_playlist_tracks('a', '1', tracks)
+        stored = self.library.get_playlist_tracks('a', '1')
+        self.assertEqual(
+            [track['uri'] for track in stored],
+            [track['uri'] for track in tracks]
+        )
+        self.assertNotIn('available_markets', stored[0])
+        self.assertNotIn('available_markets', stored[0]['album'])
+        self.assertIsNone(self.library.get_playlist_tracks('a', '2'))
+        self.assertIsNone(self.library.get_playlist_tracks('b', '1'))
+
+    def test_outdated_playlists(self):
+        self.library.set_playlists([get_playlist('a'), get_playlist('b')])
+        self.library.set_playlist_tracks('a', '1', [get_track(1)])
+        self.library.set_playlist_tracks('b', '1', [get_track(1)])
+        self.assertEqual(self.library.get_outdated_playlists(), [])
+        self.library.set_playlists([get_playlist('a', '2'), get_playlist('b')])
+        self.assertEqual(
+            [playlist['id'] for playlist in
+             self.library.get_outdated_playlists()],
+            ['a']
+        )
+
+    def test_responses(self):
+        self.assertIsNone(self.library.get_response('featured'))
+        started_at = time.time()
+        self.library.set_response('featured', {'items': [1]})
+        response, stored_at = self.library.get_response('featured')
+        self.assertEqual(response, {'items': [1]})
+        self.assertGreaterEqual(stored_at, started_at)
+
+    def test_persists(self):
+        self.library.set_playlists([get_playlist('a')])
+        self.library.close()
+        other = library.LibraryStore(self.library.path)
+        try:
+            self.assertEqual(other.get_playlists(), [get_playlist('a')])
+        finally:
+            other.close()
+
+
+class TestPlaylistTracks(LibraryTestCase):
+
+    def test_fetches_all_pages(self):
+        self.client._get.side_effect = (
+            lambda href, limit=100, offset=0: get_tracks_page(
+                limit, offset, total=250
+            )
+        )
+        tracks = library.fetch_playlist_tracks(
+            self.client, get_playlist('a')
+        )
+        self.assertEqual(len(tracks), 250)
+        self.assertEqual(self.client._get.call_count, 3)
+
+    def test_uses_library_for_same_snapshot(self):
+        playlist = get_playlist('a')
+        tracks = library.get_playlist_tracks(
+            self.library, self.client, playlist
+        )
+        self.assertEqual(len(tracks), 3)
+        self.assertEqual(self.client._get.call_count, 1)
+        self.assertEqual(
+            library.get_playlist_tracks(self.library, self.client, playlist),
+            self.library.get_playlist_tracks('a', '1')
+        )
+        self.assertEqual(self.client._get.call_count, 1)
+
+        library.get_playlist_tracks(
+            self.library, self.client, get_playlist('a', '2')
+        )
+        self.assertEqual(self.client._get.call_count, 2)
+
+
+class TestLibrarySync(LibraryTestCase):
+
+    @patch('spoppy.library.playlist_cache')
+    def test_syncs_changed_playlists(self, patched_cache):
+        patched_cache.get.return_value = [
+            get_playlist('a'), get_playlist('b')
+        ]
+        sync = library.LibrarySync(self.library)
+        sync.sync(self.client)
+        patched_cache.get.assert_called_once_with(self.client, refresh=True)
+        self.assertEqual(self.client._get.call_count, 2)
+        self.assertEqual(len(self.library.get_playlist_tracks('b', '1')), 3)
+
+        patched_cache.get.return_value = [
+            get_playlist('a'), get_playlist('b', '2')
+        ]
+        sync.sync(self.client)
+        self.assertEqual(self.client._get.call_count, 3)
+        self.assertEqual(sync.synced_playlists, 3)
+
+    @patch('spoppy.library.playlist_cache')
+    def test_runs_in_background(self, patched_cache):
+        patched_cache.get.return_value = [get_playlist('a')]
+        sync = library.LibrarySync(self.library)
+        future = sync.start(self.client)
+        future.wait(5)
+        self.assertFalse(sync.is_syncing())
+        self.assertEqual(self.library.get_playlists(), [get_playlist('a')])
+
+
+class TestLibrarySearch(LibraryTestCase):
+
+    def setUp(self):
+        super(TestLibrarySearch, self).setUp()
+        self.library.set_playlists([
+            get_playlist(playlist_id) for playlist_id in ('a', 'b', 'big')
+        ])
+        self.library.set_playlist_tracks('a', '1', [
+            {
+                'uri': 'spotify:track:1',
+                'name': 'Hey Jude',
+                'artists': [{'name': 'The Beatles'}],
+                'album': {'name': 'Past Masters'},
+            },
+            {
+                'uri': 'spotify:track:2',
+                'name': 'Jude',
+                'artists': [{'name': 'Someone Else'}],
+                'album': None,
+            },
+        ])
+
+    def get_uris(self, query):
+        return [
+            track['uri'] for track in self.library.search_tracks(query)
+        ]
+
+    def test_matches_names_artists_and_albums(self):
+        self.assertEqual(sorted(self.get_uris('jude')), [
+            'spotify:track:1', 'spotify:track:2'
+        ])
+        self.assertEqual(self.get_uris('beatles'), ['spotify:track:1'])
+        self.assertEqual(self.get_uris('past'), ['spotify:track:1'])
+
+    def test_matches_prefixes_of_all_words(self):
+        self.assertEqual(self.get_uris('jud beat'), ['spotify:track:1'])
+        self.assertEqual(self.get_uris('jude nobody'), [])
+
+    def test_ignores_quotes(self):
+        self.assertEqual(self.get_uris('"beatles'), ['spotify:track:1'])
+        self.assertEqual(self.get_uris('  '), [])
+        self.assertEqual(self.get_uris('"'), [])
+
+    def test_updated_tracks_are_reindexed(self):
+        self.library.set_playlist_tracks('b', '1', [{
+            'uri': 'spotify:track:1',
+            'name': 'Let It Be',
+            'artists': [{'name': 'The Beatles'}],
+        }])
+        self.assertEqual(self.get_uris('let'), ['spotify:track:1'])
+        self.assertEqual(self.get_uris('jude'), ['spotify:track:2'])
+
+    def count_tracks(self):
+        connection = self.library.get_connection()
+        return [
+            connection.execute('SELECT COUNT(*) FROM %s' % table).fetchone()[0]
+            for table in ('tracks', 'tracks_fts')
+        ]
+
+    def test_removed_tracks_are_not_found(self):
+        self.library.set_playlist_tracks('b', '1', [
+            {'uri': 'spotify:track:1', 'name': 'Hey Jude'},
+        ])
+        self.library.set_playlist_tracks('a', '2', [
+            {'uri': 'spotify:track:3', 'name': 'Yesterday'},
+        ])
+        self.assertEqual(self.get_uris('jude'), ['spotify:track:1'])
+        self.assertEqual(self.count_tracks(), [2, 2])
+
+        self.library.set_playlists([get_playlist('a')])
+        self.assertEqual(self.get_uris('jude'), [])
+        self.assertEqual(self.get_uris('yesterday'), ['spotify:track:3'])
+        self.assertEqual(self.count_tracks(), [1, 1])
+        self.assertIsNone(self.library.get_playlist_tracks('b', '1'))
+
+    def test_viewed_playlists_are_not_in_library(self):
+        self.library.set_playlist_tracks('featured', '1', [
+            {'uri': 'spotify:track:3', 'name': 'Yesterday'},
+        ])
+        self.assertEqual(self.get_uris('yesterday'), [])
+        self.assertEqual(
+            len(self.library.get_playlist_tracks('featured', '1')), 1
+        )
+
+    @patch('spoppy.library.MAX_VIEWED_PLAYLISTS', 2)
+    def test_forgets_playlists_viewed_longest_ago(self):
+        for i in range(3):
+            self.library.set_playlist_tracks('viewed%d' % i, '1', [
+                {'uri': 'spotify:track:viewed%d' % i, 'name': 'Viewed'},
+            ])
+            # Viewed again, so it's kept
+            self.library.get_playlist_tracks('viewed0', '1')
+            time.sleep(0.01)
+        self.assertIsNotNone(self.library.get_playlist_tracks('viewed0', '1'))
+        self.assertIsNone(self.library.get_playlist_tracks('viewed1', '1'))
+        self.assertIsNotNone(self.library.get_playlist_tracks('viewed2', '1'))
+        # The playlists of the library are kept, and their tracks
+        self.assertEqual(self.count_tracks(), [4, 4])
+
+    def test_without_full_text_search(self):
+        self.library.fts_module = None
+        self.assertEqual(self.get_uris('jud beat'), ['spotify:track:1'])
+        self.assertEqual(sorted(self.get_uris('jude')), [
+            'spotify:track:1', 'spotify:track:2'
+        ])
+
+    def test_indexes_existing_tracks(self):
+        connection = self.library.get_connection()
+        with connection:
+            connection.execute('DROP TABLE tracks_fts')
+        self.library.close()
+        self.assertEqual(self.get_uris('beatles'), ['spotify:track:1'])
+
+    def test_query_benchmark(self):
+        self.library.set_playlist_tracks('big', '1', [
+            {
+                'uri': 'spotify:track:big%d' % i,
+                'name': 'Song number %d' % i,
+                'artists': [{'name': 'Artist %d' % (i % 100)}],
+                'album': {'name': 'Album %d' % (i % 500)},
+            }
+            for i in range(5000)
+        ])
+        started_at = time.time()
+        for _ in range(10):
+            results = self.library.search_tracks('song artist 42')
+        logger.info(
+            'Searched 5000 tracks in %.1fms',
+            (time.time() - started_at) / 10 * 1000
+        )
+        self.assertEqual(len(results), 20)
@@ -0,0 +1,235 @@
+import sqlite3
+import unittest
+from mock import Mock, patch
+
+from spotify import TrackAvailability
+
+from spoppy.loaders import playlists, search, tracks
+
+
+def get_playlist_page(offset, limit, total):
+    return {
+        'items': [
+            {'name': 'Playlist %d' % i}
+            for i in range(offset, min(offset + limit, total))
+        ],
+        'limit': limit,
+        'offset': offset,
+        'total': total,
+    }
+
+
+class TestPlaylistCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = playlists.PlaylistCache()
+        self.client = Mock()
+        self.client.current_user_playlists.side_effect = (
+            lambda limit=50, offset=0: get_playlist_page(offset, limit, 172)
+        )
+
+    def test_fetches_all_pages_in_order(self):
+        items = self.cache.get(self.client)
+        self.assertEqual(len(items), 172)
+        self.assertEqual(
+            [item['name'] for item in items],
+            ['Playlist %d' % i for i in range(172)]
+        )
+        self.assertEqual(self.client.current_user_playlists.call_count, 4)
+
+    def test_single_page(self):
+        self.client.current_user_playlists.side_effect = None
+        self.client.current_user_playlists.return_value = {'items': []}
+        self.assertEqual(self.cache.get(self.client), [])
+        self.client.current_user_playlists.assert_called_once_with(limit=50)
+
+    def test_uses_cache(self):
+        self.cache.get(self.client)
+        self.cache.get(self.client)
+        self.assertEqual(self.client.current_user_playlists.call_count, 4)
+        self.cache.get(self.client, refresh=True)
+        self.assertEqual(self.client.current_user_playlists.call_count, 8)
+        self.cache.clear()
+        self.cache.get(self.client)
+        self.assertEqual(self.client.current_user_playlists.call_count, 12)
+
+    def test_none_is_not_cached(self):
+        self.client.current_user_playlists.side_effect = None
+        self.client.current_user_playlists.return_value = None
+        self.assertIsNone(self.cache.get(self.client))
+        self.assertFalse(self.cache.is_fresh())
+
+    def test_raises_if_page_fails(self):
+        def current_user_playlists(limit=50, offset=0):
+            if offset == 100:
+                raise ValueError('Oh noes')
+            return get_playlist_page(offset, limit, 172)
+        self.client.current_user_playlists.side_effect = current_user_playlists
+        with self.assertRaises(ValueError):
+            self.cache.get(self.client)
+        self.assertFalse(self.cache.is_fresh())
+
+
+def get_search_page(search_type, total):
+    return {
+        'href': 'https://api.spotify.com/v1/search?type=%s' % search_type,
+        'items': [{'name': '%s %d' % (search_type, i)} for i in range(3)],
+        'limit': 20,
+        'offset': 0,
+        'total': total,
+        'previous': None,
+        'next': None,
+    }
+
+
+class TestMultiSearch(unittest.TestCase):
+
+    def setUp(self):
+        self.navigator = Mock()
+        self.navigator.spotipy_client.search.return_value = {
+            'tracks': get_search_page('tracks', 10),
+            'albums': get_search_page('albums', 5),
+            'artists': get_search_page('artists', 0),
+            'playlists': get_search_page('playlists', 2),
+        }
+
+    def get_loaded_search(self):
+        multi_search = search.search(
+            self.navigator, 'foo', search_type='all'
+        )
+        self.assertTrue(multi_search.loaded_event.wait(5))
+        return multi_search
+
+    def test_searches_all_types_in_one_request(self):
+        multi_search = self.get_loaded_search()
+        self.assertIsInstance(multi_search, search.MultiSearch)
+        self.navigator.spotipy_client.search.assert_called_once_with(
+            'foo', limit=20, type='track,album,artist,playlist'
+        )
+        self.assertEqual(
+            [search_type for search_type, _ in multi_search.results.results],
+            ['tracks', 'albums', 'artists', 'playlists']
+        )
+        self.assertEqual(multi_search.results.total, 17)
+        self.assertEqual(multi_search.get_cache_key(), ('all', 'foo', 0))
+
+    def test_group_search_reuses_page(self):
+        multi_search = self.get_loaded_search()
+        with patch('spoppy.loaders.search.search') as patched_search:
+            patched_search.return_value.is_cancelled.return_value = False
+            group_search = multi_search.get_group_search('albums')
+            self.assertEqual(
+                multi_search.get_group_search('albums'), group_search
+            )
+        self.assertEqual(group_search, patched_search.return_value)
+        patched_search.assert_called_once_with(
+            self.navigator, 'foo', search_type='albums',
+            response_data=get_search_page('albums', 5)
+        )
+        self.navigator.spotipy_client.search.assert_called_once_with(
+            'foo', limit=20, type='track,album,artist,playlist'
+        )
+
+
+class TestLastKnownPlaylists(unittest.TestCase):
+
+    def setUp(self):
+        self.navigator = Mock()
+        self.library = self.navigator.lifecycle.library
+        playlists.last_known_playlists.clear()
+
+    @patch('spoppy.loaders.playlists.playlist_cache')
+    def test_mine_from_memory(self, patched_cache):
+        patched_cache.peek.return_value = ([{'name': 'a'}], 10)
+        self.assertEqual(
+            playlists.get_last_known_playlists(self.navigator, 'mine'),
+            ({'items': [{'name': 'a'}], 'total': 1}, 10)
+        )
+        self.library.get_playlists.assert_not_called()
+
+    @patch('spoppy.loaders.playlists.playlist_cache')
+    def test_mine_from_library(self, patched_cache):
+        patched_cache.peek.return_value = None
+        self.library.get_playlists.return_value = [{'name': 'a'}]
+        self.library.get_playlists_synced_at.return_value = 10
+        self.assertEqual(
+            playlists.get_last_known_playlists(self.navigator, 'mine'),
+            ({'items': [{'name': 'a'}], 'total': 1}, 10)
+        )
+        self.library.get_playlists.return_value = None
+        self.assertIsNone(
+            playlists.get_last_known_playlists(self.navigator, 'mine')
+        )
+
+    @patch('spoppy.loaders.playlists.playlist_cache')
+    def test_library_error(self, patched_cache):
+        patched_cache.peek.return_value = None
+        self.library.get_playlists.side_effect = sqlite3.OperationalError(
+            'database is locked'
+        )
+        self.library.get_response.side_effect = sqlite3.DatabaseError(
+            'file is not a database'
+        )
+        for playlist_type in ('mine', 'featured'):
+            self.assertIsNone(
+                playlists.get_last_known_playlists(
+                    self.navigator, playlist_type
+                )
+            )
+
+    def test_featured(self):
+        self.library.get_response.return_value = None
+        self.assertIsNone(
+            playlists.get_last_known_playlists(self.navigator, 'featured')
+        )
+        self.library.get_response.return_value = ({'items': []}, 10)
+        for _ in range(2):
+            self.assertEqual(
+                playlists.get_last_known_playlists(
+                    self.navigator, 'featured'
+                ),
+                ({'items': []}, 10)
+            )
+        self.assertEqual(self.library.get_response.call_count, 2)
+
+
+class TestLoadedTrackLoader(unittest.TestCase):
+
+    def test_leaves_out_unavailable_tracks(self):
+        available = Mock(availability=TrackAvailability.AVAILABLE)
+        available.load.return_value = available
+        unavailable = Mock(availability=TrackAvailability.UNAVAILABLE)
+        playlist = Mock(tracks=[available, unavailable])
+        loader = tracks.LoadedTrackLoader(Mock(), playlist)
+        self.assertTrue(loader.loaded_event.wait(5))
+        self.assertEqual(list(loader.results), [available])
+        unavailable.load.assert_not_called()
+
+
+class TestLibraryTrackLoader(unittest.TestCase):
+
+    @patch('spoppy.loaders.tracks.Track')
+    def test_load_timeout(self, patched_track):
+        patched_track.return_value.load.side_effect = Exception('Timeout')
+        loader = tracks.LibraryTrackLoader(
+            Mock(), {'uri': 'spotify:track:1'}
+        )
+        self.assertTrue(loader.loaded_event.wait(5))
+        self.assertEqual(list(loader.results), [])
+        patched_track.assert_called_once_with(
+            loader.session, 'spotify:track:1'
+        )
+
+
+class TestPlaylistLoader(unittest.TestCase):
+
+    @patch('spoppy.loaders.playlists.playlist_cache')
+    def test_refresh(self, patched_cache):
+        patched_cache.get.return_value = [{'name': 'a'}]
+        navigator = Mock()
+        for refresh in (False, True):
+            loader = playlists.PlaylistLoader(navigator, refresh=refresh)
+            self.assertTrue(loader.loaded_event.wait(5))
+            patched_cache.get.assert_called_with(
+                navigator.spotipy_client, refresh=refresh
+            )
@@ -1,12 +1,18 @@
+import logging
+import time
 import unittest
 import uuid
 from collections import namedtuple
 from mock import Mock, patch
 
-from spoppy import menus, responses
+from spoppy import executor, menus, responses, util
+from spoppy.cache import LRUCache
+from spoppy.loaders.loader import Results
 
 from . import utils
 
+logger = logging.getLogger(__name__)
+
 MockLoader = namedtuple('Loader', ('results', ))
 
 class TestOptions(unittest.TestCase):
@@ -121,6 +127,107 @@ class TestOptions(unittest.TestCase):
         best = op.match_best_or_none('si')
         self.assertEqual(best.name, '4')
 
+    @patch('spoppy.menus.sorted_menu_items')
+    def test_sorted_items_are_sorted_once(self, patched_sorter):
+        patched_sorter.side_effect = util.sorted_menu_items
+        self.assertEqual(
+            [key for key, _ in self.op.get_sorted_items()],
+            ['kk', 'ko', 'o', 'q', 's', '1', '2', '3']
+        )
+        self.assertEqual(
+            [key for key, _ in self.op.get_sorted_items('k')], ['kk', 'ko']
+        )
+        self.assertEqual(
+            [key for key, _ in self.op.get_sorted_items('q')], ['q', 'o']
+        )
+        self.op.get_sorted_items()
+        self.assertEqual(patched_sorter.call_count, 1)
+
+        self.op['a'] = menus.MenuValue('k', Mock())
+        self.assertEqual(
+            [key for key, _ in self.op.get_sorted_items('k')],
+            ['kk', 'ko', 'a']
+        )
+        self.op['kk'] = menus.MenuValue('zzz', Mock())
+        del self.op['q']
+        self.assertEqual(
+            self.op.get_sorted_items(),
+            util.sorted_menu_items(self.op.items())
+        )
+        # The changes are made to the sorted items
+        self.assertEqual(patched_sorter.call_count, 1)
+
+    def test_setting_the_same_value_keeps_the_cache(self):
+        value = self.op['kk']
+        self.op.get_sorted_items('k')
+        cache_id = self.op._cache_id
+        self.op['kk'] = value
+        self.assertEqual(self.op._cache_id, cache_id)
+        self.op['kk'] = menus.MenuValue('other', value.destination)
+        self.assertNotEqual(self.op._cache_id, cache_id)
+
+    def test_best_matches_first(self):
+        op = menus.Options({
+            '1': menus.MenuValue('Hey Jude', Mock()),
+            '2': menus.MenuValue('Majestic sudden tea', Mock()),
+            '3': menus.MenuValue('Superjude', Mock()),
+            '4': menus.MenuValue('Judas', Mock()),
+            'ju': menus.MenuValue('Jump', Mock()),
+        })
+        self.assertEqual(
+            [key for key, _ in op.get_sorted_items('jude')], ['1', '3', '2']
+        )
+        self.assertEqual(
+            [key for key, _ in op.get_sorted_items('jude', limit=2)],
+            ['1', '3']
+        )
+        self.assertEqual(op.count_items('jude'), 3)
+        # Other pages come from the same ranking
+        with patch.object(op, 'get_scores') as patched_scores:
+            self.assertEqual(
+                [key for key, _ in op.get_sorted_items('jude', limit=3)],
+                ['1', '3', '2']
+            )
+            patched_scores.assert_not_called()
+        # Keys starting with the pattern come first
+        self.assertEqual(op.get_sorted_items('ju')[0][0], 'ju')
+
+    @patch('spoppy.menus.get_match_score', wraps=menus.get_match_score)
+    def test_extended_pattern_only_checks_previous_matches(
+        self, patched_score
+    ):
+        self.assertEqual(sorted(self.op.get_possibilities('p')), ['kk', 'ko'])
+        # All names but for those whose keys start with p
+        self.assertEqual(patched_score.call_count, len(self.op))
+        patched_score.reset_mock()
+        self.assertEqual(self.op.get_possibilities('pp'), ['kk'])
+        self.assertEqual(patched_score.call_count, 2)
+
+    @patch('spoppy.menus.get_match_score', wraps=menus.get_match_score)
+    def test_filtered_options_share_matches(self, patched_score):
+        filtered = self.op.filter('k')
+        patched_score.reset_mock()
+        self.assertEqual(sorted(filtered.get_possibilities('k')), [
+            'kk', 'ko'
+        ])
+        patched_score.assert_not_called()
+        self.assertEqual(filtered.get_possibilities('pp'), ['kk'])
+
+        # The options have changed, the filtered ones match on their own
+        self.op['kk'] = menus.MenuValue('Other', Mock())
+        self.assertEqual(filtered.get_possibilities('pp'), ['kk'])
+        self.assertEqual(self.op.get_possibilities('pp'), [])
+
+    def test_match_cache_is_bounded(self):
+        with patch(
+            'spoppy.menus.match_cache', LRUCache(max_entries=3, sizeof=len)
+        ) as patched_cache:
+            for pattern in ('a', 'b', 'c', 'd', 'e'):
+                self.op.get_possibilities(pattern)
+            self.assertEqual(len(patched_cache), 3)
+            self.op.get_possibilities('e')
+            self.assertEqual(patched_cache.stats()['hits'], 1)
+
     def test_check_unique_keys(self):
         with self.assertRaises(TypeError):
             menus.Options({
@@ -130,6 +237,13 @@ class TestOptions(unittest.TestCase):
         with self.assertRaises(TypeError):
             self.op['   1'] = menus.MenuValue('1', Mock())
 
+    def test_delete_option(self):
+        self.assertEqual(len(self.op.get_possibilities('k')), 2)
+        del self.op['kk']
+        self.assertEqual(self.op.get_possibilities('k'), ['ko'])
+        self.op[' kk'] = menus.MenuValue('pp', Mock())
+        self.assertEqual(len(self.op.get_possibilities('k')), 2)
+
 
 class MenuTests(unittest.TestCase):
 
@@ -193,6 +307,38 @@ class MenuTests(unittest.TestCase):
         self.assertIn(responses.UP, included_items)
         self.assertIn(responses.PLAYER, included_items)
 
+    def test_resume_initializes_by_default(self):
+        self.submenu.initialize()
+        self.submenu.filter = 'foo'
+        with patch.object(self.submenu, 'get_options') as patched_options:
+            patched_options.return_value = {}
+            self.submenu.resume()
+            patched_options.assert_called_once_with()
+        self.assertEqual(self.submenu.filter, '')
+
+    def test_resume_incremental_options(self):
+        self.submenu.INCREMENTAL_OPTIONS = True
+        self.submenu.VOLATILE_OPTIONS = ('v', )
+        self.navigator.player.has_been_loaded.return_value = False
+        self.submenu.initialize()
+        self.submenu.filter = 'foo'
+
+        self.navigator.player.has_been_loaded.return_value = True
+        volatile = menus.MenuValue('Volatile', Mock())
+        with patch.object(self.submenu, 'get_options') as patched_options:
+            self.submenu.get_volatile_options = lambda: {'v': volatile}
+            self.submenu.resume()
+            self.assertEqual(self.submenu._options['v'], volatile)
+            self.assertIn('p', self.submenu._options)
+
+            self.navigator.player.has_been_loaded.return_value = False
+            self.submenu.get_volatile_options = lambda: {}
+            self.submenu.resume()
+            self.assertNotIn('v', self.submenu._options)
+            self.assertNotIn('p', self.submenu._options)
+            patched_options.assert_not_called()
+        self.assertEqual(self.submenu.filter, '')
+
     def test_filter_initialized_correctly(self):
         self.assertFalse(hasattr(self.submenu, 'filter'))
         self.submenu.initialize()
@@ -260,6 +406,21 @@ class MenuTests(unittest.TestCase):
             self.navigator.player.check_end_of_track.call_count, 3
         )
 
+    @patch('spoppy.menus.readchar')
+    @patch('spoppy.menus.single_char_with_timeout')
+    def test_poll_input(self, patched_chargetter, patched_readchar):
+        patched_readchar.side_effect = [None, b'a']
+        self.assertEqual(self.submenu.poll_input(lambda: True), b'a')
+        patched_readchar.assert_called_with(
+            wait_for_char=self.submenu.POLL_INTERVAL
+        )
+        # That one interrupts the main thread when it times out
+        patched_chargetter.assert_not_called()
+        self.assertEqual(
+            self.navigator.player.check_end_of_track.call_count, 2
+        )
+        self.assertIsNone(self.submenu.poll_input(lambda: False))
+
     @patch('spoppy.menus.Options.match_best_or_none')
     def test_is_valid_uses_options(self, patched_match_best_or_none):
         patched_match_best_or_none.return_value = 'RETVAL'
@@ -268,21 +429,19 @@ class MenuTests(unittest.TestCase):
         self.assertEqual(self.submenu.is_valid_response(), 'RETVAL')
         patched_match_best_or_none.assert_called_once_with('ASDF')
 
-    @patch('spoppy.menus.Options.filter')
-    def test_ui_filters_items(self, patched_filter):
+    @patch('spoppy.menus.Options.get_scores')
+    def test_ui_filters_items(self, patched_scores):
         self.submenu.initialize()
-        patched_filter.return_value = self.submenu._options
+        patched_scores.return_value = {}
         self.submenu.get_ui()
-        patched_filter.assert_not_called()
+        patched_scores.assert_not_called()
         self.submenu.filter = 'a'
         self.submenu.get_ui()
-        patched_filter.assert_called_once_with('a')
+        patched_scores.assert_any_call('a')
 
-    @patch('spoppy.menus.sorted_menu_items')
-    def test_no_matches_warning_shown(self, patched_sorter):
+    def test_no_matches_warning_shown(self):
         self.submenu.initialize()
-        self.submenu.filter = ''
-        patched_sorter.return_value = []
+        self.submenu.filter = 'xyz'
         ui = self.submenu.get_ui()
         has_filter_in_line = [line for line in ui if 'No matches' in line]
         self.assertEqual(len(has_filter_in_line), 1)
@@ -346,6 +505,218 @@ class MenuTests(unittest.TestCase):
         self.assertEqual(seen_options, len(random_options))
 
 
+class TestVirtualizedPagination(unittest.TestCase):
+
+    def setUp(self):
+        self.navigator = Mock()
+        self.navigator.get_ui_height.return_value = 24
+        self.navigator.player.has_been_loaded.return_value = False
+
+        class SubMenu(menus.Menu):
+            INCLUDE_UP_ITEM = False
+
+            def get_options(self):
+                return {
+                    str(i + 1).rjust(4): menus.MenuValue(
+                        'Song %d' % (i + 1), None
+                    )
+                    for i in range(50000)
+                }
+
+        self.menu = SubMenu(self.navigator)
+        self.menu.initialize()
+
+    def get_rows(self, ui):
+        return [line for line in ui if line.startswith('[')]
+
+    def test_only_formats_current_page(self):
+        with patch.object(
+            self.menu, 'get_menu_item', wraps=self.menu.get_menu_item
+        ) as patched_get_menu_item:
+            for page in range(5):
+                self.menu.PAGE = page
+                rows = self.get_rows(self.menu.get_ui())
+                self.assertEqual(len(rows), 20)
+                self.assertEqual(rows[0], '[%4d]: Song %d' % (
+                    page * 20 + 1, page * 20 + 1
+                ))
+            self.assertEqual(patched_get_menu_item.call_count, 5 * 20)
+
+    def test_last_page(self):
+        self.menu.PAGE = 10 ** 6
+        rows = self.get_rows(self.menu.get_ui())
+        self.assertEqual(self.menu.PAGE, 2500)
+        self.assertEqual(rows, ['[q]: quit'])
+        self.menu.PAGE = 2499
+        rows = self.get_rows(self.menu.get_ui())
+        self.assertEqual(rows[-1], '[50000]: Song 50000')
+
+    def test_filtered_pages(self):
+        self.menu.filter = '4999'
+        ui = self.menu.get_ui()
+        keys = [int(row[1:row.index(']')]) for row in self.get_rows(ui)]
+        # The key first, then names where the pattern starts a word
+        self.assertEqual(keys[:11], [4999] + list(range(49990, 50000)))
+        self.assertEqual(len(keys), 20)
+        self.assertNotIn('Press [return] to go to (Song 4999)', ui)
+
+    def test_page_flips(self):
+        self.menu.get_ui()
+        started_at = time.time()
+        for page in range(1000):
+            self.menu.PAGE = page
+            ui = self.menu.get_ui()
+        logger.info(
+            'Showed 1000 pages of 50000 items in %.3fs',
+            time.time() - started_at
+        )
+        self.assertEqual(self.get_rows(ui)[0], '[19981]: Song 19981')
+
+
+class TestFuzzyRankingBenchmark(unittest.TestCase):
+    WORDS = (
+        'love', 'night', 'heart', 'dance', 'blue', 'fire', 'dream', 'girl',
+        'road', 'rain', 'summer', 'baby', 'home', 'light', 'time', 'world',
+    )
+
+    def get_options(self, count):
+        words = self.WORDS
+        return menus.Options({
+            str(i + 1).rjust(4): menus.MenuValue(
+                '%s %s - %s' % (
+                    words[i % 16], words[i // 16 % 16], words[i // 256 % 16]
+                ),
+                None
+            )
+            for i in range(count)
+        })
+
+    def rank(self, count):
+        options = self.get_options(count)
+        options.get_sorted_items()
+        started_at = time.time()
+        best = options.get_sorted_items('dre', limit=20)
+        elapsed = time.time() - started_at
+        logger.info(
+            'Ranked %d matches of %d names in %.3fs',
+            options.count_items('dre'), count, elapsed
+        )
+        self.assertEqual(len(best), 20)
+        for _, (name, _) in best:
+            self.assertIn('dream', name.split())
+
+    def test_10k_names(self):
+        self.rank(10000)
+
+    def test_100k_names(self):
+        self.rank(100000)
+
+
+class TestSpeculativeLoading(unittest.TestCase):
+
+    def setUp(self):
+        self.navigator = Mock()
+        self.navigator.get_ui_height.return_value = 100
+        self.created = []
+        self.priorities = []
+
+        def create_menu():
+            menu = Mock()
+            menu.start_loading.side_effect = lambda: self.priorities.append(
+                executor.get_current_priority()
+            )
+            self.created.append(menu)
+            return menu
+        self.lazy_menu = menus.LazyMenu(create_menu)
+
+        class SubMenu(menus.Menu):
+            def get_options(inner_self):
+                return {
+                    'a': menus.MenuValue('Alpha', self.lazy_menu),
+                    'b': menus.MenuValue('Beta', Mock()),
+                }
+        self.menu = SubMenu(self.navigator)
+        self.menu.initialize()
+
+    def test_lazy_menu(self):
+        self.lazy_menu.prepare()
+        # Prepared menus don't load before what the user is waiting for
+        self.assertEqual(self.priorities, [executor.PREFETCH])
+        self.assertEqual(self.lazy_menu(), self.created[0])
+        self.created[0].promote_loading.assert_called_once_with()
+
+    def test_lazy_menu_is_used_once(self):
+        self.lazy_menu.prepare()
+        self.lazy_menu.prepare()
+        self.assertEqual(len(self.created), 1)
+        self.created[0].start_loading.assert_called_once_with()
+        self.assertEqual(self.lazy_menu(), self.created[0])
+        # The prepared menu is only used once
+        self.assertNotEqual(self.lazy_menu(), self.created[0])
+        self.assertEqual(len(self.created), 2)
+
+    def test_prepares_single_match(self):
+        self.menu.filter = 'alp'
+        self.menu.get_ui()
+        self.assertEqual(len(self.created), 1)
+        self.created[0].start_loading.assert_called_once_with()
+        self.menu.get_ui()
+        self.assertEqual(len(self.created), 1)
+
+        self.assertEqual(self.menu.is_valid_response().destination(), (
+            self.created[0]
+        ))
+        self.created[0].cleanup.assert_not_called()
+
+    def test_cancels_when_filter_changes(self):
+        self.menu.filter = 'alp'
+        self.menu.get_ui()
+        self.menu.filter = ''
+        self.menu.get_ui()
+        self.created[0].cleanup.assert_called_once_with()
+        self.assertIsNone(self.lazy_menu.prepared)
+
+        self.menu.filter = 'alp'
+        self.menu.get_ui()
+        self.menu.cleanup()
+        self.created[1].cleanup.assert_called_once_with()
+
+    @patch('spoppy.menus.PlaylistTrackLoader')
+    def test_prepares_playlist_tracks(self, patched_loader):
+        playlist = utils.Playlist('Blackstar', [])
+        pov = menus.PlayListOverview(self.navigator)
+        pov.loader = Mock()
+        pov.loader.results = Results([
+            [playlist, {'name': 'Blackstar', 'snapshot_id': '1'}],
+            [utils.Playlist('Other', []), {'name': 'Other'}],
+        ])
+        pov.initialize()
+        pov.filter = 'black'
+        pov.get_ui()
+        patched_loader.assert_called_once()
+        selected = pov.is_valid_response().destination()
+        self.assertIsInstance(selected, menus.PlayListSelected)
+        self.assertEqual(selected.loader, patched_loader.return_value)
+
+
+class TestMainMenu(unittest.TestCase):
+
+    @patch('spoppy.menus.TrackSearch')
+    @patch('spoppy.menus.MyPlaylists')
+    def test_submenus_created_when_selected(
+        self, patched_playlists, patched_search
+    ):
+        navigator = Mock()
+        options = menus.Options(menus.MainMenu(navigator).get_options())
+        patched_search.assert_not_called()
+        patched_playlists.assert_not_called()
+        self.assertEqual(
+            options['st'].destination(), patched_search.return_value
+        )
+        patched_search.assert_called_once_with(navigator)
+        patched_playlists.assert_not_called()
+
+
 class TestSubMenus(unittest.TestCase):
 
     def setUp(self):
@@ -380,13 +751,48 @@ class TestSubMenus(unittest.TestCase):
         options = menus.Options(pov.get_options())
         self.assertTrue(
             all(
-                isinstance(value.destination, menus.PlayListSelected)
+                isinstance(value.destination(), menus.PlayListSelected)
                 for value in options.values()
             )
         )
         for playlist in self.playlists:
             self.assertIsNotNone(options.match_best_or_none(playlist.name))
 
+    @patch('spoppy.menus.PlayListSelected')
+    def test_playlist_overview_creates_menus_when_selected(
+        self, patched_selected
+    ):
+        playlist = utils.Playlist('A', [])
+        pov = menus.PlayListOverview(self.navigator)
+        pov.disable_loader()
+        pov.loader = MockLoader([[playlist, {'name': 'A'}]])
+        options = menus.Options(pov.get_options())
+        patched_selected.assert_not_called()
+
+        menu = options['   1'].destination()
+        patched_selected.assert_called_once_with(self.navigator)
+        self.assertEqual(menu, patched_selected.return_value)
+        self.assertEqual(menu.playlist, playlist)
+        self.assertEqual(menu.response, {'name': 'A'})
+
+    def test_song_selected_browses_album_when_selected(self):
+        menu = menus.SongSelectedWhilePlaying(self.navigator)
+        menu.playlist = None
+        menu.track = utils.Track('Lazarus', ['David Bowie'])
+        menu.track.album = Mock()
+        options = menus.Options(menu.get_options())
+        menu.track.album.browse.assert_not_called()
+
+        album_selected = options['ga'].destination()
+        self.assertIsInstance(album_selected, menus.AlbumSelected)
+        self.assertEqual(
+            album_selected.album,
+            menu.track.album.browse.return_value.load.return_value
+        )
+        radio = options['rt'].destination()
+        self.assertIsInstance(radio, menus.StartRadio)
+        self.assertEqual(radio.seeds, [menu.track])
+
     def test_playlist_overview_shows_invalid_playlists_as_well(self):
         self.playlists = [
             utils.Playlist('', []),
@@ -408,7 +814,7 @@ class TestSubMenus(unittest.TestCase):
         options = menus.Options(pov.get_options())
         self.assertEqual(len(options), 5)
         all_playlist_options = [
-            t.destination.playlist
+            t.destination().playlist
             for t in list(options.values())
         ]
         for playlist in self.playlists:
@@ -458,6 +864,86 @@ class TestSubMenus(unittest.TestCase):
         destinations = [value.destination for value in options.values()]
         self.assertIn(ps.add_to_queue, destinations)
 
+    def test_playlist_selected_filters_tracks_once(self):
+        ps = self.get_playlist_selected()
+        checked = []
+
+        class CountingTrack(utils.Track):
+            @property
+            def availability(self):
+                checked.append(self)
+                return self._availability
+
+            @availability.setter
+            def availability(self, value):
+                self._availability = value
+
+        ps.playlist.tracks = [
+            CountingTrack('Lazarus', ['David Bowie']),
+            CountingTrack('Best song ever', ['Sindri'], False),
+        ]
+        ps.get_options()
+        ps.get_header()
+        ps.select_song(0)()
+        self.assertEqual(len(checked), 2)
+        self.assertEqual(len(ps.get_tracks()), 1)
+
+        ps.playlist = utils.Playlist('Other', ps.playlist.tracks)
+        ps.get_tracks()
+        self.assertEqual(len(checked), 4)
+
+    def test_playlist_selected_uses_loader_results(self):
+        ps = menus.PlayListSelected(self.navigator)
+        track = Mock()
+        ps.loader = MockLoader([track])
+        self.assertEqual(ps.get_tracks(), [track])
+        self.assertEqual(ps.get_tracks(), [track])
+        # The loader already left out tracks that are unavailable
+        self.assertEqual(track.mock_calls, [])
+
+        ps.loader = MockLoader([])
+        self.assertEqual(ps.get_tracks(), [])
+
+    def test_playlist_selected_resume_is_incremental(self):
+        ps = self.get_playlist_selected()
+        ps.playlist.tracks = [
+            utils.Track('Song %d' % i, ['Artist']) for i in range(5000)
+        ]
+        self.navigator.player.is_playing.return_value = False
+        ps.initialize()
+        self.assertNotIn('aq', ps._options)
+
+        self.navigator.player.is_playing.return_value = True
+        with patch('spoppy.menus.format_track') as patched_format:
+            ps.resume()
+            patched_format.assert_not_called()
+        self.assertEqual(ps._options['aq'].destination, ps.add_to_queue)
+        self.assertEqual(len(ps._options), 5000 + 6)
+
+        self.navigator.get_ui_height.return_value = 100
+        ps.get_ui()
+        cache_id = ps._options._cache_id
+        with patch('spoppy.menus.sorted_menu_items') as patched_sorter:
+            ps.resume()
+            ps.get_ui()
+            patched_sorter.assert_not_called()
+        # Nothing changed, so the options keep their matches
+        self.assertEqual(ps._options._cache_id, cache_id)
+
+    def test_artist_selected_resume_updates_ban(self):
+        artist = menus.ArtistSelected(self.navigator)
+        artist.artist = Mock()
+        artist.artist.tracks = [utils.Track('Lazarus', ['David Bowie'])]
+        artist.disable_loader()
+        self.navigator.is_artist_banned.return_value = False
+        artist.initialize()
+        self.assertIn('ba', artist._options)
+
+        self.navigator.is_artist_banned.return_value = True
+        artist.resume()
+        self.assertIn('ub', artist._options)
+        self.assertNotIn('ba', artist._options)
+
     def test_select_song(self):
         ps = self.get_playlist_selected()
         song_selected = ps.select_song(0)
@@ -502,73 +988,144 @@ class TestSearch(unittest.TestCase):
         menu.set_initial_results(search)
         patched_update.assert_called_once_with()
 
+    def get_loaded_search(self, query='foobar', offset=0):
+        search = Mock()
+        search.results.offset = offset
+        search.results.limit = 20
+        search.results.response = {}
+        search.get_cache_key.side_effect = lambda offset=offset: (
+            'tracks', query, offset
+        )
+        return search
+
     def test_get_update_cache(self):
-        search = 'foobar'
+        search = self.get_loaded_search()
         menu = menus.TrackSearchResults(self.navigator)
-        self.assertEqual(len(menu.get_cache()), 0)
+        self.assertNotIn(('tracks', 'foobar', 0), menu.get_cache())
         menu.search = search
         menu.update_cache()
-        self.assertIn(search, menu.get_cache())
+        self.assertIs(menu.get_cache().peek(('tracks', 'foobar', 0)), search)
+
+    def test_failed_search_not_cached(self):
+        search = self.get_loaded_search(query='failed')
+        search.results.response = None
+        menu = menus.TrackSearchResults(self.navigator)
+        menu.search = search
+        menu.update_cache()
+        self.assertNotIn(('tracks', 'failed', 0), menu.get_cache())
+
+    def test_radio_not_cached(self):
+        search = self.get_loaded_search(query='radio')
+        menu = menus.RadioSelected(self.navigator)
+        menu.set_initial_results(search)
+        self.assertNotIn(('tracks', 'radio', 0), menu.get_cache())
 
+    @patch('spoppy.menus.TrackSearchResults.update_cache')
     @patch('spoppy.menus.TrackSearchResults.search')
-    def test_resets_paginating(self, patched_search):
+    def test_resets_paginating(self, patched_search, patched_update):
         patched_search.loaded_event.wait.return_value = True
         menu = menus.TrackSearchResults(self.navigator)
         menu.paginating = True
         self.assertEqual(menu.get_response(), menu)
         self.assertFalse(menu.paginating)
         patched_search.loaded_event.wait.assert_called_once_with()
+        patched_update.assert_called_once_with()
 
-    @patch('spoppy.menus.TrackSearchResults.update_cache')
     @patch('spoppy.menus.search')
-    @patch('spoppy.menus.TrackSearchResults.get_cache')
-    def test_go_to_from_cache(
-        self, patched_cache,
-        patched_search, patched_update
-    ):
-        patched_cache.return_value = [Mock(), Mock()]
+    def test_go_to_from_cache(self, patched_search):
+        first_page = self.get_loaded_search('cached', 0)
+        second_page = self.get_loaded_search('cached', 20)
 
         menu = menus.TrackSearchResults(self.navigator)
-        menu.search = patched_cache.return_value[0]
-        # next_page
-        callback = menu.go_to(1)
+        menu.set_initial_results(first_page)
+        menu.search = second_page
+        menu.update_cache()
+        # previous_page
+        callback = menu.go_to(-1)
+        self.assertTrue(callable(callback))
         self.assertEqual(callback(), menu)
-        self.assertEqual(menu.search, patched_cache.return_value[1])
+        self.assertEqual(menu.search, first_page)
         self.assertTrue(menu.paginating)
-        patched_update.assert_not_called()
         patched_search.assert_not_called()
 
-        # previous_page
-        callback = menu.go_to(-1)
-        self.assertTrue(callable(callback))
+        # next_page
+        callback = menu.go_to(1)
         self.assertEqual(callback(), menu)
-        self.assertEqual(menu.search, patched_cache.return_value[0])
+        self.assertEqual(menu.search, second_page)
         self.assertTrue(menu.paginating)
-        patched_update.assert_not_called()
         patched_search.assert_not_called()
 
     @patch('spoppy.menus.TrackSearchResults.update_cache')
     @patch('spoppy.menus.search')
-    @patch('spoppy.menus.TrackSearchResults.get_cache')
-    def test_go_to_from_search(
-        self, patched_cache,
-        patched_search, patched_update
-    ):
-        patched_cache.return_value = [Mock()]
+    def test_go_to_from_search(self, patched_search, patched_update):
         patched_search.return_value = Mock()
 
         menu = menus.TrackSearchResults(self.navigator)
-        menu.search = patched_cache.return_value[0]
+        menu.search = self.get_loaded_search('not cached')
 
         callback = menu.go_to(1)
         self.assertTrue(callable(callback))
         self.assertEqual(callback(), menu)
         self.assertEqual(menu.search, patched_search.return_value)
         self.assertTrue(menu.paginating)
-        patched_update.assert_called_once_with()
+        # The new page is cached when it has loaded
+        patched_update.assert_not_called()
         # Don't check for how it was called, at least not at the moment
         self.assertEqual(patched_search.call_count, 1)
 
+    @patch('spoppy.menus.search')
+    def test_prefetches_adjacent_pages(self, patched_search):
+        menu = menus.TrackSearchResults(self.navigator)
+        menu.search = self.get_loaded_search('prefetch', 20)
+        menu.search.results.next_page = 'next'
+        menu.search.results.previous_page = 'previous'
+        menu.prefetch()
+        self.assertEqual(patched_search.call_count, 2)
+        self.assertIn(('tracks', 'prefetch', 40), menu.prefetches)
+        self.assertIn(('tracks', 'prefetch', 0), menu.prefetches)
+
+        # Already being prefetched
+        menu.prefetch()
+        self.assertEqual(patched_search.call_count, 2)
+
+        prefetched = menu.prefetches[('tracks', 'prefetch', 40)]
+        prefetched.results.response = {}
+        menu.prefetch_done(('tracks', 'prefetch', 40), prefetched)
+        self.assertNotIn(('tracks', 'prefetch', 40), menu.prefetches)
+        self.assertIs(
+            menu.get_cache().peek(('tracks', 'prefetch', 40)), prefetched
+        )
+
+    @patch('spoppy.menus.search')
+    def test_does_not_prefetch_missing_pages(self, patched_search):
+        menu = menus.TrackSearchResults(self.navigator)
+        menu.search = self.get_loaded_search('single page', 0)
+        menu.search.results.next_page = None
+        menu.search.results.previous_page = None
+        menu.prefetch()
+        patched_search.assert_not_called()
+
+    @patch('spoppy.menus.search')
+    def test_go_to_uses_prefetch(self, patched_search):
+        menu = menus.TrackSearchResults(self.navigator)
+        menu.search = self.get_loaded_search('in flight', 0)
+        prefetched = Mock()
+        prefetched.loaded_event.is_set.return_value = False
+        menu.prefetches[('tracks', 'in flight', 20)] = prefetched
+
+        menu.go_to(1)()
+        self.assertEqual(menu.search, prefetched)
+        self.assertEqual(menu.prefetches, {})
+        patched_search.assert_not_called()
+
+    def test_cleanup_cancels_prefetches(self):
+        menu = menus.TrackSearchResults(self.navigator)
+        prefetched = Mock()
+        menu.prefetches['key'] = prefetched
+        menu.cleanup()
+        prefetched.cancel.assert_called_once_with()
+        self.assertEqual(menu.prefetches, {})
+
     def test_mock_playlist_contains_term_in_search(self):
         menu = menus.TrackSearchResults(self.navigator)
         menu.search = Mock()
@@ -652,6 +1209,167 @@ class TestSearch(unittest.TestCase):
         self.assertEqual(len(menu.get_options()), 2)
 
 
+class TestCombinedSearch(unittest.TestCase):
+
+    def setUp(self):
+        self.navigator = Mock()
+        self.menu = menus.CombinedSearchResults(self.navigator)
+        self.menu.search = Mock()
+        self.menu.search.results.results = [
+            ('tracks', {
+                'total': 10, 'items': [{'name': 'Foo'}, {'name': 'Bar'}]
+            }),
+            ('albums', {'total': 0, 'items': []}),
+            ('playlists', {'total': 1, 'items': [None, {'name': 'Baz'}]}),
+        ]
+
+    def test_options_group_results(self):
+        options = self.menu.get_options_from_search()
+        self.assertEqual(sorted(options), ['pl', 'tr'])
+        self.assertEqual(options['tr'].name, 'Tracks (10 results): Foo, Bar')
+        self.assertEqual(options['pl'].name, 'Playlists (1 results): Baz')
+
+    def test_select_group_loads_group(self):
+        options = self.menu.get_options_from_search()
+        group_menu = options['pl'].destination()
+        self.assertIsInstance(group_menu, menus.PlaylistSearchResults)
+        self.menu.search.get_group_search.assert_called_once_with(
+            'playlists'
+        )
+        self.assertEqual(
+            group_menu.search,
+            self.menu.search.get_group_search.return_value
+        )
+        self.assertTrue(group_menu.paginating)
+
+
+class TestLiveSearch(unittest.TestCase):
+
+    def setUp(self):
+        self.navigator = Mock()
+        self.menu = menus.TrackSearch(self.navigator)
+        self.query = 'live %s' % uuid.uuid4()
+
+    def get_search(self, query, loaded=True):
+        search = Mock()
+        search.query = query
+        search.loaded_event.is_set.return_value = loaded
+        search.is_cancelled.return_value = False
+        search.results.response = {}
+        search.results.total = 1
+        search.get_cache_key.return_value = ('tracks', query, 0)
+        return search
+
+    def type_query(self, query, seconds_ago=1):
+        self.menu.filter = query
+        self.menu.filter_changed_at = time.time() - seconds_ago
+
+    @patch('spoppy.menus.search')
+    def test_waits_until_user_stops_typing(self, patched_search):
+        patched_search.return_value = self.get_search(self.query, False)
+        self.type_query(self.query, seconds_ago=0)
+        self.assertTrue(self.menu.is_live_search_pending())
+        self.menu.maybe_start_live_search()
+        patched_search.assert_not_called()
+
+        self.type_query(self.query)
+        self.menu.maybe_start_live_search()
+        self.assertEqual(patched_search.call_count, 1)
+        self.assertEqual(patched_search.call_args[0][1], self.query)
+        self.assertEqual(patched_search.call_args[1]['owner'], self.menu)
+
+        # Already searching for this
+        self.menu.maybe_start_live_search()
+        self.assertEqual(patched_search.call_count, 1)
+
+    @patch('spoppy.menus.search')
+    def test_short_queries_are_not_searched(self, patched_search):
+        self.type_query('a')
+        self.assertFalse(self.menu.is_live_search_pending())
+        self.menu.maybe_start_live_search()
+        patched_search.assert_not_called()
+
+    @patch('spoppy.menus.search')
+    def test_cancels_superseded_search(self, patched_search):
+        first_search = self.get_search(self.query, loaded=False)
+        patched_search.return_value = first_search
+        self.type_query(self.query)
+        self.menu.maybe_start_live_search()
+
+        patched_search.return_value = self.get_search(self.query + 'x')
+        self.type_query(self.query + 'x')
+        self.menu.maybe_start_live_search()
+        first_search.cancel.assert_called_once_with()
+        self.assertEqual(self.menu.live_search, patched_search.return_value)
+
+    @patch('spoppy.menus.search')
+    def test_uses_cached_search(self, patched_search):
+        cached_search = self.get_search(self.query)
+        menus.search_cache.set(('tracks', self.query, 0), cached_search)
+        self.type_query(self.query)
+        self.menu.maybe_start_live_search()
+        patched_search.assert_not_called()
+        self.assertEqual(self.menu.live_search, cached_search)
+        self.assertFalse(self.menu.is_live_search_pending())
+
+    def test_caches_live_search(self):
+        live_search = self.get_search(self.query)
+        self.menu.live_search_done(live_search)
+        self.assertIs(
+            menus.search_cache.peek(('tracks', self.query, 0)), live_search
+        )
+
+    def press_return(self):
+        # Like the navigator does with what the menu responds
+        response = self.menu.handle_input(b'\n')
+        self.assertTrue(callable(response))
+        return response()
+
+    @patch('spoppy.menus.search')
+    def test_return_starts_search(self, patched_search):
+        self.menu.initialize()
+        self.type_query('beatles')
+        self.assertEqual(self.press_return(), self.menu)
+        self.assertTrue(self.menu.is_searching)
+        self.assertEqual(self.menu.search, patched_search.return_value)
+        self.assertEqual(patched_search.call_args[0][1], 'beatles')
+
+    @patch('spoppy.menus.search')
+    def test_return_uses_loaded_live_search(self, patched_search):
+        self.menu.initialize()
+        self.menu.live_search = self.get_search(self.query)
+        self.type_query(self.query)
+        result = self.press_return()
+        self.assertIsInstance(result, menus.TrackSearchResults)
+        self.assertEqual(result.search.query, self.query)
+        patched_search.assert_not_called()
+
+    @patch('spoppy.menus.search')
+    def test_return_waits_for_live_search(self, patched_search):
+        self.menu.initialize()
+        live_search = self.get_search(self.query, loaded=False)
+        self.menu.live_search = live_search
+        self.type_query(self.query)
+        self.assertEqual(self.press_return(), self.menu)
+        self.assertTrue(self.menu.is_searching)
+        self.assertEqual(self.menu.search, live_search)
+        patched_search.assert_not_called()
+
+    @patch('spoppy.menus.TrackSearchResults.get_options_from_search')
+    def test_shows_prefix_results_while_searching(self, patched_options):
+        menus.search_cache.set(
+            ('tracks', self.query, 0), self.get_search(self.query)
+        )
+        patched_options.return_value = {
+            '1': menus.MenuValue('%s foo' % self.query, None),
+            '2': menus.MenuValue('%s bar' % self.query, None),
+        }
+        self.type_query(self.query + ' f', seconds_ago=0)
+        results = self.menu.get_live_results()
+        self.assertIn(self.query, results[0])
+        self.assertEqual(results[1:], ['%s foo' % self.query])
+
+
 class TestPlaylistSaver(unittest.TestCase):
 
     def setUp(self):
@@ -784,8 +1502,8 @@ class TestPlaylistSaver(unittest.TestCase):
         patched_playlist.return_value.load.assert_called_once_with()
 
     @patch('spoppy.menus.threading')
-    @patch('spoppy.menus.webbrowser')
-    @patch('spoppy.menus.oAuthServerThread')
+    @patch('webbrowser.open')
+    @patch('spoppy.http_server.oAuthServerThread')
     def test_spotipy_initialization(
         self, patched_server, patched_browser, patched_threading
     ):
@@ -798,7 +1516,7 @@ class TestPlaylistSaver(unittest.TestCase):
 
         sp_oauth.get_authorize_url.assert_called_once_with()
         patched_server().start.assert_called_once_with()
-        patched_browser.open.assert_called_once_with(
+        patched_browser.assert_called_once_with(
             sp_oauth.get_authorize_url.return_value
         )
         self.assertIsNone(menu.message_from_spotipy)
@@ -813,7 +1531,7 @@ class TestPlaylistSaver(unittest.TestCase):
 
         sp_oauth.get_authorize_url.assert_called_once_with()
         patched_server().start.assert_called_once_with()
-        patched_browser.open.assert_not_called()
+        patched_browser.assert_not_called()
 
         self.assertIsNotNone(menu.message_from_spotipy)
 
@@ -892,3 +1610,238 @@ class TestPlaylistSaver(unittest.TestCase):
 
         self.assertIn('hallo', menu.message_from_spotipy)
         self.assertIn('madur', menu.message_from_spotipy)
+
+
+class TestWebApiStats(unittest.TestCase):
+
+    def setUp(self):
+        self.navigator = Mock()
+        self.navigator.lifecycle.user_cache_dir = '/tmp/spoppy-cache'
+        self.menu = menus.WebApiStats(self.navigator)
+
+    @patch('spoppy.menus.call_stats')
+    def test_header_lists_slowest_first(self, patched_call_stats):
+        stats = {
+            'calls': 2, 'error_rate': 0.5, 'avg_time': 0.1, 'p95_ms': 250,
+            'total_time': 0.2, 'payload_bytes': 2048,
+        }
+        patched_call_stats.get_slowest.return_value = [
+            ('search', stats), ('me', dict(stats, p95_ms=None)),
+        ]
+        lines = self.menu.get_header().split('\n')
+        self.assertTrue(lines[1].startswith('search'))
+        self.assertIn('<250', lines[1])
+        self.assertTrue(lines[2].startswith('me'))
+        self.assertIn('slow', lines[2])
+
+    @patch('spoppy.menus.call_stats')
+    def test_write_stats(self, patched_call_stats):
+        self.assertEqual(self.menu.write_stats(), self.menu)
+        patched_call_stats.dump.assert_called_once_with(
+            '/tmp/spoppy-cache/web_api_stats.json'
+        )
+        self.assertIn('web_api_stats.json', self.menu.get_header())
+
+
+class TestLibraryResults(unittest.TestCase):
+
+    def setUp(self):
+        self.navigator = Mock()
+        self.library = self.navigator.lifecycle.library
+        self.library.search_tracks.return_value = [{
+            'uri': 'spotify:track:1',
+            'name': 'Hey Jude',
+            'artists': [{'name': 'The Beatles'}],
+        }]
+        self.menu = menus.TrackSearchResults(self.navigator)
+        self.menu.search = Mock()
+        self.menu.search.results.term = 'jude'
+        self.menu.search.results.offset = 0
+        self.menu.search.results.results = []
+        self.menu.search.results.previous_page = None
+        self.menu.search.results.next_page = None
+
+    def test_library_tracks_above_results(self):
+        options = self.menu.get_options()
+        self.assertEqual(list(options), ['l1'])
+        self.assertEqual(
+            options['l1'].name, 'In your library: Hey Jude by The Beatles '
+        )
+        self.menu.get_options()
+        self.library.search_tracks.assert_called_once_with('jude', limit=5)
+
+    def test_only_on_first_page(self):
+        self.menu.search.results.offset = 20
+        self.assertEqual(self.menu.get_options(), {})
+
+    def test_not_for_albums(self):
+        menu = menus.AlbumSearchResults(self.navigator)
+        menu.search = self.menu.search
+        self.assertEqual(menu.get_options(), {})
+
+    def test_works_when_search_failed(self):
+        self.menu.search.results.response = None
+        self.assertIn('l1', self.menu.get_options())
+
+    @patch('spoppy.menus.LibraryTrackLoader')
+    def test_select_library_track(self, patched_loader):
+        options = self.menu.get_options()
+        song_selected = options['l1'].destination()
+        self.assertIsInstance(song_selected, menus.SongSelectedWhilePlaying)
+        # The track is loaded in the background
+        song_selected.start_loading()
+        patched_loader.assert_called_once_with(
+            self.navigator, self.library.search_tracks.return_value[0],
+            owner=song_selected
+        )
+        patched_loader.return_value.loaded_event.is_set.return_value = False
+        song_selected.initialize()
+        self.assertEqual(
+            song_selected.get_header(), 'Loading Hey Jude by The Beatles ...'
+        )
+
+        track = utils.Track('Hey Jude', ['The Beatles'])
+        patched_loader.return_value.loaded_event.is_set.return_value = True
+        patched_loader.return_value.results = Results([track])
+        song_selected.handle_results()
+        self.assertEqual(song_selected.track, track)
+        self.assertEqual(song_selected.playlist.tracks, [track])
+
+    @patch('spoppy.menus.LibraryTrackLoader')
+    def test_library_track_not_loaded(self, patched_loader):
+        song_selected = self.menu.get_options()['l1'].destination()
+        song_selected.start_loading()
+        patched_loader.return_value.results = Results([])
+        song_selected.handle_results()
+        song_selected.initialize()
+        self.assertIsNone(song_selected.track)
+        self.assertIn('Could not load', song_selected.get_header())
+
+    def test_live_search_shows_library(self):
+        menu = menus.TrackSearch(self.navigator)
+        menu.filter = 'jude'
+        self.assertEqual(menu.get_library_results(), [
+            'In your library:', 'Hey Jude by The Beatles ', ''
+        ])
+
+
+class TestPlaylistOverviewRevalidation(unittest.TestCase):
+
+    def setUp(self):
+        self.navigator = Mock()
+        self.menu = menus.MyPlaylists(self.navigator)
+        self.menu.filter = ''
+
+    def get_loader(self, response_data, loaded=True):
+        loader = Mock()
+        loader.response_data = response_data
+        loader.loaded_event.is_set.return_value = loaded
+        loader.results = []
+        return loader
+
+    @patch('spoppy.menus.PlaylistLoader')
+    @patch('spoppy.menus.get_last_known_playlists')
+    def test_shows_last_known_while_revalidating(
+        self, patched_last_known, patched_loader
+    ):
+        patched_last_known.return_value = ({'items': []}, time.time() - 120)
+        stale = self.get_loader({'items': []})
+        revalidation = self.get_loader({'items': []}, loaded=False)
+        patched_loader.side_effect = [revalidation, stale]
+
+        self.menu.loader = self.menu.get_stale_loader()
+        self.assertEqual(self.menu.loader, stale)
+        self.assertEqual(self.menu.revalidation, revalidation)
+        self.assertEqual(
+            patched_loader.call_args_list[0][1]['priority'], menus.PREFETCH
+        )
+        self.assertTrue(patched_loader.call_args_list[0][1]['refresh'])
+        self.assertEqual(
+            patched_loader.call_args_list[1][1]['response_data'],
+            {'items': []}
+        )
+        self.assertIn('2 minutes ago', self.menu.get_header())
+        self.assertIn('checking for changes', self.menu.get_header())
+
+    @patch('spoppy.menus.PlaylistLoader')
+    @patch('spoppy.menus.get_last_known_playlists')
+    def test_shows_last_known_before_polling(
+        self, patched_last_known, patched_loader
+    ):
+        patched_last_known.return_value = ({'items': []}, time.time() - 120)
+        stale = self.get_loader({'items': []})
+        stale.loaded_event.wait.return_value = True
+        revalidation = self.get_loader({'items': []}, loaded=False)
+        patched_loader.side_effect = [revalidation, stale]
+        self.menu.initialize()
+
+        with patch.object(self.menu, 'poll_input') as patched_poll:
+            # The stale playlists are there before we ask for a response
+            self.assertEqual(self.menu.get_response(), self.menu)
+            patched_poll.assert_not_called()
+            self.assertTrue(self.menu.loaded)
+            self.menu.initialize()
+            self.assertFalse(self.menu._options_dirty)
+
+            patched_poll.return_value = b'q\n'
+            self.assertEqual(self.menu.get_response(), responses.QUIT)
+            patched_poll.assert_called_once_with(self.menu.is_revalidating)
+
+    @patch('spoppy.menus.get_last_known_playlists')
+    def test_nothing_last_known(self, patched_last_known):
+        patched_last_known.return_value = None
+        self.assertIsNone(self.menu.get_stale_loader())
+        self.assertIsNone(self.menu.revalidation)
+        self.assertEqual(self.menu.get_header(), '')
+
+    def test_keeps_loader_if_unchanged(self):
+        self.menu.loader = self.get_loader({'items': [1]})
+        self.menu.revalidation = self.get_loader({'items': [1]})
+        self.menu.fetched_at = 0
+        self.menu.use_revalidated()
+        self.assertEqual(self.menu.loader.response_data, {'items': [1]})
+        self.assertIsNot(self.menu.loader, self.menu.revalidation)
+        self.assertIsNone(self.menu.revalidation)
+        self.assertIn('just now', self.menu.get_header())
+
+    def test_swaps_in_changed_playlists(self):
+        self.menu.loader = self.get_loader({'items': [1]})
+        fresh = self.menu.revalidation = self.get_loader({'items': [2]})
+        self.menu.filter = 'foo'
+        self.menu.use_revalidated()
+        self.assertEqual(self.menu.loader, fresh)
+        self.assertEqual(self.menu.filter, 'foo')
+
+    def test_keeps_stale_if_revalidation_fails(self):
+        stale = self.menu.loader = self.get_loader({'items': [1]})
+        self.menu.revalidation = self.get_loader(None)
+        self.menu.fetched_at = 0
+        self.menu.use_revalidated()
+        self.assertEqual(self.menu.loader, stale)
+        self.assertEqual(self.menu.fetched_at, 0)
+
+    @patch('spoppy.menus.PlaylistLoader')
+    def test_revalidates_old_playlists_on_return(self, patched_loader):
+        self.menu.loader = self.get_loader({'items': []})
+        self.menu.loader.results = []
+        self.menu.initialize()
+        self.menu.fetched_at = time.time()
+        self.menu.resume()
+        patched_loader.assert_not_called()
+        self.menu.fetched_at = time.time() - 120
+        self.menu.resume()
+        self.assertEqual(self.menu.revalidation, patched_loader.return_value)
+
+    @patch('spoppy.menus.PlaylistLoader')
+    def test_revalidates_after_playlists_change(self, patched_loader):
+        self.menu.playlist_type = 'mine'
+        self.menu.loader = self.get_loader({'items': []})
+        self.menu.initialize()
+        self.menu.fetched_at = time.time()
+        self.menu.resume()
+        patched_loader.assert_not_called()
+        time.sleep(0.01)
+        # A playlist was deleted or saved
+        menus.playlist_cache.clear()
+        self.menu.resume()
+        self.assertEqual(self.menu.revalidation, patched_loader.return_value)
@@ -0,0 +1,138 @@
+import threading
+import time
+import unittest
+
+from spoppy import executor, rate_limit
+
+from .test_http_cache import StubAPI
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_allows_bursts(self):
+        limiter = rate_limit.RateLimiter(rate=1, burst=5)
+        for _ in range(5):
+            self.assertFalse(limiter.acquire())
+        self.assertEqual(limiter.stats()['throttled'], 0)
+
+    def test_limits_rate(self):
+        limiter = rate_limit.RateLimiter(rate=50, burst=1)
+        started_at = time.time()
+        for _ in range(6):
+            limiter.acquire()
+        self.assertGreaterEqual(time.time() - started_at, 0.09)
+        self.assertEqual(limiter.stats()['throttled'], 5)
+
+    def test_pause(self):
+        limiter = rate_limit.RateLimiter(rate=100, burst=10)
+        limiter.pause(0.1)
+        started_at = time.time()
+        self.assertTrue(limiter.acquire())
+        self.assertGreaterEqual(time.time() - started_at, 0.09)
+
+    def test_pause_is_capped(self):
+        limiter = rate_limit.RateLimiter()
+        limiter.max_pause = 0.1
+        limiter.pause(3600)
+        started_at = time.time()
+        limiter.acquire()
+        self.assertLess(time.time() - started_at, 1)
+
+    def test_foreground_goes_first(self):
+        limiter = rate_limit.RateLimiter(rate=100, burst=1)
+        limiter.pause(0.1)
+        order = []
+
+        def acquire(priority, name):
+            limiter.acquire(priority)
+            order.append(name)
+        prefetch = threading.Thread(
+            target=acquire, args=(executor.PREFETCH, 'prefetch')
+        )
+        prefetch.start()
+        while not limiter.stats()['waiting']:
+            time.sleep(0.001)
+        foreground = threading.Thread(
+            target=acquire, args=(executor.FOREGROUND, 'foreground')
+        )
+        foreground.start()
+        prefetch.join()
+        foreground.join()
+        self.assertEqual(order, ['foreground', 'prefetch'])
+
+
+class TestScheduledSession(unittest.TestCase):
+
+    def setUp(self):
+        self.stub = StubAPI()
+        self.session = rate_limit.ScheduledSession(
+            rate_limit.RateLimiter(rate=100, burst=10)
+        )
+        self.session.backoff_base = 0.01
+
+    def tearDown(self):
+        self.stub.shutdown()
+
+    def get(self):
+        return self.session.get(self.stub.url + '/v1/me')
+
+    def test_respects_retry_after(self):
+        self.stub.errors = [(429, {'Retry-After': '0.2'})]
+        started_at = time.time()
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertGreaterEqual(time.time() - started_at, 0.2)
+        self.assertEqual(len(self.stub.requests), 2)
+        self.assertEqual(self.session.limiter.stats()['pauses'], 1)
+
+    def test_foreground_does_not_wait_long(self):
+        self.session.max_foreground_wait = 0.1
+        self.stub.errors = [(429, {'Retry-After': '0.2'})]
+        self.assertEqual(self.get().status_code, 429)
+        self.assertEqual(len(self.stub.requests), 1)
+        self.assertEqual(self.session.limiter.stats()['pauses'], 1)
+
+    def test_prefetch_waits_long(self):
+        self.session.max_foreground_wait = 0.1
+        self.stub.errors = [(429, {'Retry-After': '0.2'})]
+        with executor.running_at(executor.PREFETCH):
+            self.assertEqual(self.get().status_code, 200)
+        self.assertEqual(len(self.stub.requests), 2)
+
+    def test_retry_after_pauses_other_requests(self):
+        self.stub.errors = [(429, {'Retry-After': '0.3'})]
+        rate_limited = threading.Thread(target=self.get)
+        rate_limited.start()
+        while not self.session.limiter.stats()['pauses']:
+            time.sleep(0.001)
+        started_at = time.time()
+        self.get()
+        self.assertGreaterEqual(time.time() - started_at, 0.2)
+        rate_limited.join()
+        self.assertEqual(len(self.stub.requests), 3)
+
+    def test_retries_server_errors(self):
+        self.stub.errors = [(503, {}), (502, {})]
+        self.assertEqual(self.get().status_code, 200)
+        self.assertEqual(self.session.retries, 2)
+
+    def test_gives_up(self):
+        self.stub.errors = [(503, {})] * 10
+        self.assertEqual(self.get().status_code, 503)
+        self.assertEqual(
+            len(self.stub.requests), self.session.max_retries + 1
+        )
+
+    def test_does_not_retry_client_errors(self):
+        self.stub.errors = [(404, {})]
+        self.assertEqual(self.get().status_code, 404)
+        self.assertEqual(len(self.stub.requests), 1)
+
+    def test_retries_connection_errors(self):
+        url = self.stub.url
+        self.stub.shutdown()
+        self.session.max_retries = 1
+        with self.assertRaises(Exception):
+            self.session.get(url + '/v1/me')
+        self.assertEqual(self.session.retries, 1)
+        self.stub = StubAPI()
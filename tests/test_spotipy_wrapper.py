@@ -0,0 +1,191 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from mock import Mock
+
+from spoppy import rate_limit, spotipy_wrapper
+
+
+class BlockingClient(object):
+    _auth = 'token'
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.calls = []
+        self.error = None
+
+    def search(self, query, limit=20, type='track'):
+        self.calls.append(('search', query))
+        self.release.wait(5)
+        if self.error:
+            raise self.error
+        return {'query': query}
+
+    def user_playlist_add_tracks(self, user, playlist_id, tracks):
+        self.calls.append(('add', playlist_id))
+        self.release.wait(5)
+
+
+class TestSpotipyWrapper(unittest.TestCase):
+
+    def setUp(self):
+        self.in_flight = spotipy_wrapper.SingleFlight()
+        self.original_in_flight = spotipy_wrapper.in_flight_calls
+        spotipy_wrapper.in_flight_calls = self.in_flight
+        self.client = BlockingClient()
+        self.navigator = Mock()
+        self.wrapper = spotipy_wrapper.SpotipyWrapper(
+            self.navigator, self.client
+        )
+
+    def tearDown(self):
+        spotipy_wrapper.in_flight_calls = self.original_in_flight
+
+    def call_concurrently(self, func, count=5):
+        results = []
+        errors = []
+
+        def call():
+            try:
+                results.append(func())
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=call) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        # Wait until every caller is either calling or waiting
+        while (
+            len(self.client.calls) + self.in_flight.coalesced < count and
+            any(thread.is_alive() for thread in threads)
+        ):
+            threading.Event().wait(0.01)
+        self.client.release.set()
+        for thread in threads:
+            thread.join()
+        return results, errors
+
+    def test_coalesces_identical_calls(self):
+        results, errors = self.call_concurrently(
+            lambda: self.wrapper.search('foo', type='track')
+        )
+        self.assertEqual(errors, [])
+        self.assertEqual(results, [{'query': 'foo'}] * 5)
+        self.assertEqual(self.client.calls, [('search', 'foo')])
+        self.assertEqual(self.in_flight.stats()['coalesced'], 4)
+        self.assertEqual(self.in_flight.stats()['in_flight'], 0)
+
+    def test_does_not_coalesce_different_calls(self):
+        queries = iter(['a', 'b', 'c'])
+        lock = threading.Lock()
+
+        def search():
+            with lock:
+                query = next(queries)
+            return self.wrapper.search(query)
+        results, errors = self.call_concurrently(search, count=3)
+        self.assertEqual(len(self.client.calls), 3)
+        self.assertEqual(self.in_flight.stats()['coalesced'], 0)
+
+    def test_does_not_coalesce_writes(self):
+        self.call_concurrently(
+            lambda: self.wrapper.user_playlist_add_tracks(
+                'user', 'playlist', ['track']
+            ),
+            count=3
+        )
+        self.assertEqual(len(self.client.calls), 3)
+        self.assertEqual(self.in_flight.stats()['coalesced'], 0)
+
+    def test_errors_are_shared(self):
+        self.client.error = ValueError('Oh noes')
+        results, errors = self.call_concurrently(
+            lambda: self.wrapper.search('foo')
+        )
+        self.assertEqual(len(errors), 5)
+        self.assertEqual(len(self.client.calls), 1)
+
+    def test_refreshes_token_on_401(self):
+        error = Exception('Unauthorized')
+        error.http_status = 401
+        client = Mock()
+        client.me.side_effect = [error, {'id': 'sindrig'}]
+        wrapper = spotipy_wrapper.SpotipyWrapper(self.navigator, client)
+        self.assertEqual(wrapper.me(), {'id': 'sindrig'})
+        refresh = self.navigator.refresh_spotipy_client_and_token
+        refresh.assert_called_once_with(client._auth)
+
+
+class TestCallStats(unittest.TestCase):
+
+    def setUp(self):
+        self.call_stats = spotipy_wrapper.CallStats()
+        self.original_call_stats = spotipy_wrapper.call_stats
+        spotipy_wrapper.call_stats = self.call_stats
+        self.client = Mock()
+        self.wrapper = spotipy_wrapper.SpotipyWrapper(Mock(), self.client)
+
+    def tearDown(self):
+        spotipy_wrapper.call_stats = self.original_call_stats
+
+    def test_wrappers_are_cached(self):
+        self.assertIs(self.wrapper.user_playlist, self.wrapper.user_playlist)
+        self.assertIsNot(self.wrapper.user_playlist, self.wrapper.me)
+
+    def test_records_calls(self):
+        def user_playlist_create(user, name):
+            # What the session does with each response
+            rate_limit.count_received(Mock(content=b'{"id": "foo"}'))
+            return {'id': 'foo'}
+        self.client.user_playlist_create.side_effect = user_playlist_create
+        self.wrapper.user_playlist_create('user', 'name')
+        self.wrapper.user_playlist_create('user', 'name')
+        stats = self.call_stats.stats()['user_playlist_create']
+        self.assertEqual(stats['calls'], 2)
+        self.assertEqual(stats['errors'], 0)
+        self.assertEqual(stats['payload_bytes'], 2 * len('{"id": "foo"}'))
+        self.assertEqual(sum(stats['histogram'].values()), 2)
+        self.assertEqual(stats['p50_ms'], 10)
+
+    def test_records_errors(self):
+        self.client.user_playlist_create.side_effect = [
+            ValueError('Oh noes'), {}
+        ]
+        with self.assertRaises(ValueError):
+            self.wrapper.user_playlist_create('user', 'name')
+        self.wrapper.user_playlist_create('user', 'name')
+        stats = self.call_stats.stats()['user_playlist_create']
+        self.assertEqual(stats['errors'], 1)
+        self.assertEqual(stats['error_rate'], 0.5)
+
+    def test_latency_histogram(self):
+        endpoint = spotipy_wrapper.EndpointStats()
+        for elapsed in (0.005, 0.005, 0.3, 10):
+            endpoint.record(elapsed, 0, False)
+        stats = endpoint.as_dict()
+        self.assertEqual(stats['histogram']['10'], 2)
+        self.assertEqual(stats['histogram']['500'], 1)
+        self.assertEqual(stats['histogram']['inf'], 1)
+        self.assertEqual(stats['p50_ms'], 10)
+        self.assertIsNone(stats['p95_ms'])
+        self.assertEqual(stats['max_time'], 10)
+
+    def test_dump(self):
+        self.call_stats.record('search', 0.2)
+        self.call_stats.record('me', 0.1)
+        self.assertEqual(
+            [name for name, _ in self.call_stats.get_slowest()],
+            ['search', 'me']
+        )
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'stats.json')
+            self.call_stats.dump(path)
+            with open(path) as f:
+                dumped = json.load(f)
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual(dumped['endpoints']['search']['calls'], 1)
+        self.assertIn('in_flight_calls', dumped)
@@ -0,0 +1,137 @@
+import subprocess
+import sys
+import threading
+import time
+import unittest
+from mock import patch
+
+from spoppy import startup, startup_report
+
+IMPORTTIME_OUTPUT = '''\
+import time: self [us] | cumulative | imported package
+import time:       100 |        100 | site
+import time:       300 |        300 |     json.decoder
+import time:       200 |        500 |   json
+import time:        50 |        550 | spoppy.util
+'''
+
+
+class TestStartupReport(unittest.TestCase):
+
+    def test_parse_importtime(self):
+        import_times = startup_report.parse_importtime(
+            IMPORTTIME_OUTPUT.splitlines()
+        )
+        self.assertEqual(import_times, [
+            startup_report.ImportTime('site', 100, 100, 0),
+            startup_report.ImportTime('json.decoder', 300, 300, 2),
+            startup_report.ImportTime('json', 200, 500, 1),
+            startup_report.ImportTime('spoppy.util', 50, 550, 0),
+        ])
+
+    def test_format_report(self):
+        report = startup_report.format_report(
+            startup_report.parse_importtime(IMPORTTIME_OUTPUT.splitlines()),
+            module='spoppy.util',
+            limit=2,
+        )
+        lines = report.splitlines()
+        self.assertEqual(lines[0], 'Importing spoppy.util took 0.6ms')
+        self.assertEqual(
+            [line.split()[-1] for line in lines[3:]],
+            ['json.decoder', 'json']
+        )
+
+    @unittest.skipIf(
+        sys.version_info < (3, 7), '-X importtime needs python 3.7'
+    )
+    def test_get_import_times(self):
+        import_times = startup_report.get_import_times('spoppy.cache')
+        self.assertIn('spoppy.cache', [
+            import_time.module for import_time in import_times
+        ])
+
+
+class TestLazyImports(unittest.TestCase):
+
+    def test_navigation_does_not_import_unused_modules(self):
+        # A new interpreter, since the tests import these modules themselves
+        output = subprocess.check_output([
+            sys.executable, '-c',
+            'import sys, spoppy.navigation; print(" ".join(sys.modules))'
+        ], universal_newlines=True)
+        imported = output.split()
+        for module in (
+            'spoppy.dbus_listener', 'spoppy.http_server', 'spoppy.radio',
+            'webbrowser',
+        ):
+            self.assertNotIn(module, imported)
+
+
+class TestStartupPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.pipeline = startup.StartupPipeline(show_progress=False)
+
+    def test_steps_run_at_the_same_time(self):
+        b_started = threading.Event()
+        # Would time out if b only started after a was done
+        self.pipeline.start('a', b_started.wait, 5)
+        self.pipeline.start('b', b_started.set)
+        self.assertTrue(self.pipeline.wait('a'))
+
+    def test_steps_run_after_their_dependencies(self):
+        order = []
+        self.pipeline.start(
+            'first', lambda: time.sleep(0.05) or order.append('first')
+        )
+        self.pipeline.start(
+            'second', lambda: order.append('second'), after=('first', )
+        )
+        self.pipeline.wait('second')
+        self.assertEqual(order, ['first', 'second'])
+
+    def test_failures_are_raised_when_waiting(self):
+        def fail():
+            raise ValueError('Oh noes')
+        self.pipeline.start('failing', fail)
+        self.pipeline.start('dependent', lambda: 1, after=('failing', ))
+        with self.assertRaises(ValueError):
+            self.pipeline.wait('failing')
+        with self.assertRaises(ValueError):
+            self.pipeline.wait('dependent')
+        self.assertEqual(
+            [timing[0] for timing in self.pipeline.get_timings()],
+            ['failing']
+        )
+
+    def test_step_names_are_unique(self):
+        self.pipeline.run('a', lambda: None)
+        with self.assertRaises(ValueError):
+            self.pipeline.start('a', lambda: None)
+
+    @patch('spoppy.startup.click')
+    def test_progress_shows_running_steps(self, patched_click):
+        self.pipeline.show_progress = True
+        done = threading.Event()
+        self.pipeline.start('slow step', done.wait, 5)
+        while not self.pipeline.get_running_steps():
+            time.sleep(0.01)
+        self.pipeline.show_running_steps('|')
+        self.assertIn('slow step', patched_click.echo.call_args[0][0])
+        done.set()
+        self.assertTrue(self.pipeline.wait('slow step'))
+        self.assertEqual(self.pipeline._progress_width, 0)
+
+    def test_profile(self):
+        self.pipeline.run('credentials', lambda: None)
+        self.pipeline.start('imports', lambda: None)
+        self.pipeline.wait('imports')
+        self.pipeline.finish()
+        lines = self.pipeline.format_profile().splitlines()
+        self.assertTrue(lines[0].startswith('Main menu was ready after'))
+        self.assertEqual(
+            [line.split()[0] for line in lines[2:]],
+            ['credentials', 'imports']
+        )
+        self.assertTrue(lines[2].endswith('(blocking)'))
@@ -0,0 +1,80 @@
+import threading
+import time
+import unittest
+from mock import Mock
+
+from spoppy import token_manager
+
+
+def get_token_info(access_token, expires_in=3600):
+    return {
+        'access_token': access_token,
+        'refresh_token': 'refresh',
+        'expires_at': int(time.time()) + expires_in,
+    }
+
+
+class TestTokenManager(unittest.TestCase):
+
+    def setUp(self):
+        self.oauth = Mock()
+        self.client = Mock()
+        self.manager = token_manager.TokenManager(self.oauth, self.client)
+
+    def tearDown(self):
+        self.manager.stop()
+
+    def test_load_sets_client_auth(self):
+        self.oauth.get_cached_token.return_value = get_token_info('foo')
+        self.assertTrue(self.manager.load())
+        self.assertEqual(self.client._auth, 'foo')
+        self.assertEqual(self.manager.get_access_token(), 'foo')
+
+    def test_load_without_token(self):
+        self.oauth.get_cached_token.return_value = None
+        self.assertFalse(self.manager.load())
+        self.assertFalse(self.manager.get_access_token())
+
+    def test_refreshes_before_expiry(self):
+        refreshed = threading.Event()
+
+        def refresh_access_token(refresh_token):
+            refreshed.set()
+            return get_token_info('bar')
+        self.oauth.refresh_access_token.side_effect = refresh_access_token
+        self.manager.set_token_info(
+            get_token_info('foo', self.manager.REFRESH_MARGIN)
+        )
+        self.assertTrue(refreshed.wait(5))
+        self.manager.stop()
+        self.oauth.refresh_access_token.assert_called_once_with('refresh')
+        self.assertEqual(self.client._auth, 'bar')
+        self.assertEqual(self.manager.refreshes, 1)
+
+    def test_does_not_refresh_replaced_token(self):
+        self.manager.set_token_info(get_token_info('bar'))
+        self.assertTrue(self.manager.refresh(expired_token='foo'))
+        self.oauth.refresh_access_token.assert_not_called()
+
+    def test_concurrent_401s_refresh_once(self):
+        self.manager.set_token_info(get_token_info('foo'))
+        self.oauth.refresh_access_token.return_value = get_token_info('bar')
+        threads = [
+            threading.Thread(
+                target=self.manager.refresh, kwargs={'expired_token': 'foo'}
+            )
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(self.oauth.refresh_access_token.call_count, 1)
+        self.assertEqual(self.client._auth, 'bar')
+
+    def test_failed_refresh_keeps_token(self):
+        self.manager.set_token_info(get_token_info('foo'))
+        self.oauth.refresh_access_token.return_value = None
+        self.assertFalse(self.manager.refresh())
+        self.assertEqual(self.client._auth, 'foo')
+        self.assertEqual(self.manager.refreshes, 0)
@@ -1,5 +1,9 @@
 import unittest
-from spoppy import util
+from collections import namedtuple
+
+from spoppy import responses, util
+
+MenuValue = namedtuple('MenuValue', ('name', 'destination'))
 
 
 class TestPlayer(unittest.TestCase):
@@ -38,3 +42,53 @@ class TestPlayer(unittest.TestCase):
             util.get_duration_from_s(-1)
         with self.assertRaises(TypeError):
             util.get_duration_from_s('01:57')
+
+    def test_format_age(self):
+        self.assertEqual(util.format_age(5), 'just now')
+        self.assertEqual(util.format_age(60), '1 minute ago')
+        self.assertEqual(util.format_age(60 * 60 * 3 + 5), '3 hours ago')
+        self.assertEqual(util.format_age(60 * 60 * 24 * 2), '2 days ago')
+
+    def test_sorted_menu_items_sorts_numbers_numerically(self):
+        items = [
+            (str(i).rjust(4), MenuValue('Song', None))
+            for i in (10000, 2, 9999, 1)
+        ] + [
+            ('q', MenuValue('quit', responses.QUIT)),
+            ('sp', MenuValue('Shuffle play', None)),
+        ]
+        self.assertEqual(
+            [key.strip() for key, _ in util.sorted_menu_items(items)],
+            ['sp', '1', '2', '9999', '10000', 'q']
+        )
+
+    def test_get_match_score(self):
+        self.assertIsNone(util.get_match_score('jude', 'hey judas'))
+        self.assertIsNotNone(util.get_match_score('tiaplay', 'this is a play'))
+        # Characters following each other beat scattered ones
+        self.assertGreater(
+            util.get_match_score('jude', 'hey jude'),
+            util.get_match_score('jude', 'jump under deep sea')
+        )
+        # Starting a word beats the middle of one
+        self.assertGreater(
+            util.get_match_score('jude', 'hey jude'),
+            util.get_match_score('jude', 'superjude')
+        )
+        # The shortest match is scored, not the first one found
+        self.assertEqual(
+            util.get_match_score('ab', 'a xx ab'),
+            util.get_match_score('ab', 'ab')
+        )
+
+    def test_get_user_cache_path(self):
+        path = util.get_user_cache_path('sindrig', 'library.db')
+        self.assertTrue(path.startswith(util.get_cache_path('users')))
+        self.assertTrue(path.endswith('library.db'))
+        self.assertNotIn('sindrig', path)
+        self.assertEqual(
+            path, util.get_user_cache_path(u'sindrig', 'library.db')
+        )
+        self.assertNotEqual(
+            path, util.get_user_cache_path('someone', 'library.db')
+        )